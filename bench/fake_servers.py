@@ -0,0 +1,410 @@
+"""
+Local stand-ins for the OpenAI chat completions / batch endpoints, the image
+vendor search APIs and the WordPress REST API, for offline benchmarks.
+
+Every endpoint can be slowed down and made to fail or answer 429 at a
+configurable rate, so the pipeline's concurrency, retries and rate limiting
+can be exercised without spending money or hitting live services.
+"""
+import re
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+LOREM = (
+    "Fresh ingredients and careful technique make the difference here: a hot pan, a pinch of salt "
+    "at the right moment and patience while the sugars caramelize. Texture matters as much as flavor, "
+    "so keep an eye on the color and aroma, and taste as you go. Small adjustments to heat and timing "
+    "turn a familiar dish into something memorable, and the method scales easily for a crowd. "
+)
+
+
+class FakeConfig:
+    def __init__(self, llm_latency=0.5, vendor_latency=0.1, wp_latency=0.05, image_latency=0.05,
+                 error_rate=0.0, throttle_rate=0.0, sections=6, image_kb=200, vendor_hit_rate=0.7, seed=None):
+        self.llm_latency = llm_latency
+        self.vendor_latency = vendor_latency
+        self.wp_latency = wp_latency
+        self.image_latency = image_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.sections = sections
+        self.image_kb = image_kb
+        self.vendor_hit_rate = vendor_hit_rate
+        self.random = random.Random(seed)
+
+
+class FakeServer:
+    """Runs every stand-in on one ThreadingHTTPServer; routes are told apart by path prefix."""
+
+    def __init__(self, config: FakeConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeConfig()
+        self.stats = {}
+        self.files = {}
+        self.batches = {}
+        self.posts = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict:
+        """Environment variables that point the pipeline at this server."""
+        return {
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_MODEL": "gpt-4o-mini",
+            "WORDPRESS_URL": self.url,
+            "WORDPRESS_USERNAME": "bench",
+            "WORDPRESS_APP_PASSWORD": "bench",
+            "UNSPLASH_API_URL": f"{self.url}/unsplash",
+            "PEXELS_API_URL": f"{self.url}/pexels",
+            "PIXABAY_API_URL": f"{self.url}/pixabay",
+            "FREEPIK_API_URL": f"{self.url}/freepik",
+            "WIKIMEDIA_API_URL": f"{self.url}/wikimedia/w/api.php",
+            "OLLAMA_URL": f"{self.url}/ollama",
+            "UNSPLASH_ACCESS_KEY": "fake",
+            "PEXELS_API_KEY": "fake",
+            "PIXABAY_API_KEY": "fake",
+            "FREEPIK_API_KEY": "fake"
+        }
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def new_id(self) -> int:
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def count(self, route: str, outcome: str):
+        with self.lock:
+            route_stats = self.stats.setdefault(route, {})
+            route_stats[outcome] = route_stats.get(outcome, 0) + 1
+
+
+def _heading_list(prompt: str):
+    match = re.search(r"Sections to cover:\n(.*?)\n\s*\n", prompt, re.S)
+    if not match:
+        return []
+    return [line.strip() for line in match.group(1).splitlines() if line.strip()]
+
+
+def fake_completion(body: dict, config: FakeConfig) -> str:
+    """Reply text shaped after the schema named in response_format."""
+    prompt = body["messages"][-1]["content"]
+    response_format = body.get("response_format") or {}
+    name = response_format.get("json_schema", {}).get("name")
+    headings = ["Introduction"] + [f"Section {i}" for i in range(1, config.sections)]
+    if name == "outline_structoutput":
+        return json.dumps({"title": "Benchmark", "sections": [{"heading": h} for h in headings], "sources": []})
+    if name == "content_structoutput":
+        return json.dumps({"sections": [{"heading": h, "content": LOREM} for h in _heading_list(prompt) or headings]})
+    if name == "excerpt_structoutput":
+        return json.dumps({"excerpt": "A quick benchmark excerpt."})
+    if name == "article_structoutput":
+        return json.dumps({
+            "title": "Benchmark",
+            "sections": [{"heading": h, "content": LOREM} for h in headings],
+            "excerpt": "A quick benchmark excerpt."
+        })
+    if name == "plagiarism_structoutput":
+        count = len(re.findall(r"^\s*\d+\. ", prompt, re.M))
+        return json.dumps({"sentences": [f"Reworded sentence {i} with its own phrasing." for i in range(1, count + 1)]})
+    if name == "keyword_structoutput":
+        count = len(re.findall(r"^\s*\d+\. ", prompt, re.M))
+        return json.dumps({"keywords": [f"fresh produce basket {i}" for i in range(1, count + 1)]})
+    return f"fresh produce basket {config.random.randint(1, 50)}"
+
+
+def _tiny_jpeg(size: int, seed: str) -> bytes:
+    # Only the signature matters to the pipeline; the rest is filler
+    body = (seed.encode() * (size // max(1, len(seed)) + 1))[:max(0, size - 5)]
+    return b"\xff\xd8\xff\xe0\x00" + body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    # -- helpers -------------------------------------------------------
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, payload, content_type="application/json", headers=None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _simulate(self, route: str, latency: float) -> bool:
+        """Sleep, then maybe answer 429/500 instead. Returns False if the request was already answered."""
+        config = self.fake.config
+        time.sleep(latency * config.random.uniform(0.5, 1.5))
+        roll = config.random.random()
+        if roll < config.throttle_rate:
+            self.fake.count(route, "429")
+            self._send(429, {"error": {"message": "rate limited"}}, headers={"Retry-After": "1"})
+            return False
+        if roll < config.throttle_rate + config.error_rate:
+            self.fake.count(route, "500")
+            self._send(500, {"error": {"message": "server error"}})
+            return False
+        self.fake.count(route, "ok")
+        return True
+
+    # -- routing -------------------------------------------------------
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def _route(self, method):
+        parsed = urlparse(self.path)
+        path, query = parsed.path, parse_qs(parsed.query)
+        config = self.fake.config
+        body = self._body() if method == "POST" else b""
+
+        if path == "/v1/chat/completions":
+            return self._chat(json.loads(body or b"{}"))
+        if path.startswith("/v1/files") or path.startswith("/v1/batches"):
+            return self._batch(method, path, body)
+        if path == "/ollama/api/generate":
+            return self._ollama(json.loads(body or b"{}"))
+        if path.startswith("/images/"):
+            if self._simulate("image", config.image_latency):
+                self._send(200, _tiny_jpeg(config.image_kb * 1024, path), content_type="image/jpeg")
+            return
+        if path.startswith("/wp-json/"):
+            return self._wordpress(method, path, query, body)
+        return self._vendor(path, query)
+
+    def _chat(self, body):
+        config = self.fake.config
+        if not self._simulate("openai", config.llm_latency):
+            return
+        content = fake_completion(body, config)
+        usage = {"prompt_tokens": len(body["messages"][-1]["content"]) // 4,
+                 "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": f"chatcmpl-{self.fake.new_id()}", "created": int(time.time()), "model": body.get("model")}
+        if not body.get("stream"):
+            return self._send(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = max(1, len(content) // 20)
+        for start in range(0, len(content), step):
+            delta = {"content": content[start:start + step]}
+            if start == 0:
+                # Like OpenAI, only the first delta names the role; clients reject a stream without it
+                delta["role"] = "assistant"
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(config.llm_latency / 40)
+        final = {**base, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.wfile.write(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _ollama(self, body):
+        config = self.fake.config
+        if not self._simulate("ollama", config.llm_latency):
+            return
+        schema = body.get("format")
+        name = None
+        if isinstance(schema, dict):
+            # Ollama gets the bare schema, so tell the replies apart by their required keys
+            required = set(schema.get("required", []))
+            name = ("keyword_structoutput" if "keywords" in required else
+                    "article_structoutput" if "excerpt" in required and "sections" in required else
+                    "excerpt_structoutput" if "excerpt" in required else
+                    "plagiarism_structoutput" if required == {"sentences"} else
+                    "outline_structoutput" if "sources" in required else
+                    "content_structoutput" if "sections" in required else None)
+        request = {"messages": [{"content": body.get("prompt", "")}]}
+        if name:
+            request["response_format"] = {"json_schema": {"name": name}}
+        content = fake_completion(request, config)
+        done = {"done": True, "prompt_eval_count": len(body.get("prompt", "")) // 4,
+                "eval_count": len(content) // 4}
+        if not body.get("stream"):
+            return self._send(200, {"response": content, **done})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = max(1, len(content) // 20)
+        for start in range(0, len(content), step):
+            self.wfile.write((json.dumps({"response": content[start:start + step], "done": False}) + "\n").encode())
+            self.wfile.flush()
+        self.wfile.write((json.dumps({"response": "", **done}) + "\n").encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _batch(self, method, path, body):
+        fake = self.fake
+        if method == "POST" and path == "/v1/files":
+            # multipart upload: keep the JSONL part
+            lines = [line for line in body.decode("utf-8", "replace").splitlines() if line.startswith("{")]
+            file_id = f"file-{fake.new_id()}"
+            fake.files[file_id] = "\n".join(lines)
+            return self._send(200, {"id": file_id, "object": "file", "purpose": "batch"})
+        if method == "POST" and path == "/v1/batches":
+            request = json.loads(body or b"{}")
+            output = []
+            for line in fake.files.get(request.get("input_file_id"), "").splitlines():
+                item = json.loads(line)
+                content = fake_completion(item["body"], fake.config)
+                output.append(json.dumps({
+                    "custom_id": item["custom_id"],
+                    "response": {"status_code": 200, "body": {
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]
+                    }}
+                }))
+            output_id = f"file-{fake.new_id()}"
+            fake.files[output_id] = "\n".join(output)
+            batch_id = f"batch-{fake.new_id()}"
+            fake.batches[batch_id] = {"id": batch_id, "status": "completed", "output_file_id": output_id}
+            return self._send(200, {"id": batch_id, "status": "validating"})
+        match = re.match(r"^/v1/batches/([^/]+)$", path)
+        if match and match.group(1) in fake.batches:
+            return self._send(200, fake.batches[match.group(1)])
+        match = re.match(r"^/v1/files/([^/]+)/content$", path)
+        if match and match.group(1) in fake.files:
+            return self._send(200, fake.files[match.group(1)].encode(), content_type="application/jsonl")
+        return self._send(404, {"error": "not found"})
+
+    def _wordpress(self, method, path, query, body):
+        fake = self.fake
+        if not self._simulate("wordpress", fake.config.wp_latency):
+            return
+        if path == "/wp-json/wp/v2/media":
+            media_id = fake.new_id()
+            return self._send(201, {"id": media_id, "source_url": f"{fake.url}/uploads/{media_id}.jpg"})
+        if path == "/wp-json/wp/v2/posts" and method == "GET":
+            slugs = ",".join(query.get("slug", [])).split(",")
+            with fake.lock:
+                found = [post for post in fake.posts.values() if post["slug"] in slugs]
+            return self._send(200, found)
+        if path == "/wp-json/batch/v1":
+            responses = [
+                dict(zip(("status", "body"), self._save_post(item["path"], item.get("body") or {})))
+                for item in json.loads(body or b"{}").get("requests", [])
+            ]
+            return self._send(207, {"responses": responses})
+        if path.startswith("/wp-json/wp/v2/posts"):
+            return self._send(*self._save_post(path[len("/wp-json"):], json.loads(body or b"{}")))
+        return self._send(404, {"code": "rest_no_route"})
+
+    def _save_post(self, path, payload):
+        """(status, post) for a create (/wp/v2/posts) or update (/wp/v2/posts/<id>)."""
+        fake = self.fake
+        match = re.match(r"^/wp/v2/posts(?:/(\d+))?$", path)
+        if not match:
+            return 404, {"code": "rest_no_route"}
+        with fake.lock:
+            if match.group(1):
+                post = fake.posts.get(int(match.group(1)))
+                if post is None:
+                    return 404, {"code": "rest_post_invalid_id", "message": "Invalid post ID."}
+                status = 200
+            else:
+                post = {"id": len(fake.posts) + 1_000_000, "status": "draft", "slug": ""}
+                fake.posts[post["id"]] = post
+                status = 201
+            post["title"] = {"raw": payload.get("title", post.get("title", {}).get("raw"))}
+            post["slug"] = payload.get("slug") or post["slug"]
+            post["status"] = payload.get("status", post["status"])
+        return status, dict(post)
+
+    def _vendor(self, path, query):
+        fake = self.fake
+        config = fake.config
+        vendor = path.strip("/").split("/")[0]
+        if not self._simulate(vendor, config.vendor_latency):
+            return
+        hit = config.random.random() < config.vendor_hit_rate
+        term = (query.get("query") or query.get("q") or query.get("search") or query.get("srsearch") or [""])[0]
+        image_url = f"{fake.url}/images/{vendor}-{abs(hash(term)) % 10000}.jpg"
+        if vendor == "unsplash":
+            results = [{"urls": {"regular": image_url}, "user": {"name": "Bench"}}] if hit else []
+            return self._send(200, {"results": results})
+        if vendor == "pexels":
+            photos = [{"src": {"large": image_url}, "photographer": "Bench"}] if hit else []
+            return self._send(200, {"photos": photos})
+        if vendor == "pixabay":
+            hits = [{"largeImageURL": image_url, "user": "Bench"}] if hit else []
+            return self._send(200, {"hits": hits})
+        if vendor == "freepik":
+            if path.endswith("/download"):
+                return self._send(200, {"data": {"url": image_url}})
+            data = [{"id": 1, "title": "Bench", "author": {"name": "Bench"}}] if hit else []
+            return self._send(200, {"data": data})
+        if vendor == "wikimedia":
+            if "srsearch" in query:
+                search = [{"title": "File:Bench.jpg"}] if hit else []
+                return self._send(200, {"query": {"search": search}})
+            return self._send(200, {"query": {"pages": {"1": {"imageinfo": [{"url": image_url, "mime": "image/jpeg"}]}}}})
+        return self._send(404, {"error": "unknown route"})
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the fake providers until interrupted")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    server = FakeServer(FakeConfig(llm_latency=args.llm_latency), port=args.port).start()
+    for name, value in server.env().items():
+        print(f"{name}={value}")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
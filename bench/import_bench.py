@@ -0,0 +1,89 @@
+"""
+Import-time benchmark.
+
+Imports a module (main by default) in fresh interpreters with `python -X importtime`,
+and prints the median wall time and the slowest imports as JSON. WordPress and API
+settings are removed from the environment first, to check that importing needs none.
+
+    python bench/import_bench.py --runs 10
+    python bench/import_bench.py --module core.llm --top 10
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Settings that importing must not depend on
+SETTING_PREFIXES = ("WORDPRESS_", "OPENAI_", "OLLAMA_", "PEXELS_", "UNSPLASH_", "PIXABAY_", "FREEPIK_", "WIKIMEDIA_")
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, cumulative microseconds) from `-X importtime` output; nested modules keep their indent."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules.append((name.rstrip(), int(cumulative)))
+    return modules
+
+
+def import_once(module: str, env: dict):
+    """(wall seconds, importtime lines) for importing module in a new interpreter."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long importing the pipeline takes")
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    return parser.parse_args(argv)
+
+
+def run(args) -> dict:
+    env = {name: value for name, value in os.environ.items() if not name.startswith(SETTING_PREFIXES)}
+    # Baseline: the interpreter itself, so the report shows what the import adds
+    baseline = statistics.median(import_once("sys", env)[0] for _ in range(args.runs))
+    timings = []
+    modules = []
+    for _ in range(args.runs):
+        elapsed, modules = import_once(args.module, env)
+        timings.append(elapsed)
+    # The module itself always tops the list; report what it pulls in
+    slowest = sorted(
+        ((name.strip(), micros) for name, micros in modules if name.strip() != args.module),
+        key=lambda item: item[1], reverse=True
+    )
+    return {
+        "module": args.module,
+        "runs": args.runs,
+        "median_seconds": round(statistics.median(timings), 3),
+        "interpreter_seconds": round(baseline, 3),
+        "import_seconds": round(statistics.median(timings) - baseline, 3),
+        "modules_imported": len(modules),
+        "slowest": [{"module": name, "ms": round(micros / 1000, 1)} for name, micros in slowest[:args.top]]
+    }
+
+
+def main(argv=None):
+    print(json.dumps(run(parse_args(argv)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
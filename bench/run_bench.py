@@ -0,0 +1,152 @@
+"""
+Offline throughput benchmark.
+
+Starts the fake providers from bench/fake_servers.py, points the pipeline at
+them, runs main() over a synthetic CSV of N rows and prints articles/min,
+per-stage latency and peak RSS as JSON.
+
+    python bench/run_bench.py --rows 50 --workers 8 --llm-latency 1.0 --throttle-rate 0.05
+    python bench/run_bench.py --rows 20 -- --pipeline combined --stream
+
+Arguments after "--" are passed to main() unchanged.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from bench.fake_servers import FakeServer, FakeConfig  # noqa: E402
+
+# Requests per minute allowed per fake provider: high enough never to be the bottleneck
+FAKE_RPM = 60000
+
+
+def write_csv(path: Path, rows: int):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Main Keyword", "Reference Links", "Secondary Keywords"])
+        for i in range(rows):
+            writer.writerow([f"benchmark recipe {i}", "", f"quick dinner {i},easy lunch {i}"])
+
+
+def fake_rate_limits() -> list:
+    """
+    main() arguments lifting the real providers' request budgets (e.g. Unsplash's 50/hour),
+    which would otherwise pace the fake vendors too. Rate limits passed after "--" still win.
+    """
+    from core.rate_limit import DEFAULT_RATES
+    return [arg for provider in DEFAULT_RATES for arg in ("--rate-limit", f"{provider}={FAKE_RPM}")]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against local fake providers")
+    parser.add_argument("--rows", type=int, default=20, help="Number of synthetic CSV rows")
+    parser.add_argument("--workers", type=int, default=4, help="Passed to main() as --workers")
+    parser.add_argument("--sections", type=int, default=6, help="Sections per fake article")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake chat completion")
+    parser.add_argument("--vendor-latency", type=float, default=0.1, help="Seconds per fake image search")
+    parser.add_argument("--wp-latency", type=float, default=0.05, help="Seconds per fake WordPress call")
+    parser.add_argument("--image-latency", type=float, default=0.05, help="Seconds per fake image download")
+    parser.add_argument("--image-kb", type=int, default=200, help="Size of the fake images")
+    parser.add_argument("--vendor-hit-rate", type=float, default=0.7, help="Share of searches that find an image")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for latency jitter and failures")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory (drafts, logs, caches)")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args, main_args = parser.parse_known_args(argv)
+    args.main_args = [arg for arg in main_args if arg != "--"]
+    return args
+
+
+def run(args) -> dict:
+    config = FakeConfig(
+        llm_latency=args.llm_latency,
+        vendor_latency=args.vendor_latency,
+        wp_latency=args.wp_latency,
+        image_latency=args.image_latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        sections=args.sections,
+        image_kb=args.image_kb,
+        vendor_hit_rate=args.vendor_hit_rate,
+        seed=args.seed
+    )
+    cwd = os.getcwd()
+    workdir = Path(tempfile.mkdtemp(prefix="wp-bench-"))
+    for name in ("templates", "schemas"):
+        (workdir / name).symlink_to(REPO_ROOT / name)
+    csv_path = workdir / "bench.csv"
+    write_csv(csv_path, args.rows)
+
+    try:
+        with FakeServer(config) as server:
+            # Settings are read when main() first asks for the app context, so set them before it runs
+            os.environ.update(server.env())
+            os.chdir(workdir)
+            import main as pipeline
+            from core import metrics
+
+            start = time.perf_counter()
+            pipeline.main([
+                "--csv", str(csv_path),
+                "--log-file", str(workdir / "log.json"),
+                "--cache-path", str(workdir / "cache" / "llm.sqlite3"),
+                "--state-path", str(workdir / "state" / "jobs.sqlite3"),
+                "--workers", str(args.workers),
+                *fake_rate_limits(),
+                *args.main_args
+            ])
+            elapsed = time.perf_counter() - start
+            report = metrics.summary()
+            requests = server.stats
+    finally:
+        # Also when main() fails, so the process isn't left inside the temporary directory
+        os.chdir(cwd)
+
+    articles = report["counters"].get("articles", 0)
+    result = {
+        "rows": args.rows,
+        "workers": args.workers,
+        "main_args": args.main_args,
+        "seconds": round(elapsed, 2),
+        "articles": articles,
+        "articles_per_minute": round(articles / elapsed * 60, 2) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": report["stages"],
+        "counters": report["counters"],
+        "requests": requests,
+        "workdir": str(workdir) if args.keep else None
+    }
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = Path(args.output).resolve() if args.output else None
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if output:
+        output.write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# Image vendor endpoints, overridable to point at local stand-ins (see bench/)
+DEFAULT_API_URLS = {
+    "pexels": "https://api.pexels.com",
+    "unsplash": "https://api.unsplash.com",
+    "pixabay": "https://pixabay.com",
+    "freepik": "https://api.freepik.com",
+    "wikimedia": "https://commons.wikimedia.org/w/api.php"
+}
+
+
+class AppContext:
+    """
+    Settings read from the environment, and the clients built from them on first use.
+    Creating a context reads variables only: no client library is imported and
+    nothing can reach the network until a client is asked for.
+    """
+
+    def __init__(self, env=None):
+        env = os.environ if env is None else env
+        self.wordpress_url = env.get("WORDPRESS_URL")
+        self.wordpress_username = env.get("WORDPRESS_USERNAME")
+        self.wordpress_app_password = env.get("WORDPRESS_APP_PASSWORD")
+        self.openai_api_key = env.get("OPENAI_API_KEY")
+        self.openai_model = env.get("OPENAI_MODEL")
+        # Point at a compatible local server (e.g. for testing) instead of api.openai.com
+        self.openai_base_url = env.get("OPENAI_BASE_URL")
+        self.ollama_url = env.get("OLLAMA_URL", "http://localhost:11434").rstrip("/")
+        self.ollama_model = env.get("OLLAMA_MODEL", "llama3.2:latest")
+        self.image_api_keys = {
+            "openai": self.openai_api_key,
+            "pexels": env.get("PEXELS_API_KEY"),
+            "unsplash": env.get("UNSPLASH_ACCESS_KEY"),
+            "pixabay": env.get("PIXABAY_API_KEY"),
+            "freepik": env.get("FREEPIK_API_KEY")
+        }
+        self.image_api_urls = {
+            vendor: env.get(f"{vendor.upper()}_API_URL", url) for vendor, url in DEFAULT_API_URLS.items()
+        }
+        self._lock = threading.Lock()
+        self._wp_client = None
+        self._image_bot = None
+
+    def require_wordpress(self):
+        missing = [
+            name for name, value in (
+                ("WORDPRESS_URL", self.wordpress_url),
+                ("WORDPRESS_USERNAME", self.wordpress_username),
+                ("WORDPRESS_APP_PASSWORD", self.wordpress_app_password)
+            ) if not value
+        ]
+        if missing:
+            raise RuntimeError(f"Missing WordPress settings: {', '.join(missing)} (set them in .env)")
+
+    @property
+    def wp_client(self):
+        with self._lock:
+            if self._wp_client is None:
+                self.require_wordpress()
+                # Imported here so that commands which never post don't pay for it
+                from .wordpress_api import WordPressClient
+                self._wp_client = WordPressClient(
+                    self.wordpress_url, self.wordpress_username, self.wordpress_app_password
+                )
+            return self._wp_client
+
+    @property
+    def image_bot(self):
+        with self._lock:
+            if self._image_bot is None:
+                self.require_wordpress()
+                from .image_vendor import ImageIntegrationBot
+                self._image_bot = ImageIntegrationBot(
+                    wp_url=self.wordpress_url,
+                    wp_user=self.wordpress_username,
+                    wp_pass=self.wordpress_app_password,
+                    api_keys=self.image_api_keys,
+                    api_urls=self.image_api_urls
+                )
+            return self._image_bot
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_context() -> AppContext:
+    """The process-wide AppContext. The first call loads .env (variables already set win)."""
+    global _context
+    with _context_lock:
+        if _context is None:
+            load_dotenv()
+            _context = AppContext()
+        return _context
+
+
+def reset_context():
+    """Drop the current context, e.g. after changing the environment; the next get_context() builds a new one."""
+    global _context
+    with _context_lock:
+        _context = None
@@ -0,0 +1,32 @@
+import threading
+from contextlib import contextmanager
+
+# Max number of calls in flight per pipeline stage, shared by all row workers
+DEFAULT_LIMITS = {
+    "llm": 4,
+    # Local model calls; Ollama serves OLLAMA_NUM_PARALLEL requests at once and queues the rest
+    "ollama": 4,
+    "images": 4,
+    "wordpress": 2,
+    # Reference page downloads (outline notes, plagiarism checks)
+    "references": 8
+}
+
+_semaphores = {name: threading.BoundedSemaphore(size) for name, size in DEFAULT_LIMITS.items()}
+
+
+def configure_limits(**sizes):
+    """Resize stage limits, e.g. configure_limits(llm=8, wordpress=4). Call before starting workers."""
+    for name, size in sizes.items():
+        if size is None:
+            continue
+        if name not in _semaphores:
+            raise ValueError(f"Unknown stage: {name}")
+        _semaphores[name] = threading.BoundedSemaphore(max(1, int(size)))
+
+
+@contextmanager
+def stage_limit(name: str):
+    """Block until a slot for the given stage is free."""
+    with _semaphores[name]:
+        yield
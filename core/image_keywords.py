@@ -0,0 +1,121 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from templates.article_outline import STRING_SIX, STRING_SEVEN
+from .logger import log_event
+from . import metrics
+from .llm import chat
+
+KEYWORD_SCHEMA_PATH = Path("schemas") / "keyword_structoutput.json"
+# The featured image has no section of its own; it is described by the title alone
+FEATURED_SECTION = "Featured image for the whole article"
+# Memoized keywords kept at most; an article drops its own with forget() once its images are resolved
+MEMO_SIZE = 256
+
+
+def _section_key(title, section):
+    return title.strip(), (section or "").strip()
+
+
+class KeywordService:
+    """
+    Image search keywords for article sections.
+    keywords() asks for a whole article's keywords in one call; every result is memoized,
+    so later single lookups (keyword()) for the same section don't call the model again.
+    Repeats across runs are covered by the LLM cache, so the memo only has to last one article.
+    """
+
+    def __init__(self, size: int = MEMO_SIZE):
+        self.size = size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._response_format = None
+
+    def response_format(self) -> dict:
+        if self._response_format is None:
+            schema = json.loads(KEYWORD_SCHEMA_PATH.read_text(encoding="utf-8"))
+            self._response_format = schema["format"]
+        return self._response_format
+
+    def cached(self, title, section):
+        with self._lock:
+            return self._memo.get(_section_key(title, section))
+
+    def _remember(self, title, section, keyword):
+        with self._lock:
+            self._memo[_section_key(title, section)] = keyword
+            self._memo.move_to_end(_section_key(title, section))
+            while len(self._memo) > self.size:
+                self._memo.popitem(last=False)
+
+    def forget(self, title):
+        """Drop the memoized keywords of one article."""
+        title = title.strip()
+        with self._lock:
+            for memo_key in [memo_key for memo_key in self._memo if memo_key[0] == title]:
+                del self._memo[memo_key]
+
+    def keyword(self, title, section):
+        """Keyword for one section (a blank section means the featured image)."""
+        keyword = self.cached(title, section)
+        if keyword:
+            return keyword
+        full_prompt = f"""
+        Blog Title: {title}
+        Section: {section}
+
+        {STRING_SIX}
+        """
+        try:
+            with metrics.span("generate_keyword"):
+                keyword = chat(full_prompt, stage="keyword")
+        except Exception as e:
+            log_event("ERROR", f"Keyword generation failed: {e}")
+            return None
+        if keyword:
+            self._remember(title, section, keyword)
+        return keyword
+
+    def keywords(self, title, sections):
+        """
+        Keywords for several sections from a single call, in the order given.
+        Sections already known are not sent again; if the batched reply is unusable
+        the missing ones fall back to one call each.
+        """
+        missing = [section for section in dict.fromkeys(sections) if not self.cached(title, section)]
+        if len(missing) > 1:
+            self._fetch_batch(title, missing)
+        return [self.keyword(title, section) for section in sections]
+
+    def _fetch_batch(self, title, sections):
+        numbered = "\n\n".join(
+            f"{number}. {section.strip() or FEATURED_SECTION}"
+            for number, section in enumerate(sections, start=1)
+        )
+        full_prompt = f"""
+        Blog Title: {title}
+        Sections:
+        {numbered}
+
+        {STRING_SEVEN}
+        """
+
+        def validate(reply):
+            return len(json.loads(reply)["keywords"]) == len(sections)
+
+        try:
+            with metrics.span("generate_keywords") as span:
+                span["sections"] = len(sections)
+                reply = chat(full_prompt, response_format=self.response_format(), validate=validate, stage="keyword")
+            keywords = json.loads(reply)["keywords"]
+        except Exception as e:
+            log_event("WARNING", f"Batched keyword generation failed, asking per section: {e}")
+            return
+        if len(keywords) != len(sections):
+            log_event("WARNING", "Batched keyword reply has the wrong length, asking per section",
+                      {"expected": len(sections), "got": len(keywords)})
+            return
+        for section, keyword in zip(sections, keywords):
+            if keyword and keyword.strip():
+                self._remember(title, section, keyword.strip())
@@ -1,27 +1,97 @@
-import os
-import requests
-from io import BytesIO
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import re
+from tempfile import SpooledTemporaryFile
 from base64 import b64encode
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
-from templates.article_outline import STRING_SIX
+import requests
 from .logger import log_event
+from . import transport, metrics, rate_limit
+from .app import DEFAULT_API_URLS
+from .concurrency import stage_limit
+from .image_keywords import KeywordService
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Downloads stay in memory up to this size, then spill to a temp file
+SPOOL_MAX_MEMORY = 1024 * 1024
+MAX_IMAGE_BYTES = 15 * 1024 * 1024
+
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"GIF87a", "image/gif", "gif"),
+    (b"GIF89a", "image/gif", "gif"),
+]
+
+def sniff_image_type(head: bytes):
+    """Return (mime, extension) from the first bytes of an image, or None if it isn't one we accept."""
+    for signature, mime, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime, ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+def media_filename(query: str, ext: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (query or "image").lower()).strip("-")[:80]
+    return f"{slug or 'image'}.{ext}"
+
+class UploadBody:
+    """
+    A file handed to requests as a request body. It has no fileno(): requests would call it
+    to measure the file, and on a SpooledTemporaryFile that writes an in-memory image to disk.
+    Without it, requests measures the file with seek()/tell() instead.
+    """
+
+    def __init__(self, f):
+        self._f = f
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+class VendorStats:
+    """Per-vendor call count, hit count and latency, collected over a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
 
-load_dotenv()
+    def record(self, vendor: str, elapsed: float, hit: bool):
+        with self._lock:
+            stats = self._stats.setdefault(vendor, {"calls": 0, "hits": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["hits"] += int(hit)
+            stats["seconds"] += elapsed
 
-wordpress_url = os.getenv("WORDPRESS_URL")
-wordpress_username = os.getenv("WORDPRESS_USERNAME")
-wordpress_app_password = os.getenv("WORDPRESS_APP_PASSWORD")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_model = os.getenv("OPENAI_MODEL")
-pexels_api_key =  os.getenv("PEXELS_API_KEY")
-unsplash_api_key =  os.getenv("UNSPLASH_ACCESS_KEY")
-pixabay_api_key =  os.getenv("PIXABAY_API_KEY")
-freepik_api_key = os.getenv("FREEPIK_API_KEY")
+    def score(self, vendor: str) -> float:
+        """Hits per second of waiting, smoothed so untried vendors keep their default rank."""
+        with self._lock:
+            stats = self._stats.get(vendor, {"calls": 0, "hits": 0, "seconds": 0.0})
+            hit_rate = (stats["hits"] + 1) / (stats["calls"] + 2)
+            avg_latency = (stats["seconds"] + 1.0) / (stats["calls"] + 1)
+        return hit_rate / avg_latency
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                vendor: {
+                    "calls": stats["calls"],
+                    "hit_rate": round(stats["hits"] / stats["calls"], 3) if stats["calls"] else 0.0,
+                    "avg_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else 0.0
+                }
+                for vendor, stats in self._stats.items()
+            }
 
 class ImageIntegrationBot:
-    def __init__(self, wp_url, wp_user, wp_pass, api_keys):
+    def __init__(self, wp_url, wp_user, wp_pass, api_keys, vendor_mode="sequential", hedge_delay=0.5, adaptive_vendors=False,
+                 api_urls=None):
         self.wp_url = wp_url.rstrip("/")
         token = b64encode(f"{wp_user}:{wp_pass}".encode())
         self.wp_headers = {
@@ -29,31 +99,31 @@ class ImageIntegrationBot:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
         }
         self.api_keys = api_keys
+        self.api_urls = {**DEFAULT_API_URLS, **(api_urls or {})}
+        # "sequential" tries vendors one after another, "race" overlaps them
+        self.vendor_mode = vendor_mode
+        # In race mode: seconds to wait on a vendor before also asking the next one,
+        # and how long a hit waits for higher-priority vendors still in flight
+        self.hedge_delay = hedge_delay
+        # Reorder vendors by observed hit rate and latency
+        self.adaptive_vendors = adaptive_vendors
+        self.vendor_stats = VendorStats()
+        # Optional MediaCache; when set, repeated queries and images reuse existing attachments
+        self.media_cache = None
+        # Downloads larger than this are abandoned
+        self.max_image_bytes = MAX_IMAGE_BYTES
+        # When set (and Pillow is installed), wider images are scaled down to this width before upload
+        self.target_width = None
+        # Memoized search keywords; prefetch a whole article's with self.keywords.keywords()
+        self.keywords = KeywordService()
 
     def generate_keyword(self, title, section):
-        llm = ChatOpenAI(
-            model=openai_model,
-            temperature=0.7,
-            api_key=openai_api_key
-        )
-        prompt_template = PromptTemplate.from_template("{prompt}")
-        chain = prompt_template | llm
-        full_prompt = f"""
-        Blog Title: {title}
-        Section: {section}
-
-        {STRING_SIX}
-        """
-        try:
-            result = chain.invoke({"prompt": full_prompt})
-            return result.content
-        except Exception as e:
-            return None
+        return self.keywords.keyword(title, section)
 
     def search_pexels(self, query):
         try:
-            url = f"https://api.pexels.com/v1/search?query={query}"
-            r = requests.get(url, headers={"Authorization": self.api_keys['pexels']})
+            url = f"{self.api_urls['pexels']}/v1/search?query={query}"
+            r = transport.get(url, provider="pexels", headers={"Authorization": self.api_keys['pexels']})
             r.raise_for_status()
             data = r.json()
             if data['photos']:
@@ -65,8 +135,8 @@ class ImageIntegrationBot:
 
     def search_unsplash(self, query):
         try:
-            url = f"https://api.unsplash.com/search/photos?query={query}&client_id={self.api_keys['unsplash']}"
-            r = requests.get(url)
+            url = f"{self.api_urls['unsplash']}/search/photos?query={query}&client_id={self.api_keys['unsplash']}"
+            r = transport.get(url, provider="unsplash")
             r.raise_for_status()
             data = r.json()
             if data['results']:
@@ -78,8 +148,8 @@ class ImageIntegrationBot:
 
     def search_pixabay(self, query):
         try:
-            url = f"https://pixabay.com/api/?key={self.api_keys['pixabay']}&q={query}"
-            r = requests.get(url)
+            url = f"{self.api_urls['pixabay']}/api/?key={self.api_keys['pixabay']}&q={query}"
+            r = transport.get(url, provider="pixabay")
             r.raise_for_status()
             data = r.json()
             if data['hits']:
@@ -95,12 +165,12 @@ class ImageIntegrationBot:
                 "x-freepik-api-key": self.api_keys['freepik']
             }
 
-            search_url = "https://api.freepik.com/v1/resources"
+            search_url = f"{self.api_urls['freepik']}/v1/resources"
             params = {
                 "search": query,
                 "limit": 5  # Get a few so we can filter
             }
-            r = requests.get(search_url, headers=headers, params=params)
+            r = transport.get(search_url, provider="freepik", headers=headers, params=params)
             r.raise_for_status()
             data = r.json()
 
@@ -112,8 +182,8 @@ class ImageIntegrationBot:
                 title = item.get("title", "Freepik image")
                 author_name = item.get("author", {}).get("name", "")
 
-                download_url = f"https://api.freepik.com/v1/resources/{resource_id}/download"
-                dl = requests.get(download_url, headers=headers)
+                download_url = f"{self.api_urls['freepik']}/v1/resources/{resource_id}/download"
+                dl = transport.get(download_url, provider="freepik", headers=headers)
                 dl.raise_for_status()
                 dl_data = dl.json()
                 img_url = dl_data["data"]["url"]
@@ -135,7 +205,7 @@ class ImageIntegrationBot:
                 "User-Agent": f"WPImageBot/1.0 ({self.wp_url}/contact)"
             }
 
-            search_url = "https://commons.wikimedia.org/w/api.php"
+            search_url = self.api_urls['wikimedia']
             params = {
                 "action": "query",
                 "format": "json",
@@ -144,7 +214,7 @@ class ImageIntegrationBot:
                 "srnamespace": 6,
                 "srlimit": 5
             }
-            r = requests.get(search_url, params=params, headers=headers)
+            r = transport.get(search_url, provider="wikimedia", params=params, headers=headers)
             r.raise_for_status()
             data = r.json()
 
@@ -154,7 +224,7 @@ class ImageIntegrationBot:
             for result in data['query']['search']:
                 file_title = result['title']
 
-                imageinfo_url = "https://commons.wikimedia.org/w/api.php"
+                imageinfo_url = self.api_urls['wikimedia']
                 params = {
                     "action": "query",
                     "format": "json",
@@ -162,7 +232,7 @@ class ImageIntegrationBot:
                     "prop": "imageinfo",
                     "iiprop": "url|mime"
                 }
-                img_req = requests.get(imageinfo_url, params=params, headers=headers)
+                img_req = transport.get(imageinfo_url, provider="wikimedia", params=params, headers=headers)
                 img_req.raise_for_status()
                 image_data = img_req.json()
 
@@ -180,24 +250,99 @@ class ImageIntegrationBot:
         return None
 
     def download_image(self, url):
-        r = requests.get(url, stream=True)
+        """
+        Stream an image into a spooled temp file, hashing it on the way.
+        Returns (file, mime, extension, sha256 hex). Raises ValueError for
+        non-images and files over max_image_bytes.
+        """
+        r = transport.get(url, stream=True)
         r.raise_for_status()
-        return BytesIO(r.content)
+        length = r.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > self.max_image_bytes:
+            r.close()
+            raise ValueError(f"Image too large ({length} bytes): {url}")
+
+        img_data = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        digest = hashlib.sha256()
+        size = 0
+        kind = None
+        try:
+            for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if kind is None:
+                    kind = sniff_image_type(chunk[:16])
+                    if kind is None:
+                        raise ValueError(f"Not a supported image: {url}")
+                size += len(chunk)
+                if size > self.max_image_bytes:
+                    raise ValueError(f"Image too large (over {self.max_image_bytes} bytes): {url}")
+                digest.update(chunk)
+                img_data.write(chunk)
+        except Exception:
+            img_data.close()
+            raise
+        finally:
+            r.close()
+        if kind is None:
+            img_data.close()
+            raise ValueError(f"Empty image: {url}")
 
-    def upload_to_wordpress(self, img_data, filename, caption):
-        files = {
-            "file": (filename, img_data, "image/jpeg")
+        img_data.seek(0)
+        mime, ext = kind
+        if self.target_width:
+            img_data, mime, ext = self.downscale_image(img_data, mime, ext)
+        return img_data, mime, ext, digest.hexdigest()
+
+    def downscale_image(self, img_data, mime, ext):
+        """Re-encode images wider than target_width. Needs Pillow; otherwise returns the input unchanged."""
+        try:
+            # Pillow is optional, only needed for --image-width, and only imported when it is used
+            from PIL import Image
+        except ImportError:
+            log_event("WARNING", "Pillow is not installed, uploading images at full size")
+            return img_data, mime, ext
+        try:
+            with Image.open(img_data) as img:
+                if img.width <= self.target_width or getattr(img, "is_animated", False):
+                    img_data.seek(0)
+                    return img_data, mime, ext
+                height = round(img.height * self.target_width / img.width)
+                resized = img.resize((self.target_width, height), Image.LANCZOS)
+                out = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+                if mime == "image/png":
+                    resized.save(out, format="PNG", optimize=True)
+                else:
+                    resized.convert("RGB").save(out, format="JPEG", quality=85, optimize=True)
+                    mime, ext = "image/jpeg", "jpg"
+        except Exception as e:
+            log_event("WARNING", f"Couldn't resize image, uploading as is: {e}")
+            img_data.seek(0)
+            return img_data, mime, ext
+        img_data.close()
+        out.seek(0)
+        return out, mime, ext
+
+    def upload_to_wordpress(self, img_data, filename, caption, content_type="image/jpeg"):
+        # Sending the file as the raw request body lets requests stream it from
+        # disk; a multipart form would be built in memory first. WordPress reads
+        # caption/description from the query string for this kind of upload.
+        headers = {
+            **self.wp_headers,
+            "Content-Type": content_type,
+            "Content-Disposition": f'attachment; filename="{filename}"'
         }
-        data = {
+        params = {
             "caption": caption,
             "description": caption
         }
 
-        r = requests.post(
+        r = transport.post(
             f"{self.wp_url}/wp-json/wp/v2/media",
-            headers=self.wp_headers,
-            files=files,
-            data=data
+            provider="wordpress",
+            headers=headers,
+            params=params,
+            data=UploadBody(img_data)
         )
         r.raise_for_status()
 
@@ -206,34 +351,153 @@ class ImageIntegrationBot:
             "id": media_data["id"],
             "url": media_data["source_url"]
         }
-    
-    def get_image_for_section(self, title, section):
-        query = self.generate_keyword(title, section)
-        for vendor in [
+
+    def vendors(self):
+        """Search functions in the order they should be tried."""
+        vendors = [
             self.search_unsplash,
             self.search_pexels,
             self.search_pixabay,
             self.search_wikimedia,
             self.search_freepik,
-            ]:
-            result = vendor(query)
+        ]
+        if self.adaptive_vendors:
+            # sort() is stable, so vendors with equal scores keep the default order
+            vendors.sort(key=lambda vendor: self.vendor_stats.score(vendor.__name__), reverse=True)
+        return vendors
+
+    def _search_vendor(self, vendor, query):
+        name = vendor.__name__.replace("search_", "")
+        # The vendor's budget is taken before an image slot, and never waited for:
+        # a vendor that is out of requests is skipped in favour of the next one
+        with rate_limit.reserve(name) as reserved:
+            if not reserved:
+                metrics.count(f"vendor_rate_limited:{name}")
+                return None
+            start = time.monotonic()
+            with stage_limit("images"), metrics.span(f"vendor:{name}") as span:
+                result = vendor(query)
+                span["hit"] = bool(result)
+        self.vendor_stats.record(vendor.__name__, time.monotonic() - start, bool(result))
+        return result
+
+    def _race_vendors(self, vendors, query):
+        """
+        Query vendors in priority order, starting the next one whenever the
+        current ones miss or take longer than hedge_delay. The best-ranked hit
+        wins once every higher-ranked vendor has answered, or after waiting
+        hedge_delay for them. Vendors that haven't started are cancelled.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(vendors))
+        pending = {}
+        hits = {}
+        next_vendor = 0
+        next_launch = 0.0
+        grace_deadline = None
+        try:
+            while True:
+                now = time.monotonic()
+                if not hits and next_vendor < len(vendors) and (not pending or now >= next_launch):
+                    pending[next_vendor] = executor.submit(self._search_vendor, vendors[next_vendor], query)
+                    next_vendor += 1
+                    next_launch = now + self.hedge_delay
+                    continue
+                if not pending:
+                    return hits[min(hits)] if hits else None
+
+                if hits:
+                    timeout = grace_deadline - now
+                elif next_vendor < len(vendors):
+                    timeout = next_launch - now
+                else:
+                    timeout = None
+                done, _ = wait(
+                    list(pending.values()),
+                    timeout=max(0.0, timeout) if timeout is not None else None,
+                    return_when=FIRST_COMPLETED
+                )
+
+                now = time.monotonic()
+                for priority in [p for p, future in pending.items() if future in done]:
+                    result = pending.pop(priority).result()
+                    if result:
+                        hits[priority] = result
+                    else:
+                        next_launch = now
+                if hits:
+                    grace_deadline = grace_deadline or now + self.hedge_delay
+                    best = min(hits)
+                    if now >= grace_deadline or not any(p < best for p in pending):
+                        return hits[best]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def find_image(self, query):
+        """Return (img_url, attribution) from the first vendor with a match, or None."""
+        vendors = self.vendors()
+        if self.vendor_mode == "race":
+            return self._race_vendors(vendors, query)
+        for vendor in vendors:
+            result = self._search_vendor(vendor, query)
             if result:
-                img_url, attribution = result
-                img_data = self.download_image(img_url)
-                media_info = self.upload_to_wordpress(img_data, f"{query}.jpg", attribution)
-                return media_info["id"], media_info["url"], attribution
-        return None, None
-
-bot = ImageIntegrationBot(
-    wp_url=wordpress_url,
-    wp_user=wordpress_username,
-    wp_pass=wordpress_app_password,
-    api_keys={
-        "openai": openai_api_key,
-        "pexels": pexels_api_key,
-        "unsplash": unsplash_api_key,
-        "pixabay": pixabay_api_key,
-        "freepik": freepik_api_key
-    }
-)
+                return result
+        return None
+
+    def get_image_for_section(self, title, section, query=None):
+        query = query or self.generate_keyword(title, section)
+        if not query:
+            return None, None, None
+        cache = self.media_cache
+
+        cached = cache.find_query(query) if cache else None
+        if cached:
+            media_info = self.attach_image(query, *cached)
+            if media_info:
+                return media_info["id"], media_info["url"], cached[1]
+            # The image it pointed at can't be used any more (e.g. an expired signed link)
+            cache.forget_query(query)
+
+        result = self.find_image(query)
+        if not result:
+            return None, None, None
+        media_info = self.attach_image(query, *result)
+        if not media_info:
+            return None, None, None
+        # Only remembered once the image made it into WordPress
+        if cache:
+            cache.save_query(query, *result)
+        return media_info["id"], media_info["url"], result[1]
 
+    def attach_image(self, query, img_url, attribution):
+        """
+        Download img_url and upload it, or reuse its attachment. Returns {"id", "url"},
+        or None if the image can't be downloaded or isn't usable.
+        """
+        cache = self.media_cache
+        media_info = cache.media_for_url(self.wp_url, img_url) if cache else None
+        if media_info:
+            log_event("INFO", "Reusing uploaded image", {"media_id": media_info["id"]})
+            return media_info
+
+        try:
+            with stage_limit("images"), metrics.span("image_download") as span:
+                img_data, mime, ext, content_hash = self.download_image(img_url)
+                span["bytes"] = img_data.seek(0, 2)
+                img_data.seek(0)
+        except (ValueError, requests.RequestException) as e:
+            log_event("ERROR", f"Skipping image: {e}")
+            return None
+        try:
+            media_info = cache.media_for_hash(self.wp_url, content_hash) if cache else None
+            if not media_info:
+                with stage_limit("wordpress"), metrics.span("media_upload") as span:
+                    span["bytes"] = img_data.seek(0, 2)
+                    img_data.seek(0)
+                    media_info = self.upload_to_wordpress(
+                        img_data, media_filename(query, ext), attribution, content_type=mime
+                    )
+        finally:
+            img_data.close()
+        if cache:
+            cache.save_media(self.wp_url, img_url, content_hash, media_info)
+        return media_info
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from models.keyword_row import KeywordRow
+from utils.sqlite_store import SQLiteStore
+from .job_state import job_key
+
+JOB_QUEUE_PATH = "data/queue/jobs.sqlite3"
+# A leased row becomes visible to other workers again if its lease isn't renewed for this long
+LEASE_SECONDS = 15 * 60
+# A row that failed (or whose worker died) this many times is set aside as failed
+MAX_ATTEMPTS = 3
+# Seconds before a failed row is offered again, multiplied by its attempt count
+RETRY_DELAY = 60
+ENQUEUE_CHUNK = 500
+# Seconds a worker with nothing to run waits before asking the queue again
+POLL_INTERVAL = 5
+
+
+def worker_name() -> str:
+    """A name unique to this process, shown in the queue as the lease owner."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def row_payload(row: KeywordRow) -> str:
+    return json.dumps({
+        "main_keyword": row.main_keyword,
+        "reference_links": list(row.reference_links),
+        "secondary_keywords": list(row.secondary_keywords),
+        "skip_plagiarism": row.skip_plagiarism,
+        "line": row.line
+    }, ensure_ascii=False)
+
+
+def payload_row(job_id: int, payload: str) -> KeywordRow:
+    data = json.loads(payload)
+    return KeywordRow(
+        main_keyword=data["main_keyword"],
+        reference_links=tuple(data["reference_links"]),
+        secondary_keywords=tuple(data["secondary_keywords"]),
+        skip_plagiarism=data["skip_plagiarism"],
+        line=data["line"],
+        job_id=job_id
+    )
+
+
+class JobQueue(SQLiteStore):
+    """
+    Durable queue of sheet rows shared by worker processes. A worker leases rows,
+    renews its leases while it works on them and acks each one when it is posted.
+    Rows whose lease runs out (the worker died or hung) are offered to other workers.
+    One row per job key, so enqueueing the same sheet twice adds nothing.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queue (
+        id INTEGER PRIMARY KEY,
+        job_key TEXT NOT NULL UNIQUE,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        -- queued: when it may be leased; leased: when the lease runs out
+        available_at REAL NOT NULL,
+        lease_owner TEXT,
+        post_id INTEGER,
+        error TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS queue_ready ON queue (status, available_at);
+    CREATE INDEX IF NOT EXISTS queue_owner ON queue (lease_owner);
+    """
+
+    def __init__(self, path, journal_mode: str = None, max_attempts: int = MAX_ATTEMPTS):
+        if journal_mode:
+            self.JOURNAL_MODE = journal_mode
+        super().__init__(path)
+        self.max_attempts = max_attempts
+
+    def enqueue(self, rows) -> int:
+        """Add KeywordRows (any iterable, read in chunks). Returns how many were new."""
+        added = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= ENQUEUE_CHUNK:
+                added += self._enqueue_chunk(chunk)
+                chunk = []
+        if chunk:
+            added += self._enqueue_chunk(chunk)
+        return added
+
+    def _enqueue_chunk(self, rows) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO queue (job_key, payload, available_at, created, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(job_key(*row.inputs()), row_payload(row), now, now, now) for row in rows]
+            )
+            return self._conn.total_changes - before
+
+    def lease(self, owner: str, count: int = 1, lease_seconds: float = LEASE_SECONDS) -> list:
+        """
+        Lease up to count rows (queued ones, or leased ones whose lease ran out), oldest first.
+        Each is a single UPDATE, so workers in other processes never get the same row.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            # Rows that keep losing their worker are probably what kills it
+            self._conn.execute(
+                "UPDATE queue SET status = 'failed', lease_owner = NULL, updated = ?, "
+                "error = COALESCE(error, 'lease expired') "
+                "WHERE status = 'leased' AND available_at <= ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            rows = self._conn.execute(
+                """
+                UPDATE queue SET status = 'leased', lease_owner = ?, available_at = ?,
+                                 attempts = attempts + 1, updated = ?
+                WHERE id IN (
+                    SELECT id FROM queue
+                    WHERE status IN ('queued', 'leased') AND available_at <= ?
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, payload
+                """,
+                (owner, now + lease_seconds, now, now, count)
+            ).fetchall()
+        return [payload_row(job_id, payload) for job_id, payload in sorted(rows)]
+
+    def renew(self, owner: str, lease_seconds: float = LEASE_SECONDS) -> int:
+        """Extend every lease this owner holds. Returns how many it still holds."""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE queue SET available_at = ?, updated = ? WHERE status = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, owner)
+            ).rowcount
+
+    def ack(self, job_id: int, owner: str, post_id: int = None) -> bool:
+        """Mark a leased row done. False if the lease was lost to another worker in the meantime."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE queue SET status = 'done', post_id = ?, lease_owner = NULL, error = NULL, updated = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (post_id, time.time(), job_id, owner)
+            ).rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str) -> bool:
+        """
+        Give a leased row back after an error: it is offered again after a delay,
+        or set aside as failed once it has used up its attempts.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                """
+                UPDATE queue SET
+                    status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    available_at = ? + ? * attempts, lease_owner = NULL, error = ?, updated = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (self.max_attempts, now, RETRY_DELAY, error, now, job_id, owner)
+            ).rowcount == 1
+
+    def release(self, owner: str) -> int:
+        """Give back every row this owner still holds (e.g. on shutdown), without counting an attempt."""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE queue SET status = 'queued', available_at = ?, attempts = MAX(attempts - 1, 0), "
+                "lease_owner = NULL, updated = ? WHERE status = 'leased' AND lease_owner = ?",
+                (now, now, owner)
+            ).rowcount
+
+    def requeue_failed(self) -> int:
+        """Offer failed rows again, with a fresh set of attempts."""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE queue SET status = 'queued', attempts = 0, available_at = ?, updated = ? "
+                "WHERE status = 'failed'",
+                (now, now)
+            ).rowcount
+
+    def waiting(self) -> int:
+        """Rows queued but not leased, including ones held back until a retry is due."""
+        return self.execute("SELECT COUNT(*) FROM queue WHERE status = 'queued'")[0][0]
+
+    def stats(self) -> dict:
+        counts = dict(self.execute("SELECT status, COUNT(*) FROM queue GROUP BY status"))
+        return {status: counts.get(status, 0) for status in ("queued", "leased", "done", "failed")}
+
+    def failures(self, limit: int = 20) -> list:
+        rows = self.execute(
+            "SELECT job_key, payload, attempts, error FROM queue WHERE status = 'failed' ORDER BY updated DESC LIMIT ?",
+            (limit,)
+        )
+        return [
+            {"job_key": key, "keyword": json.loads(payload)["main_keyword"], "attempts": attempts, "error": error}
+            for key, payload, attempts, error in rows
+        ]
+
+
+def keep_leases(queue: JobQueue, owner: str, lease_seconds: float = LEASE_SECONDS) -> threading.Event:
+    """Renew owner's leases on a background thread every third of lease_seconds, until the returned Event is set."""
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(lease_seconds / 3):
+            queue.renew(owner, lease_seconds)
+
+    threading.Thread(target=renew, name="lease-renewal", daemon=True).start()
+    return stop
+
+
+def leased_rows(queue: JobQueue, owner: str, lease_seconds: float = LEASE_SECONDS, wait: bool = False):
+    """
+    Yield KeywordRows leased from the queue one at a time, for run_rows().
+    Yields None when no row can be leased yet but more may come (rows waiting for a
+    retry, or with wait, any time), leaving it to the caller to finish the rows it is
+    running before it asks again. Stops once no row is waiting.
+    Rows other workers hold are theirs to finish: if one dies, its rows come back
+    when their leases run out, for whichever worker leases next.
+    """
+    while True:
+        rows = queue.lease(owner, lease_seconds=lease_seconds)
+        if rows:
+            yield from rows
+            continue
+        if not wait and not queue.waiting():
+            return
+        yield None
@@ -0,0 +1,59 @@
+import json
+import time
+import hashlib
+from utils.sqlite_store import SQLiteStore
+
+JOB_STATE_PATH = "data/state/jobs.sqlite3"
+
+
+def job_key(main_keyword, reference_links=None, secondary_keywords=None) -> str:
+    """Idempotency key for a row: the same inputs always map to the same job."""
+    payload = json.dumps([
+        main_keyword.strip(),
+        sorted(link.strip() for link in reference_links or []),
+        sorted(keyword.strip() for keyword in secondary_keywords or [])
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class JobState(SQLiteStore):
+    """
+    Completed stages per row (outline, content, excerpt, images, draft,
+    post id), so an interrupted run picks up where it stopped.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS job_stages (
+        job_key TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        value TEXT NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (job_key, stage)
+    );
+    """
+
+    def get(self, key: str, stage: str):
+        rows = self.execute("SELECT value FROM job_stages WHERE job_key = ? AND stage = ?", (key, stage))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put(self, key: str, stage: str, value):
+        self.execute(
+            "INSERT OR REPLACE INTO job_stages (job_key, stage, value, updated) VALUES (?, ?, ?, ?)",
+            (key, stage, json.dumps(value, ensure_ascii=False), time.time())
+        )
+
+    def stages(self, key: str) -> dict:
+        rows = self.execute("SELECT stage, value FROM job_stages WHERE job_key = ?", (key,))
+        return {stage: json.loads(value) for stage, value in rows}
+
+    def clear(self, key: str):
+        self.execute("DELETE FROM job_stages WHERE job_key = ?", (key,))
+
+    def checkpoint(self, key: str, stage: str, fn):
+        """Return the saved result of a stage, or run fn and save its result (unless None)."""
+        value = self.get(key, stage)
+        if value is not None:
+            return value
+        value = fn()
+        if value is not None:
+            self.put(key, stage, value)
+        return value
@@ -0,0 +1,243 @@
+import os
+import json
+import threading
+import hashlib
+from . import transport, rate_limit, metrics, ollama_api
+from .app import get_context
+from .concurrency import stage_limit
+from .llm_cache import LLMCache
+from .logger import log_event
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/cache/llm.sqlite3")
+
+PROVIDERS = ("openai", "ollama")
+# Providers per stage (outline, content, excerpt, article, keyword, ...), tried in order
+# until one gives a usable reply. Stages not listed here use DEFAULT_ROUTE.
+DEFAULT_ROUTE = ("openai",)
+_routes = {}
+
+_cache = None
+# ChatOpenAI clients keep their own connection pool, so build one per configuration and reuse it
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def configure_cache(mode: str = "read-write", path: str = LLM_CACHE_PATH, ttl: float = None, max_entries: int = None):
+    """Set up the response cache used by chat(). ttl is in seconds."""
+    global _cache
+    _cache = LLMCache(path, mode=mode, ttl=ttl, max_entries=max_entries)
+    return _cache
+
+
+def get_cache() -> LLMCache:
+    if _cache is None:
+        configure_cache()
+    return _cache
+
+
+def configure_route(stage: str, providers):
+    """Send a stage's calls to these providers, e.g. configure_route("keyword", ["ollama", "openai"])."""
+    providers = tuple(providers)
+    unknown = [provider for provider in providers if provider not in PROVIDERS]
+    if not providers or unknown:
+        raise ValueError(f"Unknown LLM provider(s) for {stage}: {', '.join(unknown) or 'none given'}")
+    _routes[stage] = providers
+
+
+def route(stage: str = None) -> tuple:
+    return _routes.get(stage, DEFAULT_ROUTE)
+
+
+def model_name(provider: str = "openai") -> str:
+    settings = get_context()
+    return settings.openai_model if provider == "openai" else f"ollama:{settings.ollama_model}"
+
+
+def cache_key(model, temperature, prompt, response_format=None) -> str:
+    payload = json.dumps([model, temperature, prompt, response_format], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def request_key(prompt: str, response_format: dict = None, temperature: float = 0.7, provider: str = "openai") -> str:
+    """Cache key chat() uses for this prompt with the provider's configured model."""
+    return cache_key(model_name(provider), temperature, prompt, response_format)
+
+
+def request_body(prompt: str, response_format: dict = None, temperature: float = 0.7) -> dict:
+    """The /v1/chat/completions body chat() would send for this prompt."""
+    body = {
+        "model": get_context().openai_model,
+        "temperature": temperature,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    if response_format:
+        body["response_format"] = response_format
+    return body
+
+
+def get_client(temperature: float = 0.7, response_format: dict = None):
+    """A ChatOpenAI client. langchain is imported on the first call, since it takes longer than the rest of startup."""
+    from langchain_openai import ChatOpenAI
+    key = (temperature, json.dumps(response_format, sort_keys=True))
+    settings = get_context()
+    with _clients_lock:
+        if key not in _clients:
+            kwargs = {"response_format": response_format} if response_format else {}
+            _clients[key] = ChatOpenAI(
+                model=settings.openai_model,
+                temperature=temperature,
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                timeout=transport.settings["llm_timeout"],
+                stream_usage=True,
+                **kwargs
+            )
+        return _clients[key]
+
+
+def get_chain(temperature: float = 0.7, response_format: dict = None):
+    from langchain.prompts import PromptTemplate
+    return PromptTemplate.from_template("{prompt}") | get_client(temperature, response_format)
+
+
+def _throttled(err) -> bool:
+    return getattr(err, "status_code", None) == 429
+
+
+def _retry_after(err):
+    response = getattr(err, "response", None)
+    return rate_limit.retry_after_seconds(getattr(response, "headers", None))
+
+
+def _record_usage(usage) -> int:
+    """Add a reply's token usage to the run counters and return its total."""
+    usage = usage or {}
+    metrics.count("llm_input_tokens", usage.get("input_tokens", 0))
+    metrics.count("llm_output_tokens", usage.get("output_tokens", 0))
+    metrics.count("llm_tokens", usage.get("total_tokens", 0))
+    return usage.get("total_tokens", 0)
+
+
+def _is_valid(validate, content) -> bool:
+    try:
+        return validate(content) is not False
+    except Exception:
+        return False
+
+
+def chat(prompt: str, response_format: dict = None, temperature: float = 0.7, validate=None, stage: str = None) -> str:
+    """
+    Send a single prompt to the chat model and return the reply text.
+    Replies are cached; pass validate (e.g. json.loads) to keep bad replies out of the cache.
+    stage picks the providers (see configure_route); when one fails or its reply doesn't
+    validate, the next one is asked.
+    """
+    providers = route(stage)
+    for number, provider in enumerate(providers, start=1):
+        last = number == len(providers)
+        try:
+            content = _chat_with(provider, prompt, response_format, temperature, validate)
+        except Exception as err:
+            if last:
+                raise
+            log_event("WARNING", f"{provider} call failed, trying the next provider",
+                      {"stage": stage, "error": str(err)})
+            continue
+        if last or validate is None or _is_valid(validate, content):
+            return content
+        log_event("WARNING", f"{provider} reply failed validation, trying the next provider", {"stage": stage})
+
+
+def _chat_with(provider, prompt, response_format, temperature, validate) -> str:
+    cache = get_cache()
+    key = request_key(prompt, response_format, temperature, provider)
+    cached = cache.get(key)
+    if cached is not None and (validate is None or _is_valid(validate, cached)):
+        metrics.count("llm_cache_hits")
+        return cached
+
+    if provider == "ollama":
+        with stage_limit("ollama"), metrics.span("ollama_call") as span:
+            content, usage = ollama_api.generate(prompt, response_format=response_format, temperature=temperature)
+            span["tokens"] = _record_usage(usage)
+    else:
+        chain = get_chain(temperature, response_format)
+        with stage_limit("llm"), rate_limit.limit("openai", rate_limit.estimate_tokens(prompt)) as call, \
+                metrics.span("llm_call") as span:
+            try:
+                result = chain.invoke({"prompt": prompt})
+            except Exception as err:
+                if _throttled(err):
+                    call.throttle(_retry_after(err))
+                raise
+            span["tokens"] = _record_usage(getattr(result, "usage_metadata", None))
+        content = result.content
+
+    if validate is None or _is_valid(validate, content):
+        cache.put(key, content)
+    else:
+        log_event("WARNING", "LLM reply failed validation, not cached")
+    return content
+
+
+def stream_chat(prompt: str, response_format: dict = None, temperature: float = 0.7, validate=None, stage: str = None):
+    """
+    Like chat(), but yields the reply in pieces as the model produces them.
+    A cached reply is yielded in one piece. The next provider is only tried
+    if one fails before it has produced anything.
+    """
+    providers = route(stage)
+    for number, provider in enumerate(providers, start=1):
+        started = False
+        try:
+            for piece in _stream_with(provider, prompt, response_format, temperature, validate):
+                started = True
+                yield piece
+            return
+        except Exception as err:
+            if started or number == len(providers):
+                raise
+            log_event("WARNING", f"{provider} stream failed, trying the next provider",
+                      {"stage": stage, "error": str(err)})
+
+
+def _stream_with(provider, prompt, response_format, temperature, validate):
+    cache = get_cache()
+    key = request_key(prompt, response_format, temperature, provider)
+    cached = cache.get(key)
+    if cached is not None and (validate is None or _is_valid(validate, cached)):
+        metrics.count("llm_cache_hits")
+        yield cached
+        return
+
+    parts = []
+    if provider == "ollama":
+        with stage_limit("ollama"), metrics.span("ollama_stream") as span:
+            for piece, usage in ollama_api.stream_generate(
+                    prompt, response_format=response_format, temperature=temperature):
+                if usage:
+                    span["tokens"] = _record_usage(usage)
+                if piece:
+                    parts.append(piece)
+                    yield piece
+    else:
+        chain = get_chain(temperature, response_format)
+        with stage_limit("llm"), rate_limit.limit("openai", rate_limit.estimate_tokens(prompt)) as call, \
+                metrics.span("llm_stream") as span:
+            try:
+                for chunk in chain.stream({"prompt": prompt}):
+                    if getattr(chunk, "usage_metadata", None):
+                        span["tokens"] = _record_usage(chunk.usage_metadata)
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
+            except Exception as err:
+                if _throttled(err):
+                    call.throttle(_retry_after(err))
+                raise
+
+    content = "".join(parts)
+    if validate is None or _is_valid(validate, content):
+        cache.put(key, content)
+    else:
+        log_event("WARNING", "LLM reply failed validation, not cached")
@@ -0,0 +1,79 @@
+import time
+import threading
+from utils.sqlite_store import SQLiteStore
+
+CACHE_MODES = ("read-write", "read-only", "off", "refresh")
+
+
+class LLMCache(SQLiteStore):
+    """
+    On-disk cache of model responses keyed by a hash of the request.
+
+    Modes:
+      read-write  serve hits and store new responses
+      read-only   serve hits, never store
+      off         bypass the cache entirely
+      refresh     ignore existing entries but store fresh responses
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        created REAL NOT NULL,
+        accessed REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed);
+    """
+
+    def __init__(self, path, mode: str = "read-write", ttl: float = None, max_entries: int = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        super().__init__(path)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key: str):
+        if self.mode in ("off", "refresh"):
+            return None
+        rows = self.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,))
+        now = time.time()
+        if rows and self.ttl and rows[0][1] < now - self.ttl:
+            if self.mode == "read-write":
+                self.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            rows = []
+        if not rows:
+            self._count("misses")
+            return None
+        if self.mode == "read-write":
+            self.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return rows[0][0]
+
+    def put(self, key: str, value: str):
+        if self.mode not in ("read-write", "refresh"):
+            return
+        now = time.time()
+        self.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, value, now, now)
+        )
+        self._count("writes")
+        if self.max_entries:
+            # Least recently used entries go first
+            self.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "writes": self.writes}
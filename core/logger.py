@@ -1,11 +1,38 @@
+import os
 import json
+import gzip
+import queue
+import atexit
+import shutil
+import threading
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked across processes
+    fcntl = None
+
 LOG_FILE = "log.json"
 
+# Events are queued and written by a background thread in batches
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+FSYNC_INTERVAL = 5.0
+# Rotate when the file grows past MAX_BYTES or its first entry is older than ROTATE_SECONDS
+# (None: size only); rotated files are gzipped next to it as log.json.<timestamp>.gz
+MAX_BYTES = 50 * 1024 * 1024
+ROTATE_SECONDS = None
+ROTATION_CHECK_INTERVAL = 30.0
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
 def log_event(event_type: str, message: str, extra: dict = None):
     """
     Logs events to a JSON file for debugging & monitoring.
+    The write happens on a background thread; call flush() to wait for it.
     """
     entry = {
         "time": datetime.now().isoformat(),
@@ -16,7 +43,133 @@ def log_event(event_type: str, message: str, extra: dict = None):
         entry["extra"] = extra
 
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry) + "\n")
+        line = json.dumps(entry, default=str) + "\n"
     except Exception as e:
         print(f"Log write error: {e}")
+        return
+    _ensure_writer()
+    _queue.put(line)
+
+
+def configure_logging(path: str = None, max_bytes: int = None, rotate_seconds: float = None):
+    """
+    Change the log file or rotation policy. Can be called again later: events
+    already logged are written to the old file first, then the writer switches.
+    """
+    global LOG_FILE, MAX_BYTES, ROTATE_SECONDS
+    with _writer_lock:
+        if _writer is not None and path and path != LOG_FILE:
+            flush()
+            _writer.path = path
+        LOG_FILE = path or LOG_FILE
+        MAX_BYTES = max_bytes or MAX_BYTES
+        ROTATE_SECONDS = rotate_seconds or ROTATE_SECONDS
+
+
+def flush():
+    """Block until every queued event has been written."""
+    if _writer is not None:
+        _queue.join()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = _LogWriter(LOG_FILE)
+            _writer.start()
+            atexit.register(flush)
+
+
+class _LogWriter(threading.Thread):
+    def __init__(self, path: str):
+        super().__init__(name="log-writer", daemon=True)
+        self.path = path
+        self.last_fsync = 0.0
+        self.last_rotation_check = 0.0
+
+    def run(self):
+        while True:
+            lines = [_queue.get()]
+            try:
+                while len(lines) < BATCH_SIZE:
+                    lines.append(_queue.get(timeout=FLUSH_INTERVAL if len(lines) == 1 else 0))
+            except queue.Empty:
+                pass
+            try:
+                self.write(lines)
+            except Exception as e:
+                print(f"Log write error: {e}")
+            finally:
+                for _ in lines:
+                    _queue.task_done()
+
+    def write(self, lines):
+        now = datetime.now().timestamp()
+        rotated = None
+        f = self._open_locked()
+        try:
+            if now - self.last_rotation_check >= ROTATION_CHECK_INTERVAL:
+                self.last_rotation_check = now
+                if self._needs_rotation(f, now):
+                    rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+                    os.replace(self.path, rotated)
+                    self._unlock_close(f)
+                    f = self._open_locked()
+            f.write("".join(lines))
+            f.flush()
+            if now - self.last_fsync >= FSYNC_INTERVAL:
+                os.fsync(f.fileno())
+                self.last_fsync = now
+        finally:
+            self._unlock_close(f)
+        if rotated:
+            _compress(rotated)
+
+    def _open_locked(self):
+        """Open the log for appending, holding an exclusive lock on the file currently at self.path."""
+        while True:
+            f = open(self.path, "a", encoding="utf-8")
+            if fcntl is None:
+                return f
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # Another process may have rotated the file while we waited for the lock
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            self._unlock_close(f)
+
+    @staticmethod
+    def _unlock_close(f):
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+    def _needs_rotation(self, f, now) -> bool:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return False
+        if size >= MAX_BYTES:
+            return True
+        if not ROTATE_SECONDS:
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as log:
+                first = json.loads(log.readline())
+            started = datetime.fromisoformat(first["time"]).timestamp()
+        except Exception:
+            return False
+        return now - started >= ROTATE_SECONDS
+
+
+def _compress(path: str):
+    try:
+        with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+    except Exception as e:
+        print(f"Log rotation error: {e}")
@@ -0,0 +1,73 @@
+import time
+from utils.sqlite_store import SQLiteStore
+
+MEDIA_CACHE_PATH = "data/cache/media.sqlite3"
+
+
+class MediaCache(SQLiteStore):
+    """
+    Remembers which vendor image a search query resolved to, and which
+    WordPress attachment each image was uploaded as (by source URL and by
+    content hash), so the same picture is never downloaded or uploaded twice.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS image_queries (
+        query TEXT PRIMARY KEY,
+        img_url TEXT NOT NULL,
+        attribution TEXT,
+        created REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS media (
+        site TEXT NOT NULL,
+        source_url TEXT NOT NULL,
+        content_hash TEXT,
+        media_id INTEGER NOT NULL,
+        media_url TEXT NOT NULL,
+        PRIMARY KEY (site, source_url)
+    );
+    CREATE INDEX IF NOT EXISTS media_hash ON media (site, content_hash);
+    """
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join((query or "").lower().split())
+
+    def find_query(self, query: str):
+        """Return (img_url, attribution) for a query seen before, or None."""
+        rows = self.execute(
+            "SELECT img_url, attribution FROM image_queries WHERE query = ?",
+            (self._normalize(query),)
+        )
+        return tuple(rows[0]) if rows else None
+
+    def save_query(self, query: str, img_url: str, attribution: str):
+        self.execute(
+            "INSERT OR REPLACE INTO image_queries (query, img_url, attribution, created) VALUES (?, ?, ?, ?)",
+            (self._normalize(query), img_url, attribution, time.time())
+        )
+
+    def forget_query(self, query: str):
+        self.execute("DELETE FROM image_queries WHERE query = ?", (self._normalize(query),))
+
+    def media_for_url(self, site: str, source_url: str):
+        """Return {"id", "url"} of the attachment made from source_url, or None."""
+        rows = self.execute(
+            "SELECT media_id, media_url FROM media WHERE site = ? AND source_url = ?",
+            (site, source_url)
+        )
+        return {"id": rows[0][0], "url": rows[0][1]} if rows else None
+
+    def media_for_hash(self, site: str, content_hash: str):
+        """Return {"id", "url"} of an attachment with identical bytes, or None."""
+        rows = self.execute(
+            "SELECT media_id, media_url FROM media WHERE site = ? AND content_hash = ? LIMIT 1",
+            (site, content_hash)
+        )
+        return {"id": rows[0][0], "url": rows[0][1]} if rows else None
+
+    def save_media(self, site: str, source_url: str, content_hash: str, media_info: dict):
+        self.execute(
+            "INSERT OR REPLACE INTO media (site, source_url, content_hash, media_id, media_url) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (site, source_url, content_hash, media_info["id"], media_info["url"])
+        )
@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from .logger import log_event
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional, only used with enable_otel()
+    trace = None
+
+_lock = threading.Lock()
+_durations = {}
+_hits = {}
+_totals = {}
+_counters = {}
+_tracer = None
+
+# Log one SPAN event per timed stage (in addition to the end-of-run summary)
+emit_span_events = True
+
+
+def enable_otel(service_name: str = "wordpress-automation") -> bool:
+    """Also report spans through OpenTelemetry, if it is installed and configured."""
+    global _tracer
+    if trace is None:
+        log_event("WARNING", "opentelemetry is not installed, spans are only logged")
+        return False
+    _tracer = trace.get_tracer(service_name)
+    return True
+
+
+def count(name: str, value: float = 1):
+    """Add to a run-wide counter, e.g. count("articles")."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time a stage. The yielded dict can be filled in while the stage runs:
+      tokens / bytes  added to per-stage totals
+      hit             counted towards the stage's hit rate
+    """
+    otel = _tracer.start_as_current_span(stage) if _tracer else None
+    otel_span = otel.__enter__() if otel else None
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield attrs
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _durations.setdefault(stage, []).append(elapsed)
+            if "hit" in attrs:
+                hits = _hits.setdefault(stage, [0, 0])
+                hits[0] += int(bool(attrs["hit"]))
+                hits[1] += 1
+            for name in ("tokens", "bytes"):
+                if attrs.get(name):
+                    totals = _totals.setdefault(stage, {})
+                    totals[name] = totals.get(name, 0) + attrs[name]
+        if otel_span is not None:
+            for name, value in attrs.items():
+                if isinstance(value, (str, bool, int, float)):
+                    otel_span.set_attribute(name, value)
+            otel.__exit__(None, None, None)
+        if emit_span_events:
+            log_event("SPAN", stage, {"seconds": round(elapsed, 4), "failed": failed, **attrs})
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summary() -> dict:
+    """Per-stage count, p50/p95/total seconds, hit rates and token/byte totals, plus counters."""
+    with _lock:
+        stages = {}
+        for stage, values in _durations.items():
+            stats = {
+                "count": len(values),
+                "p50": round(_percentile(values, 0.5), 3),
+                "p95": round(_percentile(values, 0.95), 3),
+                "total": round(sum(values), 3)
+            }
+            if stage in _hits:
+                hits, calls = _hits[stage]
+                stats["hit_rate"] = round(hits / calls, 3) if calls else 0.0
+            stats.update(_totals.get(stage, {}))
+            stages[stage] = stats
+        counters = dict(_counters)
+    report = {"stages": stages, "counters": counters}
+    articles = counters.get("articles")
+    if articles:
+        report["tokens_per_article"] = round(counters.get("llm_tokens", 0) / articles, 1)
+    return report
+
+
+def format_summary(report: dict) -> str:
+    lines = [f"{'stage':<28}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'total s':>10}{'hit rate':>10}"]
+    for stage, stats in sorted(report["stages"].items()):
+        hit_rate = f"{stats['hit_rate']:.0%}" if "hit_rate" in stats else ""
+        lines.append(
+            f"{stage:<28}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['total']:>10.1f}{hit_rate:>10}"
+        )
+    for name, value in sorted(report["counters"].items()):
+        lines.append(f"{name}: {value}")
+    if "tokens_per_article" in report:
+        lines.append(f"tokens per article: {report['tokens_per_article']}")
+    return "\n".join(lines)
+
+
+def write_prometheus(path: str):
+    """Write the current summary in Prometheus text format (for the node_exporter textfile collector)."""
+    report = summary()
+    lines = [
+        "# TYPE wp_automation_stage_seconds summary",
+    ]
+    for stage, stats in sorted(report["stages"].items()):
+        label = stage.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'wp_automation_stage_seconds{{stage="{label}",quantile="0.5"}} {stats["p50"]}')
+        lines.append(f'wp_automation_stage_seconds{{stage="{label}",quantile="0.95"}} {stats["p95"]}')
+        lines.append(f'wp_automation_stage_seconds_sum{{stage="{label}"}} {stats["total"]}')
+        lines.append(f'wp_automation_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+        if "hit_rate" in stats:
+            lines.append(f'wp_automation_stage_hit_ratio{{stage="{label}"}} {stats["hit_rate"]}')
+        for name in ("tokens", "bytes"):
+            if name in stats:
+                lines.append(f'wp_automation_stage_{name}_total{{stage="{label}"}} {stats[name]}')
+    for name, value in sorted(report["counters"].items()):
+        lines.append(f"wp_automation_{name}_total {value}")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    # Rename so the collector never reads a half-written file
+    os.replace(tmp_path, path)
@@ -1,20 +1,80 @@
-# openai_api.py
+# ollama_api.py
+import json
 import requests
+from . import transport
+from .app import get_context
 
-# def generate_text(model: str = "llama3.2:latest", prompt: str) -> str:
-def generate_text(prompt: str, model: str = "llama3.2:latest") -> str:
-    """Generate text using Ollama's local API."""
+
+def request_payload(prompt: str, model: str = None, response_format: dict = None, temperature: float = None,
+                    stream: bool = False) -> dict:
+    """The /api/generate body. A json_schema response_format becomes Ollama's structured "format"."""
     payload = {
         "prompt": prompt,
-        "model": model,
-        "stream": False
+        "model": model or get_context().ollama_model,
+        "stream": stream
     }
+    if response_format:
+        payload["format"] = response_format.get("json_schema", {}).get("schema", "json")
+    if temperature is not None:
+        payload["options"] = {"temperature": temperature}
+    return payload
+
+
+def usage(data: dict) -> dict:
+    """Token usage of a finished reply, named like langchain's usage_metadata."""
+    input_tokens = data.get("prompt_eval_count", 0)
+    output_tokens = data.get("eval_count", 0)
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens
+    }
+
 
+def generate(prompt: str, model: str = None, response_format: dict = None, temperature: float = None):
+    """
+    Generate text with Ollama's local API. Returns (text, usage); raises on failure.
+    Requests go through the "ollama" rate limiter, so several can be in flight at once.
+    """
+    response = transport.post(
+        f"{get_context().ollama_url}/api/generate",
+        provider="ollama",
+        json=request_payload(prompt, model, response_format, temperature),
+        timeout=transport.llm_timeout()
+    )
+    response.raise_for_status()
+    data = response.json()
+    return data.get("response", "").strip(), usage(data)
+
+
+def stream_generate(prompt: str, model: str = None, response_format: dict = None, temperature: float = None):
+    """Like generate(), but yields (piece, usage) as the model produces text; usage is only set on the last piece."""
+    response = transport.post(
+        f"{get_context().ollama_url}/api/generate",
+        provider="ollama",
+        json=request_payload(prompt, model, response_format, temperature, stream=True),
+        stream=True,
+        timeout=transport.llm_timeout()
+    )
     try:
-        response = requests.post("http://localhost:11434/api/generate", json=payload)
         response.raise_for_status()
-        data = response.json()
-        return data.get("response", "").strip()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            yield data.get("response", ""), usage(data) if data.get("done") else None
+    finally:
+        response.close()
+
+
+# def generate_text(model: str = "llama3.2:latest", prompt: str) -> str:
+def generate_text(prompt: str, model: str = "llama3.2:latest") -> str:
+    """Generate text using Ollama's local API."""
+    try:
+        text, _ = generate(prompt, model)
+        return text
 
     except requests.RequestException as e:
         print(f"❌ Ollama request failed: {e}")
@@ -1,4 +1,4 @@
-import requests
+from . import transport
 
 
 class OpenAIClient:
@@ -19,7 +19,7 @@ class OpenAIClient:
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens
         }
-        response = requests.post(f"{self.base_url}/chat/completions", json=payload, headers=headers)
+        response = transport.post(f"{self.base_url}/chat/completions", provider="openai", json=payload, headers=headers)
         response.raise_for_status()
         data = response.json()
         return data["choices"][0]["message"]["content"].strip()
@@ -0,0 +1,121 @@
+import json
+import time
+from . import transport
+from .app import get_context
+from .llm import get_cache, request_body, request_key
+from .logger import log_event
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchClient:
+    """Minimal client for the OpenAI Files + Batches endpoints."""
+
+    def __init__(self, api_key: str, base_url: str = None):
+        self.base_url = (base_url or "https://api.openai.com/v1").rstrip("/")
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    def submit(self, lines) -> str:
+        """Upload JSONL request lines and start a batch. Returns the batch id."""
+        payload = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines).encode("utf-8")
+        r = transport.post(
+            f"{self.base_url}/files",
+            provider="openai",
+            headers=self.headers,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", payload, "application/jsonl")}
+        )
+        r.raise_for_status()
+        file_id = r.json()["id"]
+
+        r = transport.post(
+            f"{self.base_url}/batches",
+            provider="openai",
+            headers=self.headers,
+            json={
+                "input_file_id": file_id,
+                "endpoint": BATCH_ENDPOINT,
+                "completion_window": "24h"
+            }
+        )
+        r.raise_for_status()
+        return r.json()["id"]
+
+    def status(self, batch_id: str) -> dict:
+        r = transport.get(f"{self.base_url}/batches/{batch_id}", provider="openai", headers=self.headers)
+        r.raise_for_status()
+        return r.json()
+
+    def wait(self, batch_id: str, poll_interval: float = 30) -> dict:
+        """Poll until the batch reaches a terminal status and return it."""
+        while True:
+            batch = self.status(batch_id)
+            if batch["status"] in TERMINAL_STATUSES:
+                return batch
+            log_event("INFO", "Waiting for batch", {"batch_id": batch_id, "status": batch["status"]})
+            time.sleep(poll_interval)
+
+    def results(self, batch: dict) -> dict:
+        """Map custom_id -> reply text for every successful request in a finished batch."""
+        if not batch.get("output_file_id"):
+            return {}
+        r = transport.get(f"{self.base_url}/files/{batch['output_file_id']}/content", provider="openai", headers=self.headers)
+        r.raise_for_status()
+        replies = {}
+        for line in r.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            replies[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return replies
+
+
+def prefill_cache(prompts, poll_interval: float = 30, temperature: float = 0.7, client: BatchClient = None) -> int:
+    """
+    Run (prompt, response_format) pairs that aren't cached yet as one batch and
+    store the replies in the LLM cache under the same keys chat() looks up.
+    Returns the number of replies stored. Anything that fails is simply left
+    for chat() to generate on the normal path.
+    """
+    cache = get_cache()
+    if cache.mode not in ("read-write", "refresh"):
+        raise ValueError(f"Batch mode needs a writable LLM cache, not '{cache.mode}'")
+
+    lines = {}
+    for prompt, response_format in prompts:
+        key = request_key(prompt, response_format, temperature)
+        if key in lines or cache.get(key) is not None:
+            continue
+        lines[key] = {
+            "custom_id": key,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": request_body(prompt, response_format, temperature)
+        }
+    if not lines:
+        return 0
+
+    settings = get_context()
+    client = client or BatchClient(settings.openai_api_key, settings.openai_base_url)
+    batch_id = client.submit(lines.values())
+    log_event("INFO", "Batch submitted", {"batch_id": batch_id, "requests": len(lines)})
+    batch = client.wait(batch_id, poll_interval=poll_interval)
+    if batch["status"] != "completed":
+        log_event("ERROR", f"Batch {batch_id} ended with status {batch['status']}")
+
+    stored = 0
+    for key, content in client.results(batch).items():
+        if key not in lines:
+            continue
+        try:
+            json.loads(content)
+        except ValueError:
+            continue
+        cache.put(key, content)
+        stored += 1
+    log_event("INFO", "Batch results cached", {"batch_id": batch_id, "stored": stored, "requested": len(lines)})
+    return stored
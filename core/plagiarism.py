@@ -0,0 +1,279 @@
+import re
+import time
+import random
+import hashlib
+from pathlib import Path
+from utils.sqlite_store import SQLiteStore
+from utils.html_text import html_to_text, split_sentences
+from .logger import log_event
+from . import metrics
+from .references import default_library
+
+PLAGIARISM_INDEX_PATH = "data/cache/plagiarism.sqlite3"
+DRAFTS_DIR = Path("data/drafts")
+
+# Word n-grams compared between texts
+SHINGLE_SIZE = 5
+# MinHash signature length, split into LSH bands of NUM_PERM / BANDS values each.
+# 16 bands of 2 make passages sharing roughly a quarter of their shingles candidates;
+# candidates are then checked sentence by sentence.
+NUM_PERM = 32
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+# At most this many candidates (those sharing the most bands) are checked per section
+MAX_CANDIDATES = 50
+# Documents are indexed, and sections looked up, as windows of this many sentences:
+# short enough that copying two sentences still makes a window look alike
+PASSAGE_SENTENCES = 3
+# A sentence is flagged when this share of its shingles appears in one indexed passage
+SENTENCE_THRESHOLD = 0.5
+# Sentences shorter than this many words are never flagged
+MIN_SENTENCE_WORDS = 8
+
+# One random mask per MinHash "permutation": shingle hashes are already uniform, so XOR-ing them
+# with a mask reorders them as well as a*x+b would, and map() keeps it out of the bytecode loop.
+# Fixed seed: signatures must stay comparable with the ones already stored in the index.
+_rng = random.Random(20250809)
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+
+
+def words(text: str) -> list:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def _stable_hash(text: str) -> int:
+    # Python's hash() changes between processes, and the index outlives them
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Hashed word n-grams of a text (the whole text as one shingle if it is shorter than n words)."""
+    tokens = words(text)
+    if not tokens:
+        return set()
+    if len(tokens) < size:
+        return {_stable_hash(" ".join(tokens))}
+    return {_stable_hash(" ".join(tokens[i:i + size])) for i in range(len(tokens) - size + 1)}
+
+
+def minhash(hashed_shingles: set) -> list:
+    return [min(map(mask.__xor__, hashed_shingles)) for mask in _MASKS]
+
+
+_BAND_MASKS = [_rng.getrandbits(64) for _ in range(BANDS)]
+_MIX = 0x9E3779B97F4A7C15
+_MAX_BUCKET = (1 << 63) - 1
+
+
+def buckets(signature: list) -> list:
+    """LSH bucket ids (one per band, kept in SQLite's signed 64-bit range) under which a signature is stored."""
+    ids = []
+    for band, band_mask in enumerate(_BAND_MASKS):
+        bucket = band_mask
+        for value in signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]:
+            bucket = ((bucket * _MIX) ^ value) & 0xFFFFFFFFFFFFFFFF
+        ids.append(bucket & _MAX_BUCKET)
+    return ids
+
+
+def sentences_of(text: str) -> list:
+    return [
+        sentence
+        for paragraph in (text or "").split("\n\n")
+        for sentence in split_sentences(paragraph)
+    ]
+
+
+def sentence_signatures(sentences: list) -> list:
+    return [minhash(shingles(sentence)) if words(sentence) else None for sentence in sentences]
+
+
+def window_signatures(sentences: list, signatures: list = None, size: int = PASSAGE_SENTENCES,
+                      step: int = None) -> list:
+    """
+    (window text, MinHash) for windows of `size` sentences, `step` sentences apart
+    (default: not overlapping). Shingles don't cross sentences, so a window's MinHash is
+    the element-wise min of its sentences' and each sentence is only hashed once.
+    """
+    signatures = signatures or sentence_signatures(sentences)
+    step = step or size
+    windows = []
+    for start in range(0, max(1, len(sentences) - size + step), step):
+        text = " ".join(sentences[start:start + size])
+        parts = [signature for signature in signatures[start:start + size] if signature]
+        if parts and len(words(text)) >= MIN_SENTENCE_WORDS:
+            windows.append((text, [min(values) for values in zip(*parts)]))
+    return windows
+
+
+class PlagiarismIndex(SQLiteStore):
+    """
+    MinHash/LSH index over earlier drafts and reference pages. A section is
+    looked up with one indexed query for its band buckets, so checks stay fast
+    as the corpus grows; only the passages it shares buckets with are compared
+    sentence by sentence.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        source TEXT PRIMARY KEY,
+        fingerprint TEXT,
+        indexed REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS passages (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS passages_source ON passages (source);
+    CREATE TABLE IF NOT EXISTS lsh_buckets (
+        bucket INTEGER NOT NULL,
+        passage_id INTEGER NOT NULL,
+        PRIMARY KEY (bucket, passage_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS lsh_buckets_passage ON lsh_buckets (passage_id);
+    """
+
+    def has_document(self, source: str, fingerprint: str = None) -> bool:
+        rows = self.execute("SELECT fingerprint FROM documents WHERE source = ?", (source,))
+        return bool(rows) and (fingerprint is None or rows[0][0] == fingerprint)
+
+    def add_document(self, source: str, text: str, fingerprint: str = None):
+        """Index (or re-index) a document's text under a source name such as "draft:<title>" or a URL."""
+        if self.has_document(source):
+            self.remove_document(source)
+        windows = window_signatures(sentences_of(text))
+        with self._lock, self._conn:
+            for passage, signature in windows:
+                passage_id = self._conn.execute(
+                    "INSERT INTO passages (source, text) VALUES (?, ?)", (source, passage)
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO lsh_buckets (bucket, passage_id) VALUES (?, ?)",
+                    [(bucket, passage_id) for bucket in buckets(signature)]
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (source, fingerprint, indexed) VALUES (?, ?, ?)",
+                (source, fingerprint, time.time())
+            )
+
+    def remove_document(self, source: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM lsh_buckets WHERE passage_id IN (SELECT id FROM passages WHERE source = ?)", (source,)
+            )
+            self._conn.execute("DELETE FROM passages WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+
+    def candidates(self, text: str, exclude=None) -> list:
+        """
+        (source, passage text) of indexed passages sharing LSH buckets with any
+        sentence window of text, most shared buckets first. exclude is a source,
+        or a list of sources, whose passages are left out.
+        """
+        # Sliding windows catch runs of copied sentences, single sentences the ones
+        # that straddle two indexed passages
+        sentences = sentences_of(text)
+        signatures = sentence_signatures(sentences)
+        keys = set()
+        for size in (PASSAGE_SENTENCES, 1):
+            for _, signature in window_signatures(sentences, signatures, size=size, step=1):
+                keys.update(buckets(signature))
+        if not keys:
+            return []
+        excluded = [exclude] if isinstance(exclude, str) else list(exclude or [""])
+        rows = self.execute(
+            f"""
+            SELECT p.source, p.text, COUNT(*) AS shared
+            FROM lsh_buckets b JOIN passages p ON p.id = b.passage_id
+            WHERE b.bucket IN ({",".join("?" * len(keys))}) AND p.source NOT IN ({",".join("?" * len(excluded))})
+            GROUP BY p.id ORDER BY shared DESC LIMIT ?
+            """,
+            [*keys, *excluded, MAX_CANDIDATES]
+        )
+        return [(source, passage) for source, passage, _ in rows]
+
+    def flagged_sentences(self, text: str, exclude=None) -> list:
+        """Sentences of text that largely repeat an indexed passage, as (sentence, source) pairs."""
+        candidates = [(source, shingles(passage)) for source, passage in self.candidates(text, exclude)]
+        if not candidates:
+            return []
+        flagged = []
+        for sentence in split_sentences(text):
+            if len(words(sentence)) < MIN_SENTENCE_WORDS:
+                continue
+            hashed = shingles(sentence)
+            for source, passage_shingles in candidates:
+                if len(hashed & passage_shingles) / len(hashed) >= SENTENCE_THRESHOLD:
+                    flagged.append((sentence, source))
+                    break
+        return flagged
+
+    @staticmethod
+    def _draft_fingerprint(path: Path) -> str:
+        stat = path.stat()
+        return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+    def add_draft(self, path: Path):
+        """Index a saved draft file under "draft:<file name>"."""
+        path = Path(path)
+        self.add_document(
+            f"draft:{path.stem}", html_to_text(path.read_text(encoding="utf-8")), self._draft_fingerprint(path)
+        )
+
+    def sync_drafts(self, drafts_dir: Path = DRAFTS_DIR) -> int:
+        """Index draft files that are new or changed since they were last indexed. Returns how many were."""
+        count = 0
+        for path in sorted(Path(drafts_dir).glob("*.txt")):
+            if self.has_document(f"draft:{path.stem}", self._draft_fingerprint(path)):
+                continue
+            self.add_draft(path)
+            count += 1
+        if count:
+            log_event("INFO", "Indexed drafts for plagiarism checks", {"drafts": count})
+        return count
+
+    def sync_store(self, drafts) -> int:
+        """Index DraftStore drafts ("draft:<row key>") whose content changed since they were last indexed."""
+        count = 0
+        for row_key, digest in drafts.hashes():
+            if self.has_document(f"draft:{row_key}", digest):
+                continue
+            self.add_document(f"draft:{row_key}", html_to_text(drafts.get(row_key)["html"]), digest)
+            count += 1
+        if count:
+            log_event("INFO", "Indexed stored drafts for plagiarism checks", {"drafts": count})
+        return count
+
+
+def index_references(index: PlagiarismIndex, urls, references=None) -> int:
+    """
+    Index reference pages that aren't in the index yet, or whose text changed. Returns how many were added.
+    Pages come through references (a ReferenceLibrary; the shared default one if not given),
+    so they are fetched and cached the same way as for the outline notes.
+    """
+    references = references or default_library()
+    added = 0
+    for url in urls:
+        if not url:
+            continue
+        page = references.page(url)
+        if not page or not page["text"] or index.has_document(url, page["text_hash"]):
+            continue
+        index.add_document(url, page["text"], page["text_hash"])
+        added += 1
+    return added
+
+
+def check_sections(index: PlagiarismIndex, sections, exclude=None) -> dict:
+    """
+    Flagged sentences per section: {section index: [(sentence, source), ...]}.
+    sections are {"heading", "content"} dicts.
+    """
+    flagged = {}
+    for number, section in enumerate(sections):
+        with metrics.span("plagiarism_lookup") as span:
+            found = index.flagged_sentences(section.get("content", ""), exclude)
+            span["hit"] = bool(found)
+        if found:
+            flagged[number] = found
+    return flagged
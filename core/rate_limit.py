@@ -0,0 +1,280 @@
+import time
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+# Client-side request budgets per provider. rpm = requests/minute, tpm = LLM tokens/minute.
+# The image vendor numbers follow their free tiers (Unsplash demo apps get 50 requests/hour).
+DEFAULT_RATES = {
+    "openai": {"rpm": 500, "tpm": 200000},
+    "unsplash": {"rpm": 50 / 60},
+    "pexels": {"rpm": 200 / 60},
+    "pixabay": {"rpm": 100},
+    "wikimedia": {"rpm": 200},
+    "freepik": {"rpm": 60},
+    "wordpress": {"rpm": 300}
+}
+# Adaptive concurrency starts here and moves between 1 and MAX_CONCURRENCY
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 32
+# Slower replies than this count as congestion and shrink concurrency a little
+LATENCY_TARGET = {"openai": 90.0}
+# Longest a call waits out a Retry-After or an exhausted quota; asked for longer, the
+# retry most likely fails and the caller gets the 429 instead of holding a worker
+MAX_PAUSE = 60.0
+
+_reservations = threading.local()
+
+
+class RateLimited(Exception):
+    """A provider's budget is used up and the caller asked not to wait for it."""
+
+
+class TokenBucket:
+    """Allows `rate_per_minute` units per minute with bursts of at most `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """Take amount if it is available right now, without waiting."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by about one slot per limit's worth of good
+    calls, halves on a 429 and shrinks slightly when calls get slow.
+    """
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, minimum: int = 1, maximum: int = MAX_CONCURRENCY,
+                 latency_target: float = None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False, latency: float = None):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif self.latency_target and latency and latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class CallOutcome:
+    """Handed to the caller inside ProviderLimiter.call() to report how the call went."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.throttled = False
+
+    def throttle(self, retry_after: float = None):
+        """The provider answered 429; back off for retry_after seconds (or an increasing default)."""
+        self.throttled = True
+        self.limiter.throttled(retry_after)
+
+    def observe_headers(self, headers):
+        """Pause early when rate-limit headers say the quota is used up."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.strip() == "0":
+            self.limiter.pause(reset_seconds(headers) or 60)
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, rpm: float = None, tpm: float = None):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AdaptiveLimiter(latency_target=LATENCY_TARGET.get(name))
+        self.paused_until = 0.0
+        # When the provider said it would take requests again; callers that can go
+        # elsewhere skip it until then, even after blocking callers stop waiting
+        self.available_at = 0.0
+        self.throttle_count = 0
+        self.consecutive_throttles = 0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + min(seconds, MAX_PAUSE))
+            self.available_at = max(self.available_at, now + seconds)
+
+    def try_reserve(self) -> bool:
+        """Take one request without waiting; False while paused or out of budget."""
+        with self._lock:
+            if time.monotonic() < max(self.paused_until, self.available_at):
+                return False
+        return self.requests.try_acquire(1) if self.requests else True
+
+    def throttled(self, retry_after: float = None):
+        with self._lock:
+            self.throttle_count += 1
+            self.consecutive_throttles += 1
+            backoff = min(60.0, 2.0 ** self.consecutive_throttles)
+        self.pause(retry_after if retry_after is not None else backoff)
+
+    def _wait_for_pause(self):
+        while True:
+            with self._lock:
+                wait = self.paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _take_without_waiting(self):
+        reserved = getattr(_reservations, "names", {})
+        if reserved.get(self.name):
+            reserved[self.name] -= 1
+        elif not self.try_reserve():
+            raise RateLimited(f"{self.name} rate limit reached")
+
+    @contextmanager
+    def call(self, tokens: int = 0):
+        if self.name in getattr(_reservations, "names", {}):
+            self._take_without_waiting()
+        else:
+            self._wait_for_pause()
+            if self.requests:
+                self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+        self.concurrency.acquire()
+        outcome = CallOutcome(self)
+        start = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            if not outcome.throttled:
+                with self._lock:
+                    self.consecutive_throttles = 0
+            self.concurrency.release(throttled=outcome.throttled, latency=time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {"concurrency": round(self.concurrency.limit, 2), "throttled": self.throttle_count}
+
+
+_limiters = {}
+_rates = {name: dict(rate) for name, rate in DEFAULT_RATES.items()}
+_registry_lock = threading.Lock()
+
+
+def configure_rate(name: str, rpm: float = None, tpm: float = None):
+    """Override a provider's budget. Call before the first request to it."""
+    with _registry_lock:
+        rate = _rates.setdefault(name, {})
+        if rpm is not None:
+            rate["rpm"] = rpm
+        if tpm is not None:
+            rate["tpm"] = tpm
+        _limiters.pop(name, None)
+
+
+def get_limiter(name: str) -> ProviderLimiter:
+    with _registry_lock:
+        if name not in _limiters:
+            rate = _rates.get(name, {})
+            _limiters[name] = ProviderLimiter(name, rpm=rate.get("rpm"), tpm=rate.get("tpm"))
+        return _limiters[name]
+
+
+def limit(name: str, tokens: int = 0):
+    """Context manager wrapping one call to a provider: `with limit("pexels") as call: ...`."""
+    return get_limiter(name).call(tokens)
+
+
+@contextmanager
+def reserve(name: str):
+    """
+    Take one request from a provider's budget without waiting, for callers that can
+    fall back to another provider: `with reserve("pexels") as ok: ...`. ok is False
+    if the budget is used up. Inside the block, calls to that provider on this thread
+    use the reserved request first and then raise RateLimited instead of waiting.
+    """
+    names = _reservations.__dict__.setdefault("names", {})
+    outer = names.get(name)
+    ok = get_limiter(name).try_reserve()
+    names[name] = 1 if ok else 0
+    try:
+        yield ok
+    finally:
+        if outer is None:
+            names.pop(name, None)
+        else:
+            names[name] = outer
+
+
+def stats() -> dict:
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def estimate_tokens(prompt: str, completion: int = 1000) -> int:
+    """Rough token count for tokens/minute budgeting (about 4 characters per token)."""
+    return len(prompt) // 4 + completion
+
+
+def retry_after_seconds(headers):
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date), or None."""
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def reset_seconds(headers):
+    """Seconds until X-RateLimit-Reset; vendors send either an epoch timestamp or a delay."""
+    value = (headers or {}).get("X-RateLimit-Reset")
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    if reset > 1e9:
+        reset -= time.time()
+    return max(0.0, reset)
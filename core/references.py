@@ -0,0 +1,272 @@
+import re
+import time
+import zlib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.sqlite_store import SQLiteStore
+from utils.html_text import main_text, split_sentences
+from .logger import log_event
+from .concurrency import stage_limit
+from .rate_limit import estimate_tokens
+from . import transport, metrics
+
+REFERENCE_CACHE_PATH = "data/cache/references.sqlite3"
+# Pages fetched less than this long ago are used without asking the server again;
+# older ones are revalidated with If-None-Match / If-Modified-Since
+REVALIDATE_SECONDS = 24 * 3600
+# Token budget of one page's summary. Summaries don't depend on the row, so every
+# row citing a page reuses the same one.
+PAGE_TOKENS = 300
+# Token budget for all of a row's reference notes together
+ROW_TOKENS = 900
+# Pages fetched at once for one row; the "references" stage limit caps the total
+FETCH_WORKERS = 4
+# Only this much of a page's text is kept
+MAX_TEXT_CHARS = 200_000
+# Sentences outside this length (in words) are rarely worth quoting
+MIN_SENTENCE_WORDS = 6
+MAX_SENTENCE_WORDS = 60
+# A sentence sharing this much of its vocabulary with one already picked is skipped
+DUPLICATE_OVERLAP = 0.6
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+
+STOPWORDS = set("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its just me more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your
+""".split())
+
+
+def content_words(text: str) -> list:
+    return [word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS and len(word) > 2]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def condense(text: str, max_tokens: int = PAGE_TOKENS) -> list:
+    """
+    Extractive summary of a page: the sentences that best cover its most frequent
+    content words, without near-duplicates, kept in page order, within max_tokens.
+    Returns the sentences.
+    """
+    sentences = [
+        sentence
+        for paragraph in (text or "").split("\n\n")
+        for sentence in split_sentences(paragraph)
+        if MIN_SENTENCE_WORDS <= len(sentence.split()) <= MAX_SENTENCE_WORDS
+    ]
+    if not sentences:
+        return []
+    frequency = {}
+    for sentence in sentences:
+        for word in set(content_words(sentence)):
+            frequency[word] = frequency.get(word, 0) + 1
+
+    def score(item):
+        position, sentence = item
+        words = set(content_words(sentence))
+        if not words:
+            return 0.0
+        # Sentences early on a page tend to state what it is about
+        return sum(frequency[word] for word in words) / len(words) ** 0.5 * (1 + 1 / (1 + position))
+
+    picked = []
+    picked_words = []
+    budget = max_tokens
+    for position, sentence in sorted(enumerate(sentences), key=score, reverse=True):
+        cost = estimate_tokens(sentence, completion=0) + 1
+        if cost > budget:
+            continue
+        words = set(content_words(sentence))
+        if any(len(words & other) > DUPLICATE_OVERLAP * len(words) for other in picked_words):
+            continue
+        picked.append((position, sentence))
+        picked_words.append(words)
+        budget -= cost
+    return [sentence for _, sentence in sorted(picked)]
+
+
+class ReferenceCache(SQLiteStore):
+    """
+    Reference pages' extracted text with the validators (ETag, Last-Modified) to
+    revalidate it, and the condensed summary of that text.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        text BLOB,
+        text_hash TEXT,
+        summary TEXT,
+        summary_tokens INTEGER,
+        fetched REAL NOT NULL,
+        checked REAL NOT NULL
+    );
+    """
+
+    def get(self, url: str):
+        rows = self.execute(
+            "SELECT etag, last_modified, text, text_hash, summary, summary_tokens, checked FROM pages WHERE url = ?",
+            (url,)
+        )
+        if not rows:
+            return None
+        etag, last_modified, text, digest, summary, summary_tokens, checked = rows[0]
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "text": zlib.decompress(text).decode("utf-8") if text else "",
+            "text_hash": digest,
+            "summary": summary,
+            "summary_tokens": summary_tokens,
+            "checked": checked
+        }
+
+    def save_page(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        """Store a freshly downloaded page; its summary is dropped if the text changed."""
+        now = time.time()
+        digest = text_hash(text)
+        self.execute(
+            """
+            INSERT INTO pages (url, etag, last_modified, text, text_hash, fetched, checked)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                etag = excluded.etag, last_modified = excluded.last_modified,
+                summary = CASE WHEN text_hash = excluded.text_hash THEN summary END,
+                summary_tokens = CASE WHEN text_hash = excluded.text_hash THEN summary_tokens END,
+                text = excluded.text, text_hash = excluded.text_hash,
+                fetched = excluded.fetched, checked = excluded.checked
+            """,
+            (url, etag, last_modified, zlib.compress(text.encode("utf-8"), 6), digest, now, now)
+        )
+
+    def mark_checked(self, url: str):
+        """The server said the page didn't change (304)."""
+        self.execute("UPDATE pages SET checked = ? WHERE url = ?", (time.time(), url))
+
+    def save_summary(self, url: str, digest: str, tokens: int, summary: str):
+        self.execute(
+            "UPDATE pages SET summary = ?, summary_tokens = ? WHERE url = ? AND text_hash = ?",
+            (summary, tokens, url, digest)
+        )
+
+
+class ReferenceLibrary:
+    """
+    Fetches reference pages, extracts their main text and condenses it into notes
+    for the outline prompt. Pages and summaries are cached on disk and revalidated
+    with conditional requests, so a page cited by many rows is downloaded and
+    condensed once.
+    """
+
+    def __init__(self, cache: ReferenceCache, page_tokens: int = PAGE_TOKENS, row_tokens: int = ROW_TOKENS,
+                 revalidate_seconds: float = REVALIDATE_SECONDS):
+        self.cache = cache
+        self.page_tokens = page_tokens
+        self.row_tokens = row_tokens
+        self.revalidate_seconds = revalidate_seconds
+        # One lock per URL, so rows citing the same page don't fetch it at the same time
+        self._url_locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def page(self, url: str):
+        """The cached page record for url, fetched or revalidated first if needed. None if unavailable."""
+        with self._url_lock(url):
+            cached = self.cache.get(url)
+            if cached and time.time() - cached["checked"] < self.revalidate_seconds:
+                metrics.count("reference_cache_hits")
+                return cached
+            headers = dict(HEADERS)
+            if cached and cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached and cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+            try:
+                with stage_limit("references"), metrics.span("reference_fetch") as span:
+                    response = transport.get(url, headers=headers)
+                    span["bytes"] = len(response.content)
+                    span["revalidated"] = response.status_code == 304
+                if response.status_code == 304 and cached:
+                    self.cache.mark_checked(url)
+                    return self.cache.get(url)
+                response.raise_for_status()
+                text = main_text(response.text)[:MAX_TEXT_CHARS]
+            except Exception as e:
+                log_event("ERROR", f"Couldn't fetch reference page {url}: {e}")
+                # A stale copy beats none
+                return cached
+            self.cache.save_page(
+                url, text, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified")
+            )
+            return self.cache.get(url)
+
+    def page_text(self, url: str) -> str:
+        page = self.page(url)
+        return page["text"] if page else ""
+
+    def summary(self, url: str) -> list:
+        """Summary sentences of a page, condensed once per page version and token budget."""
+        page = self.page(url)
+        if not page or not page["text"]:
+            return []
+        if page["summary"] is not None and page["summary_tokens"] == self.page_tokens:
+            return page["summary"].split("\n") if page["summary"] else []
+        with metrics.span("reference_condense"):
+            sentences = condense(page["text"], self.page_tokens)
+        self.cache.save_summary(url, page["text_hash"], self.page_tokens, "\n".join(sentences))
+        return sentences
+
+    def summaries(self, urls) -> dict:
+        """{url: summary sentences} for several pages, fetched concurrently."""
+        urls = [url for url in dict.fromkeys(urls or []) if url]
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls))) as executor:
+            return dict(zip(urls, executor.map(self.summary, urls)))
+
+    def notes(self, urls) -> str:
+        """
+        The row's reference notes for the outline prompt, within row_tokens:
+        each page's summary under its URL. Empty if no page could be used.
+        """
+        summaries = {url: sentences for url, sentences in self.summaries(urls).items() if sentences}
+        if not summaries:
+            return ""
+        # Share the row budget between its pages; a page keeps its leading sentences
+        share = self.row_tokens // len(summaries)
+        blocks = []
+        for url, sentences in summaries.items():
+            kept = []
+            budget = share - estimate_tokens(url, completion=0)
+            for sentence in sentences:
+                budget -= estimate_tokens(sentence, completion=0) + 1
+                if budget < 0:
+                    break
+                kept.append(sentence)
+            if kept:
+                blocks.append(f"Source: {url}\n" + "\n".join(f"- {sentence}" for sentence in kept))
+        return "\n\n".join(blocks)
+
+
+_default_library = None
+_default_lock = threading.Lock()
+
+
+def default_library() -> ReferenceLibrary:
+    """A ReferenceLibrary on the default cache, for callers that weren't handed one."""
+    global _default_library
+    with _default_lock:
+        if _default_library is None:
+            _default_library = ReferenceLibrary(ReferenceCache(REFERENCE_CACHE_PATH))
+        return _default_library
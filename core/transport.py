@@ -0,0 +1,94 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from . import rate_limit
+
+# Shared HTTP session for every client in core/, so connections to the same
+# host are kept alive and reused instead of re-doing TCP + TLS on each call.
+settings = {
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,
+    # LLM replies arrive only once the whole generation is done (unless streamed);
+    # 600 is the OpenAI SDK's own default
+    "llm_timeout": 600.0,
+    # hosts kept in the pool / open connections kept per host
+    "pool_hosts": 20,
+    "pool_size": 20
+}
+# How many times a 429 answer is retried (after the provider's Retry-After) before giving up
+THROTTLE_RETRIES = 2
+
+_session = None
+_lock = threading.Lock()
+
+
+def configure(**options):
+    """Change timeouts or pool sizing, e.g. configure(read_timeout=120, pool_size=50)."""
+    global _session
+    for name, value in options.items():
+        if name not in settings:
+            raise ValueError(f"Unknown transport option: {name}")
+        if value is not None:
+            settings[name] = value
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=int(settings["pool_hosts"]),
+                pool_maxsize=int(settings["pool_size"])
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def timeout():
+    return (settings["connect_timeout"], settings["read_timeout"])
+
+
+def llm_timeout():
+    return (settings["connect_timeout"], settings["llm_timeout"])
+
+
+def request(method: str, url: str, provider: str = None, **kwargs) -> requests.Response:
+    """
+    Send a request on the shared session. With a provider name the call goes
+    through that provider's rate limiter, and 429 answers are retried after
+    the wait the provider asks for.
+    """
+    kwargs.setdefault("timeout", timeout())
+    session = get_session()
+    if provider is None:
+        return session.request(method, url, **kwargs)
+
+    body = kwargs.get("data")
+    start = body.tell() if hasattr(body, "seek") else None
+    for attempt in range(THROTTLE_RETRIES + 1):
+        if start is not None:
+            body.seek(start)
+        with rate_limit.limit(provider) as call:
+            response = session.request(method, url, **kwargs)
+            if response.status_code == 429:
+                call.throttle(rate_limit.retry_after_seconds(response.headers))
+            else:
+                call.observe_headers(response.headers)
+        if response.status_code != 429 or attempt == THROTTLE_RETRIES:
+            return response
+        response.close()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
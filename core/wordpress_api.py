@@ -1,7 +1,19 @@
 import requests
 from requests.auth import HTTPBasicAuth
 import base64
-import requests
+import threading
+from concurrent.futures import Future
+from . import transport, metrics
+from .concurrency import stage_limit
+from .logger import log_event
+
+# WordPress rejects batch requests with more sub-requests than this
+BATCH_LIMIT = 25
+
+
+class BatchUnsupported(Exception):
+    """The site has no /wp-json/batch/v1 route (WordPress older than 5.6)."""
+
 
 class WordPressClient:
     def __init__(self, base_url: str, username: str, app_password: str):
@@ -14,17 +26,212 @@ class WordPressClient:
             "Content-Type": "application/json",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
         }
+        # Set to False once the site turns out not to have the batch endpoint
+        self.batch_supported = True
 
-    def create_post(self, title: str, content: str, media_id: int, excerpt: str, status: str = "draft") -> dict:
-        url = f"{self.base_url}/wp-json/wp/v2/posts"
+    @staticmethod
+    def post_payload(title: str, content: str, media_id: int, excerpt: str, status: str = "draft",
+                     slug: str = None) -> dict:
         payload = {
             "title": title,
             "content": content,
-            "featured_media": media_id,
             "excerpt": excerpt,
             "status": status
         }
-        response = requests.post(url, headers=self.headers, json=payload)
+        # No image found: leave the post without one rather than sending null
+        if media_id is not None:
+            payload["featured_media"] = media_id
+        if slug:
+            payload["slug"] = slug
+        return payload
+
+    def create_post(self, title: str, content: str, media_id: int, excerpt: str, status: str = "draft",
+                    slug: str = None) -> dict:
+        url = f"{self.base_url}/wp-json/wp/v2/posts"
+        payload = self.post_payload(title, content, media_id, excerpt, status, slug)
+        with stage_limit("wordpress"), metrics.span("create_post"):
+            response = transport.post(url, provider="wordpress", headers=self.headers, json=payload)
         if response.status_code != 201:
             raise Exception(f"Failed to create post: {response.status_code} - {response.text}")
         return response.json()
+
+    def update_post(self, post_id: int, payload: dict) -> dict:
+        url = f"{self.base_url}/wp-json/wp/v2/posts/{post_id}"
+        with stage_limit("wordpress"), metrics.span("update_post"):
+            response = transport.post(url, provider="wordpress", headers=self.headers, json=payload)
+        if response.status_code != 200:
+            raise Exception(f"Failed to update post {post_id}: {response.status_code} - {response.text}")
+        return response.json()
+
+    def find_posts_by_slug(self, slugs) -> dict:
+        """Existing posts (any status) for these slugs, as {slug: post}. Up to 100 slugs per call."""
+        slugs = [slug for slug in dict.fromkeys(slugs) if slug]
+        if not slugs:
+            return {}
+        url = f"{self.base_url}/wp-json/wp/v2/posts"
+        params = {
+            "slug": ",".join(slugs),
+            "status": "any",
+            "per_page": 100,
+            "context": "edit",
+            "_fields": "id,slug,status,title"
+        }
+        with stage_limit("wordpress"), metrics.span("find_posts"):
+            response = transport.get(url, provider="wordpress", headers=self.headers, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Failed to look up posts: {response.status_code} - {response.text}")
+        return {post["slug"]: post for post in response.json()}
+
+    def find_post_by_slug(self, slug: str):
+        return self.find_posts_by_slug([slug]).get(slug)
+
+    def upsert_post(self, title: str, content: str, media_id: int, excerpt: str, status: str = "draft",
+                    slug: str = None) -> dict:
+        """Update the post with this slug if there is one, otherwise create it, so re-runs don't duplicate posts."""
+        payload = self.post_payload(title, content, media_id, excerpt, status, slug)
+        existing = self.find_post_by_slug(slug) if slug else None
+        if existing:
+            log_event("INFO", "Updating existing post", {"slug": slug, "post_id": existing["id"]})
+            return self.update_post(existing["id"], payload)
+        return self.create_post(title, content, media_id, excerpt, status, slug)
+
+    def batch(self, sub_requests) -> list:
+        """
+        Send up to BATCH_LIMIT sub-requests ({"method", "path", "body"}) through /wp-json/batch/v1.
+        Returns one {"status", "body"} per sub-request, in order.
+        """
+        url = f"{self.base_url}/wp-json/batch/v1"
+        payload = {"validation": "normal", "requests": list(sub_requests)}
+        with stage_limit("wordpress"), metrics.span("wp_batch") as span:
+            span["requests"] = len(payload["requests"])
+            response = transport.post(url, provider="wordpress", headers=self.headers, json=payload)
+        if response.status_code == 404 and _error_code(response) == "rest_no_route":
+            raise BatchUnsupported(f"No batch endpoint at {url}")
+        if response.status_code not in (200, 207):
+            raise Exception(f"Batch request failed: {response.status_code} - {response.text}")
+        data = response.json()
+        # With validation errors WordPress answers {"failed": "validation", "responses": [...]} and runs nothing
+        responses = data.get("responses", [])
+        if len(responses) != len(payload["requests"]):
+            raise Exception(f"Batch returned {len(responses)} results for {len(payload['requests'])} requests")
+        return responses
+
+    def save_posts(self, payloads, upsert: bool = False) -> list:
+        """
+        Create (or with upsert, create-or-update by slug) several posts in batched requests.
+        Returns a result per payload, in order: the post dict, or the Exception for that item.
+        """
+        payloads = list(payloads)
+        results = []
+        for start in range(0, len(payloads), BATCH_LIMIT):
+            results.extend(self._save_chunk(payloads[start:start + BATCH_LIMIT], upsert))
+        return results
+
+    def _save_chunk(self, payloads, upsert):
+        existing = {}
+        if upsert:
+            try:
+                existing = self.find_posts_by_slug(payload.get("slug") for payload in payloads)
+            except Exception as err:
+                return [err] * len(payloads)
+        sub_requests = []
+        for payload in payloads:
+            post = existing.get(payload.get("slug"))
+            path = f"/wp/v2/posts/{post['id']}" if post else "/wp/v2/posts"
+            sub_requests.append({"method": "POST", "path": path, "body": payload})
+
+        if not self.batch_supported:
+            return [self._save_one(payload, existing.get(payload.get("slug"))) for payload in payloads]
+        try:
+            responses = self.batch(sub_requests)
+        except BatchUnsupported as err:
+            log_event("WARNING", f"Batch publish unavailable, posting one by one: {err}")
+            self.batch_supported = False
+            return [self._save_one(payload, existing.get(payload.get("slug"))) for payload in payloads]
+        except Exception as err:
+            # A timeout or 5xx may come after WordPress already created the posts,
+            # so posting them again could duplicate them: fail the items instead
+            log_event("ERROR", f"Batch publish failed: {err}")
+            return [err] * len(payloads)
+
+        results = []
+        for payload, item in zip(payloads, responses):
+            status = item.get("status")
+            if status in (200, 201):
+                results.append(item["body"])
+            else:
+                body = item.get("body") or {}
+                results.append(Exception(
+                    f"Failed to save post '{payload.get('title')}': {status} - {body.get('message', body)}"
+                ))
+        return results
+
+    def _save_one(self, payload, existing=None):
+        try:
+            if existing:
+                return self.update_post(existing["id"], payload)
+            return self.create_post(**{
+                "title": payload["title"],
+                "content": payload["content"],
+                "media_id": payload.get("featured_media"),
+                "excerpt": payload["excerpt"],
+                "status": payload["status"],
+                "slug": payload.get("slug")
+            })
+        except Exception as err:
+            return err
+
+
+class PostQueue:
+    """
+    Collects post payloads from many row workers and saves them BATCH_LIMIT at a time.
+    submit() returns a Future that resolves to the saved post (or raises that item's error)
+    once its batch has been sent; call flush() at the end for the last partial batch.
+    """
+
+    def __init__(self, client: WordPressClient, batch_size: int = BATCH_LIMIT, upsert: bool = False):
+        self.client = client
+        self.batch_size = max(1, min(batch_size, BATCH_LIMIT))
+        self.upsert = upsert
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def submit(self, payload: dict) -> Future:
+        future = Future()
+        with self._lock:
+            self._pending.append((payload, future))
+            ready = self._take() if len(self._pending) >= self.batch_size else None
+        if ready:
+            self._send(ready)
+        return future
+
+    def flush(self):
+        while True:
+            with self._lock:
+                ready = self._take()
+            if not ready:
+                return
+            self._send(ready)
+
+    def _take(self):
+        ready, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        return ready
+
+    def _send(self, items):
+        try:
+            results = self.client.save_posts([payload for payload, _ in items], upsert=self.upsert)
+        except Exception as err:
+            results = [err] * len(items)
+        for (_, future), result in zip(items, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _error_code(response) -> str:
+    """The "code" of a WordPress REST error body, or None."""
+    try:
+        return response.json().get("code")
+    except ValueError:
+        return None
@@ -1,30 +1,49 @@
-import os
 import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Any, Dict
-import pandas as pd
-from dotenv import load_dotenv
 from pathlib import Path
+from retrying import retry
 from models.article import Article
-from utils.text_cleaner import clean_article_text
-from utils.file_handler import save_draft
-from core.logger import log_event
-from core.wordpress_api import WordPressClient
-from core.image_vendor import bot
-from templates.article_outline import STRING_ONE, STRING_TWO, STRING_THREE, STRING_FOUR, STRING_FIVE
-
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-
-
-load_dotenv()
-
-wordpress_url = os.getenv("WORDPRESS_URL")
-wordpress_username = os.getenv("WORDPRESS_USERNAME")
-wordpress_app_password = os.getenv("WORDPRESS_APP_PASSWORD")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_model = os.getenv("OPENAI_MODEL")
-
-def build_article_outline_prompt(main_keyword, reference_links=None, secondary_keywords=None):
+from models.run_options import RunOptions
+from utils.text_cleaner import clean_article_text, slugify
+from utils.file_handler import save_draft, draft_file
+from utils.draft_store import DraftStore, DRAFT_STORE_PATH
+from utils.html_text import html_to_text
+from utils.row_reader import read_rows
+from utils.json_stream import SectionStreamParser
+from utils.json_repair import parse_reply, salvage_sections
+from core.logger import log_event, configure_logging
+from core.app import get_context
+from core.concurrency import configure_limits
+from core import transport, rate_limit, metrics
+from core.llm import chat, stream_chat, configure_cache, configure_route, route, LLM_CACHE_PATH
+from core.llm_cache import CACHE_MODES
+from core.openai_batch import prefill_cache
+from core.job_state import JobState, JOB_STATE_PATH, job_key
+from core.job_queue import (
+    JobQueue, JOB_QUEUE_PATH, LEASE_SECONDS, POLL_INTERVAL, worker_name, leased_rows, keep_leases
+)
+from core.media_cache import MediaCache, MEDIA_CACHE_PATH
+from core.plagiarism import PlagiarismIndex, PLAGIARISM_INDEX_PATH, index_references, check_sections
+from core.wordpress_api import PostQueue, BATCH_LIMIT
+from core.references import ReferenceCache, ReferenceLibrary, REFERENCE_CACHE_PATH, ROW_TOKENS
+from templates.article_outline import STRING_ONE, STRING_TWO, STRING_THREE, STRING_FOUR, STRING_FIVE, STRING_EIGHT
+
+# Tries per structured LLM request before giving up on the reply
+LLM_MAX_ATTEMPTS = 3
+PIPELINE_MODES = ("staged", "parallel", "combined")
+# Image lookups in flight per article; the "images" stage limit still caps the total
+SECTION_IMAGE_WORKERS = 8
+# Rows read ahead of the workers, per worker; the sheet is never loaded whole
+ROW_QUEUE_PER_WORKER = 4
+# What run_rows gets from next() once the rows run out
+END_OF_ROWS = object()
+
+
+def build_outline_intro(main_keyword, reference_links=None, secondary_keywords=None, reference_notes=None):
     reference_links = reference_links or []
     secondary_keywords = secondary_keywords or []
 
@@ -46,10 +65,25 @@ def build_article_outline_prompt(main_keyword, reference_links=None, secondary_k
             main_keyword=main_keyword,
             secondary_keywords=", ".join(secondary_keywords)
         )
+    if reference_links and reference_notes:
+        intro += "\n\n" + STRING_EIGHT.format(reference_notes=reference_notes)
+    return intro
+
+def build_article_outline_prompt(main_keyword, reference_links=None, secondary_keywords=None, reference_notes=None):
+    intro = build_outline_intro(main_keyword, reference_links, secondary_keywords, reference_notes)
     final_instruction = STRING_FIVE
 
     return f"{intro}\n\n{final_instruction}"
 
+def build_combined_prompt(main_keyword, reference_links=None, secondary_keywords=None, reference_notes=None):
+    """Prompt asking for outline, sections and excerpt in one reply. Returns (prompt, response_format)."""
+    return build_template_prompt(
+        "for_article",
+        "article_structoutput",
+        OutlineRequest=build_outline_intro(main_keyword, reference_links, secondary_keywords, reference_notes),
+        MainKeyword=main_keyword
+    )
+
 def load_prompt(template_name: str, **kwargs) -> str:
     path = Path("templates") / f"{template_name}.txt"
     template = path.read_text(encoding="utf-8")
@@ -62,9 +96,8 @@ def load_schema(schema_name: str) -> Dict[str, Any]:
         raise FileNotFoundError(f"Schema file not found: {schema_name}")
     return json.loads(path.read_text(encoding="utf-8"))
 
-def run_llm(template_name: str, schema_name: str, **kwargs):
-    """Run a template + schema (example embedded) with manual JSON parsing."""
-    
+def build_template_prompt(template_name: str, schema_name: str, **kwargs):
+    """Render a template with its schema example appended. Returns (prompt, response_format)."""
     # Load json schema + example from file
     schema_file = load_schema(schema_name)
     example_json = schema_file["example"]
@@ -82,24 +115,63 @@ def run_llm(template_name: str, schema_name: str, **kwargs):
     full_prompt = f"""{prompt_text}
     {format_instructions}
     """
-    llm = ChatOpenAI(
-        model=openai_model,
-        temperature=0.7,
-        api_key=openai_api_key,
-        response_format = json_schema
-    )
+    return full_prompt, json_schema
 
-    chain = PromptTemplate.from_template("{prompt}") | llm
-    result = chain.invoke({"prompt": full_prompt})
+def stream_sections(full_prompt: str, json_schema: dict, on_section, validate=json.loads, stage=None) -> str:
+    """
+    Stream a reply that contains a "sections" array, calling on_section(index, section)
+    as soon as each section object is complete. Returns the full reply text.
+    """
+    parser = SectionStreamParser()
+    parts = []
+    for chunk in stream_chat(full_prompt, response_format=json_schema, validate=validate, stage=stage):
+        parts.append(chunk)
+        for index, section in parser.feed(chunk):
+            on_section(index, section)
+    return "".join(parts)
+
+def llm_stage(schema_name: str) -> str:
+    """LLM route for a schema: "outline", "content", "excerpt" or "article"."""
+    return schema_name.replace("_structoutput", "")
+
+def request_structured(full_prompt: str, json_schema: dict, schema_name: str, on_section=None):
+    """
+    Ask for a reply matching json_schema. Small JSON mistakes are repaired locally;
+    replies that still don't validate are retried with exponential backoff.
+    Returns (data, last_reply); data is None once every attempt has failed.
+    The call is routed by schema name, e.g. "excerpt_structoutput" goes to the "excerpt" route.
+    """
+    schema = json_schema["json_schema"]["schema"]
+    stage = llm_stage(schema_name)
+    validate = lambda text: parse_reply(text, schema)
+    replies = []
+
+    @retry(stop_max_attempt_number=LLM_MAX_ATTEMPTS, wait_exponential_multiplier=1000, wait_exponential_max=10000)
+    def attempt():
+        if on_section:
+            reply = stream_sections(full_prompt, json_schema, on_section, validate=validate, stage=stage)
+        else:
+            reply = chat(full_prompt, response_format=json_schema, validate=validate, stage=stage)
+        replies.append(reply)
+        return parse_reply(reply, schema)
 
-    try:     
-        return json.loads(result.content)
+    try:
+        return attempt(), replies[-1]
     except Exception as err:
-        log_event("ERROR", f"{schema_name}: {err}")  
-        return None     
+        log_event("ERROR", f"{schema_name}: {err}")
+        return None, replies[-1] if replies else None
 
-def run_llm_from_text(prompt_text: str, schema_name: str):
-    """Run plain text prompt using example-based formatting and schema validation."""
+def run_llm(template_name: str, schema_name: str, on_section=None, **kwargs):
+    """
+    Run a template + schema (example embedded), returning the validated JSON or None.
+    With on_section, the reply is streamed and each finished section is handed over early.
+    """
+    full_prompt, json_schema = build_template_prompt(template_name, schema_name, **kwargs)
+    data, _ = request_structured(full_prompt, json_schema, schema_name, on_section)
+    return data
+
+def build_text_prompt(prompt_text: str, schema_name: str):
+    """Append strict JSON format instructions to a plain prompt. Returns (prompt, response_format)."""
     schema_file = load_schema(schema_name)
     json_example = schema_file["example"]
     json_schema = schema_file["format"]
@@ -116,33 +188,109 @@ def run_llm_from_text(prompt_text: str, schema_name: str):
 
     {format_instructions}
     """
+    return full_prompt, json_schema
 
-    llm = ChatOpenAI(
-        model=openai_model,
-        temperature=0.7,
-        api_key=openai_api_key,
-        response_format = json_schema
-    )
-    chain = PromptTemplate.from_template("{prompt}") | llm
-    try:
-        result = chain.invoke({"prompt": full_prompt})
-        return json.loads(result.content)
-    except Exception as err:
-        log_event("ERROR", f"JSON does not match schema: {err}")
-        return None 
+def run_llm_from_text(prompt_text: str, schema_name: str):
+    """Run plain text prompt using example-based formatting and schema validation."""
+    full_prompt, json_schema = build_text_prompt(prompt_text, schema_name)
+    data, _ = request_structured(full_prompt, json_schema, schema_name)
+    return data
+
+def run_stage(state, key, stage, fn):
+    """
+    Run fn, or reuse its result if this row already finished the stage in an earlier run.
+    Timed under the stage name (section images all count as "image").
+    """
+    with metrics.span(stage.split(":")[0]) as span:
+        span["resumed"] = True
+
+        def timed():
+            span["resumed"] = False
+            return fn()
+        return state.checkpoint(key, stage, timed) if state else timed()
+
+def generate_combined(main_keyword, reference_links, secondary_keywords, on_section=None, reference_notes=None):
+    """
+    Outline, content and excerpt from a single model call.
+    Returns (outline, content, excerpt), or None if the reply is unusable.
+    """
+    full_prompt, json_schema = build_combined_prompt(main_keyword, reference_links, secondary_keywords, reference_notes)
+    article, _ = request_structured(full_prompt, json_schema, "article_structoutput", on_section)
+    if not article or not article["sections"] or not article["excerpt"]:
+        return None
+    outline = {
+        "title": article.get("title", main_keyword),
+        "sections": [{"heading": section.get("heading", "")} for section in article["sections"]]
+    }
+    return outline, {"sections": article["sections"]}, {"excerpt": article["excerpt"]}
+
+def reference_notes_for(references, reference_links, state=None, key=None):
+    """
+    Condensed notes from the row's reference pages for the outline prompt, or None.
+    Checkpointed, so a resumed row builds the same prompt (and hits the LLM cache) even if a page changed since.
+    """
+    if not references or not reference_links:
+        return None
+    return run_stage(state, key, "references", lambda: references.notes(reference_links) or None)
 
-def process_row(main_keyword, reference_links, secondary_keywords):
+def process_row(main_keyword, reference_links, secondary_keywords, state=None, key=None, pipeline="staged",
+                on_section=None, references=None):
+    """
+    Generate (content, excerpt) for a row.
+      staged    outline, then content, then excerpt
+      parallel  excerpt runs alongside the outline -> content chain
+      combined  one call for everything, falling back to staged if it fails
+    If on_section is given, content is streamed and on_section(index, section)
+    is called for each section as soon as the model finishes it.
+    With references (a ReferenceLibrary), the outline prompt gets condensed notes from the reference pages.
+    """
     log_event("INFO", f"Processing keyword: {main_keyword}")
-    
-    outline_prompt = build_article_outline_prompt(main_keyword, reference_links, secondary_keywords)
-    outline = run_llm_from_text(outline_prompt, schema_name="outline_structoutput")
-    try:
-        if not outline:
-            log_event("ERROR", f"Article outline generation failed on  attempt")
-    except Exception as err:
-        log_event("ERROR", f"Article outline generation failed: {err}")
-        log_event("WARNING", f"Continuing despite error: {err}")
+    reference_notes = None
+    if state is None or state.get(key, "outline") is None:
+        reference_notes = reference_notes_for(references, reference_links, state, key)
+
+    if pipeline == "combined" and not (state and state.get(key, "content") is not None):
+        with metrics.span("combined"):
+            generated = generate_combined(
+                main_keyword, reference_links, secondary_keywords, on_section, reference_notes
+            )
+        if generated:
+            outline, content, excerpt = generated
+            if state:
+                state.put(key, "outline", outline)
+                state.put(key, "content", content)
+                state.put(key, "excerpt", excerpt)
+            return content, excerpt
+        log_event("WARNING", "Combined generation failed, falling back to separate calls")
+
+    def generate_excerpt():
+        return run_stage(state, key, "excerpt", lambda: run_llm(
+            template_name="for_excerpt",
+            schema_name="excerpt_structoutput",
+            MainKeyword=main_keyword
+        ))
+
+    # The excerpt only needs the keyword, so in parallel mode it doesn't wait for the outline
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        excerpt_future = executor.submit(generate_excerpt) if pipeline == "parallel" else None
+
+        outline_prompt = build_article_outline_prompt(
+            main_keyword, reference_links, secondary_keywords, reference_notes
+        )
+        outline = run_stage(state, key, "outline", lambda: run_llm_from_text(outline_prompt, schema_name="outline_structoutput"))
+        try:
+            if not outline:
+                log_event("ERROR", f"Article outline generation failed on  attempt")
+        except Exception as err:
+            log_event("ERROR", f"Article outline generation failed: {err}")
+            log_event("WARNING", f"Continuing despite error: {err}")
+
+        content = run_stage(state, key, "content", lambda: generate_content(main_keyword, outline, on_section))
+        excerpt = excerpt_future.result() if excerpt_future else generate_excerpt()
+    return content, excerpt
 
+def content_prompt_kwargs(main_keyword, outline):
+    """Template arguments for the for_content prompt, built from an outline."""
     chunks_text = ""
     if isinstance(outline, dict):
         sections = outline.get("sections") or outline.get("headings") or []
@@ -152,86 +300,655 @@ def process_row(main_keyword, reference_links, secondary_keywords):
                 if isinstance(sec, dict) else str(sec).strip()
                 for sec in sections
             )
+    return {
+        "MainKeyword": main_keyword,
+        "Outline": json.dumps(outline, ensure_ascii=False),
+        "Chunks": chunks_text
+    }
+
+def normalize_heading(heading: str) -> str:
+    return " ".join(clean_article_text(heading).lower().split())
+
+def missing_headings(expected, sections):
+    """Outline headings with no matching section. Only checked when sections are short."""
+    if len(sections) >= len(expected):
+        return []
+    found = {normalize_heading(section["heading"]) for section in sections}
+    return [heading for heading in expected if normalize_heading(heading) not in found]
+
+def generate_content(main_keyword, outline, on_section=None):
+    """
+    Section content for an outline. If the reply keeps failing validation, the
+    complete sections are salvaged from it, and only headings still missing are
+    requested again instead of regenerating the whole article.
+    """
+    kwargs = content_prompt_kwargs(main_keyword, outline)
+    full_prompt, json_schema = build_template_prompt("for_content", "content_structoutput", **kwargs)
+    content, reply = request_structured(full_prompt, json_schema, "content_structoutput", on_section)
+    if content:
+        sections = content["sections"]
+    else:
+        sections = salvage_sections(reply or "", json_schema["json_schema"]["schema"])
+        if sections:
+            log_event("WARNING", f"Salvaged {len(sections)} sections from an invalid reply", {"keyword": main_keyword})
+
+    expected = [heading for heading in kwargs["Chunks"].splitlines() if heading.strip()]
+    missing = missing_headings(expected, sections)
+    if missing:
+        log_event("WARNING", "Requesting missing sections", {"keyword": main_keyword, "missing": missing})
+        extra = run_llm(
+            template_name="for_content",
+            schema_name="content_structoutput",
+            MainKeyword=main_keyword,
+            Outline=kwargs["Outline"],
+            Chunks="\n".join(missing)
+        )
+        if extra:
+            # Put the new sections back in outline order
+            order = {normalize_heading(heading): index for index, heading in enumerate(expected)}
+            merged = sections + extra["sections"]
+            sections = sorted(
+                merged,
+                key=lambda section: order.get(normalize_heading(section["heading"]), len(expected))
+            )
+    return {"sections": sections} if sections else None
+
+def prefill_with_batch(rows, poll_interval, pipeline="staged", state=None, references=None, workers=1):
+    """
+    Generate every outline, content and excerpt for the sheet through the
+    Batch API and store the replies in the LLM cache. The normal run that
+    follows then finds them all in the cache instead of calling the model.
+    Content prompts depend on the outline, so this takes two batches
+    (one for the combined pipeline). Stages routed to another provider are left out.
+    With references, each row's reference notes are gathered (and checkpointed
+    in state) first, so the prompts match the ones the run will build.
+    """
+    def batched(stage):
+        return route(stage)[0] == "openai"
+
+    notes = {
+        job_key(*row.inputs()): reference_notes_for(references, row.inputs()[1], state, job_key(*row.inputs()))
+        for row in rows
+    }
+
+    def outline_prompt(row):
+        main_keyword, reference_links, secondary_keywords = row.inputs()
+        return build_article_outline_prompt(
+            main_keyword, reference_links, secondary_keywords, notes[job_key(*row.inputs())]
+        )
+
+    if pipeline == "combined":
+        if batched("article"):
+            prefill_cache(
+                [build_combined_prompt(*row.inputs(), reference_notes=notes[job_key(*row.inputs())]) for row in rows],
+                poll_interval=poll_interval
+            )
+        return
+
+    first_phase = []
+    for row in rows:
+        if batched("outline"):
+            first_phase.append(build_text_prompt(outline_prompt(row), "outline_structoutput"))
+        if batched("excerpt"):
+            first_phase.append(build_template_prompt(
+                "for_excerpt", "excerpt_structoutput", MainKeyword=row.main_keyword
+            ))
+    if first_phase:
+        prefill_cache(first_phase, poll_interval=poll_interval)
+    if not batched("content"):
+        return
+
+    def content_prompt(row):
+        # Outlines the batch missed (or routed elsewhere) are generated here, and
+        # checkpointed so the run doesn't ask for them again
+        outline = run_stage(state, job_key(*row.inputs()), "outline", lambda: run_llm_from_text(
+            outline_prompt(row), schema_name="outline_structoutput"
+        ))
+        return build_template_prompt(
+            "for_content", "content_structoutput", **content_prompt_kwargs(row.main_keyword, outline)
+        )
 
-    content = run_llm(
-        template_name="for_content",
-        schema_name="content_structoutput",
-        MainKeyword=main_keyword,
-        Outline=json.dumps(outline, ensure_ascii=False),
-        Chunks=chunks_text
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        second_phase = list(executor.map(content_prompt, rows))
+    prefill_cache(second_phase, poll_interval=poll_interval)
+
+def build_section_html(heading, content, img_url, attribution):
+    """Gutenberg block markup for one article section. The image block is left out if no image was found."""
+    image = (
+        f"""<!-- wp:image --><figure class="wp-block-image">
+            <img src="{img_url}" alt="{attribution}"/></figure><!-- /wp:image -->
+        """
+        if img_url else ""
     )
-    excerpt = run_llm(
-        template_name="for_excerpt",
-        schema_name="excerpt_structoutput",
-        MainKeyword=main_keyword
+    return (
+        f"""<!-- wp:post-featured-image /-->
+        <!-- wp:paragraph --><p>&nbsp;</p><!-- /wp:paragraph -->
+        <!-- wp:heading {{"level":2}} -->
+            <h2>{heading}</h2>
+            <!-- /wp:heading -->
+        {image}
+        <!-- wp:paragraph --><p>&nbsp;</p><!-- /wp:paragraph -->
+        <!-- wp:paragraph -->{content}<!-- /wp:paragraph -->
+        """
     )
-    return content, excerpt
 
-def main():
-    wp_client = WordPressClient(
-        wordpress_url,
-        wordpress_username,
-        wordpress_app_password
+def resolve_image(state, key, stage, main_keyword, section_text):
+    """
+    (media_id, url, attribution) for one image slot. Only hits are checkpointed,
+    so a slot that found nothing is tried again on the next run.
+    """
+    def lookup():
+        image = get_context().image_bot.get_image_for_section(main_keyword, section_text)
+        return list(image) if image[0] is not None else None
+    return run_stage(state, key, stage, lookup) or [None, None, None]
+
+def rewrite_flagged(content, flagged):
+    """Send flagged sentences through the for_plagiarism prompt and swap the rewrites into content."""
+    sentences = list(dict.fromkeys(sentence for found in flagged.values() for sentence, _ in found))
+    reply = run_llm(
+        template_name="for_plagiarism",
+        schema_name="plagiarism_structoutput",
+        Sentences="\n".join(f"{number}. {sentence}" for number, sentence in enumerate(sentences, start=1))
     )
+    rewrites = (reply or {}).get("sentences", [])
+    if len(rewrites) != len(sentences):
+        log_event("ERROR", "Plagiarism rewrite unusable, keeping the original sentences",
+                  {"expected": len(sentences), "got": len(rewrites)})
+        return content
+    replacements = dict(zip(sentences, rewrites))
+    sections = []
+    for number, section in enumerate(content["sections"]):
+        text = section["content"]
+        for sentence, _ in flagged.get(number, []):
+            text = text.replace(sentence, replacements[sentence].strip())
+        sections.append({**section, "content": text})
+    return {**content, "sections": sections}
+
+def check_plagiarism(index, main_keyword, reference_links, content, key=None, references=None):
+    """
+    Compare every section with earlier drafts and the row's reference pages, and rewrite
+    only the sentences that repeat them. Returns the (possibly rewritten) content.
+    """
+    log_event("INFO", "Running plagiarism check", {"keyword": main_keyword})
+    index_references(index, reference_links, references)
+    # The draft of an earlier run for this same row (stored or a legacy file) doesn't count
+    exclude = [f"draft:{draft_file(main_keyword).stem}"] + ([f"draft:{key}"] if key else [])
+    flagged = check_sections(index, content["sections"], exclude=exclude)
+    if not flagged:
+        log_event("SUCCESS", "Content passed plagiarism check")
+        return content
+    sources = sorted({source for found in flagged.values() for _, source in found})
+    log_event("WARNING", "Plagiarised sentences found, rewriting them", {
+        "keyword": main_keyword,
+        "sentences": sum(len(found) for found in flagged.values()),
+        "sources": sources
+    })
+    return rewrite_flagged(content, flagged)
+
+def prefetch_keywords(state, key, main_keyword, slots):
+    """
+    Ask for the search keywords of several image slots (stage, section text) in one call.
+    Slots already checkpointed by an earlier run are skipped; the rest are memoized for resolve_image.
+    """
+    pending = [text for stage, text in slots if not (state and state.get(key, stage))]
+    if pending:
+        get_context().image_bot.keywords.keywords(main_keyword, pending)
 
-    df = pd.read_csv("data.csv")
-
-    for _, row in df.iterrows():
-        main_keyword = row.get("Main Keyword", "").strip()
-        reference_links = (
-            row.get("Reference Links", "")
-            if isinstance(row.get("Reference Links", ""), str)
-            else "").split(",") if row.get("Reference Links") else []
-        secondary_keywords = (
-            row.get("Secondary Keywords", "")
-            if isinstance(row.get("Secondary Keywords", ""), str)
-            else "").split(",") if row.get("Secondary Keywords") else []
-        content, excerpt = process_row(main_keyword, reference_links, secondary_keywords)
-
-        if not content and excerpt:
-            log_event("ERROR", "Content generation failed")
-        else:
-            featured_image_id, *_ = bot.get_image_for_section(main_keyword, " ")
-            full_article = ""
-            for section in content["sections"]:
-                cleaned_heading = clean_article_text(section["heading"])
-                cleaned_content = clean_article_text(section["content"])
-
-                each_section = cleaned_heading + "\n\n" + cleaned_content # Later I'll add image
-                _, img_url, attribution = bot.get_image_for_section(main_keyword, each_section)
-                each_section_plus_image = (
-                    f"""<!-- wp:post-featured-image /-->
-                    <!-- wp:paragraph --><p>&nbsp;</p><!-- /wp:paragraph -->
-                    <!-- wp:heading {"level":2} -->
-                        <h2>{cleaned_heading}</h2>
-                        <!-- /wp:heading -->
-                    <!-- wp:image --><figure class="wp-block-image">
-                        <img src="{img_url}" alt="{attribution}"/></figure><!-- /wp:image -->
-                    
-                    <!-- wp:paragraph --><p>&nbsp;</p><!-- /wp:paragraph -->
-                    <!-- wp:paragraph -->{cleaned_content}<!-- /wp:paragraph -->
-                    """
-                )
-                full_article += each_section_plus_image + "\n\n"
-                      
-            article = Article(
-                title=main_keyword,
-                content=full_article,
-                excerpt=excerpt.get("excerpt", ""),
-                featured_media=featured_image_id
+def handle_row(wp_client, main_keyword, reference_links, secondary_keywords, options=None, skip_plagiarism=False):
+    """
+    Generate, illustrate, draft and post a single article, or post its stored draft.
+    Returns the post id, or a Future of the post when options.publisher queues it.
+    """
+    with metrics.span("article"):
+        post_id = _handle_row(
+            wp_client, main_keyword, reference_links, secondary_keywords, options or RunOptions(), skip_plagiarism
+        )
+    metrics.count("articles")
+    return post_id
+
+def _handle_row(wp_client, main_keyword, reference_links, secondary_keywords, options, skip_plagiarism):
+    state, drafts, plagiarism = options.state, options.drafts, options.plagiarism
+    key = job_key(main_keyword, reference_links, secondary_keywords)
+    post_id = state.get(key, "post_id") if state else None
+    stored = drafts.get(key) if drafts else None
+    if post_id is None and stored:
+        post_id = stored["post_id"]
+    if post_id is not None:
+        log_event("INFO", "Row already posted, skipping", {"keyword": main_keyword, "post_id": post_id})
+        return post_id
+
+    if stored:
+        log_event("INFO", "Publishing stored draft", {"keyword": main_keyword, "content_hash": stored["content_hash"]})
+        article = Article(
+            title=stored["title"],
+            content=stored["html"],
+            excerpt=stored["excerpt"],
+            featured_media=stored["featured_media"],
+            slug=stored["slug"]
+        )
+        return publish_article(wp_client, article, key, options)
+
+    # Image lookups run in parallel and are collected in section order.
+    # When streaming, the featured image is looked up while the text is generated and each
+    # section's image as soon as that section is written (one keyword call each). Otherwise
+    # every keyword for the article comes from a single call once the sections are known.
+    try:
+        with ThreadPoolExecutor(max_workers=SECTION_IMAGE_WORKERS) as executor:
+            featured = None
+            if options.stream:
+                featured = executor.submit(resolve_image, state, key, "featured_image", main_keyword, " ")
+            # Keyed by heading rather than position: sections re-requested after a
+            # bad reply can land at a different index than they streamed in at
+            image_futures = {}
+
+            def on_section(index, section):
+                heading = clean_article_text(section.get("heading", ""))
+                section_content = clean_article_text(section.get("content", ""))
+                if heading not in image_futures:
+                    image_futures[heading] = executor.submit(
+                        resolve_image, state, key, f"image:{heading}", main_keyword, heading + "\n\n" + section_content
+                    )
+
+            content, excerpt = process_row(
+                main_keyword, reference_links, secondary_keywords, state, key, options.pipeline,
+                on_section=on_section if options.stream else None, references=options.references
             )
 
+            if not content or not excerpt:
+                log_event("ERROR", "Content generation failed", {"keyword": main_keyword})
+                raise RuntimeError("Content generation failed")
+            if plagiarism and not skip_plagiarism:
+                content = run_stage(state, key, "plagiarism", lambda: check_plagiarism(
+                    plagiarism, main_keyword, reference_links, content, key, options.references
+                ))
+
+            sections = [
+                (clean_article_text(section["heading"]), clean_article_text(section["content"]))
+                for section in content["sections"]
+            ]
+            slots = [] if featured else [("featured_image", " ")]
+            slots += [
+                (f"image:{heading}", heading + "\n\n" + section_content)
+                for heading, section_content in sections if heading not in image_futures
+            ]
+            prefetch_keywords(state, key, main_keyword, slots)
+            if featured is None:
+                featured = executor.submit(resolve_image, state, key, "featured_image", main_keyword, " ")
+            for index, section in enumerate(content["sections"]):
+                on_section(index, section)
+            images = [image_futures[heading].result() for heading, _ in sections]
+            featured_image_id, *_ = featured.result()
+    finally:
+        # The keywords were only memoized for this article's lookups
+        get_context().image_bot.keywords.forget(main_keyword)
+
+    full_article = "".join(
+        build_section_html(heading, section_content, img_url, attribution) + "\n\n"
+        for (heading, section_content), (_, img_url, attribution) in zip(sections, images)
+    )
+
+    article = Article(
+        title=main_keyword,
+        content=full_article,
+        excerpt=excerpt.get("excerpt", ""),
+        featured_media=featured_image_id,
+        slug=slugify(main_keyword)
+    )
+
+    if not drafts:
+        with metrics.span("draft"):
             draft_path = save_draft(article.title, article.content)
-            log_event("INFO", "Draft saved", {"path": str(draft_path)})
-
-            post = wp_client.create_post(
-                article.title,
-                article.content,
-                article.featured_media,
-                excerpt=article.excerpt
-            )    
-            log_event("SUCCESS", "Post Drafted", {"post_title": post.get("title")})
-            print(f"Post Drafted! ID: {post['id']}")
+        log_event("INFO", "Draft saved", {"path": str(draft_path)})
+        if plagiarism:
+            plagiarism.add_draft(draft_path)
+        if state:
+            state.put(key, "draft", str(draft_path))
+        return publish_article(wp_client, article, key, options)
+
+    with metrics.span("draft"):
+        digest = drafts.save(
+            key,
+            article.title,
+            content["sections"],
+            article.content,
+            excerpt=article.excerpt,
+            featured_media=article.featured_media,
+            image_ids=[media_id for media_id, _, _ in images],
+            slug=article.slug
+        )
+    log_event("INFO", "Draft saved", {"keyword": main_keyword, "content_hash": digest})
+    if plagiarism:
+        plagiarism.add_document(f"draft:{key}", html_to_text(article.content), digest)
+    if state:
+        state.put(key, "draft", digest)
+
+    posted = [draft for draft in drafts.find_by_hash(digest) if draft["row_key"] != key and draft["post_id"]]
+    if posted:
+        log_event("INFO", "Identical draft already posted, reusing its post",
+                  {"keyword": main_keyword, "post_id": posted[0]["post_id"]})
+        record_post(state, key, {"id": posted[0]["post_id"], "title": article.title}, drafts)
+        return posted[0]["post_id"]
+    return publish_article(wp_client, article, key, options)
+
+def publish_article(wp_client, article, key, options):
+    """Create (or queue, or upsert) the post for an assembled article. Returns its id or a Future of the post."""
+    state, drafts = options.state, options.drafts
+    if options.publisher:
+        queued = options.publisher.submit(wp_client.post_payload(
+            article.title,
+            article.content,
+            article.featured_media,
+            excerpt=article.excerpt,
+            slug=article.slug
+        ))
+        queued.add_done_callback(
+            lambda done: record_post(state, key, done.result(), drafts) if not done.exception() else None
+        )
+        return queued
+
+    save_post = wp_client.upsert_post if options.upsert else wp_client.create_post
+    post = save_post(
+        article.title,
+        article.content,
+        article.featured_media,
+        excerpt=article.excerpt,
+        slug=article.slug
+    )
+    record_post(state, key, post, drafts)
+    return post["id"]
+
+def record_post(state, key, post, drafts=None):
+    log_event("SUCCESS", "Post Drafted", {"post_title": post.get("title")})
+    if state:
+        state.put(key, "post_id", post["id"])
+    if drafts:
+        drafts.set_post_id(key, post["id"])
+
+def run_rows(wp_client, rows, options=None, workers=1, read_ahead=None, idle_wait=POLL_INTERVAL):
+    """
+    Run KeywordRows through handle_row on a pool of workers, with the run's RunOptions.
+    rows can be any iterable (e.g. read_rows()), and is only read a few rows ahead of the workers.
+    A failing row is logged and reported without stopping the others.
+    Yields (row, ok, post id or error) in row order, whatever order the workers finished in.
+    With a publisher in options, rows wait for their queued post to be sent.
+    read_ahead is how many rows are taken beyond the ones running (default: up to ROW_QUEUE_PER_WORKER per worker).
+    rows may yield None for "nothing yet" (see leased_rows()): the rows in flight are
+    finished first, and with none left, it waits idle_wait seconds before asking again.
+    """
+    options = options or RunOptions()
+    publisher = options.publisher
+    workers = max(1, workers)
+    window = workers * ROW_QUEUE_PER_WORKER if read_ahead is None else workers + read_ahead
+    if publisher:
+        # Keep enough rows in flight to fill a batch before the oldest one has to wait for it
+        window = max(window, publisher.batch_size + workers)
+    pending = deque()
+    rows = iter(rows)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            row = None
+            while len(pending) < window:
+                row = next(rows, END_OF_ROWS)
+                if row is None or row is END_OF_ROWS:
+                    break
+                pending.append((row, executor.submit(
+                    handle_row, wp_client, *row.inputs(), options, row.skip_plagiarism
+                )))
+            if not pending:
+                if row is END_OF_ROWS:
+                    return
+                time.sleep(idle_wait)
+                continue
+            row, future = pending.popleft()
+            yield (row, *row_result(row, future, publisher))
+
+def row_result(row, future, publisher=None):
+    """(ok, post id or error message) for a finished handle_row call."""
+    try:
+        value = future.result()
+        if isinstance(value, Future):
+            if not value.done():
+                # The rest of its batch isn't coming soon enough; send what is queued
+                publisher.flush()
+            value = value.result()["id"]
+        return True, value
+    except Exception as err:
+        log_event("ERROR", f"Row {row.line} failed: {err}")
+        return False, str(err)
+
+def forget_progress(state, rows, drafts=None):
+    """Clear each row's recorded progress and stored draft (--restart) as it is read."""
+    for row in rows:
+        key = job_key(*row.inputs())
+        state.clear(key)
+        if drafts:
+            drafts.delete(key)
+        yield row
+
+def queue_command(args):
+    """--enqueue, --requeue-failed and --queue-status: manage the worker queue and print its counts."""
+    queue = JobQueue(args.queue, journal_mode=args.queue_journal)
+    if args.enqueue:
+        print(f"Queued {queue.enqueue(read_rows(args.csv))} new rows from {args.csv}")
+    if args.requeue_failed:
+        print(f"Requeued {queue.requeue_failed()} failed rows")
+    status = queue.stats()
+    if args.queue_status:
+        status["recent_failures"] = queue.failures()
+    print(json.dumps(status, indent=2, ensure_ascii=False))
+
+def settle_job(queue, owner, row, ok, value):
+    """Ack a leased row, or give it back to the queue to retry."""
+    settled = queue.ack(row.job_id, owner, value) if ok else queue.fail(row.job_id, owner, value)
+    if not settled:
+        log_event("WARNING", "Lease on row was lost to another worker", {"keyword": row.main_keyword})
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and draft WordPress articles from data.csv")
+    parser.add_argument("--csv", default="data.csv", help="Keyword sheet to process (.csv, or .jsonl with the same keys)")
+    parser.add_argument("--log-file", help="Where events are logged (default log.json)")
+    parser.add_argument("--log-rotate-hours", type=float, help="Also rotate the log when it is older than this")
+    parser.add_argument("--metrics-file", help="Write the run report in Prometheus text format to this file")
+    parser.add_argument("--otel", action="store_true", help="Also export spans through OpenTelemetry")
+    parser.add_argument("--workers", type=int, default=1, help="Number of rows processed in parallel")
+    parser.add_argument("--llm-concurrency", type=int, help="Max LLM calls in flight")
+    parser.add_argument("--image-concurrency", type=int, help="Max image vendor searches/downloads in flight")
+    parser.add_argument("--wp-concurrency", type=int, help="Max WordPress requests in flight")
+    parser.add_argument("--pipeline", choices=PIPELINE_MODES, default="staged",
+                        help="How outline, content and excerpt calls are made")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream content and start each section's image lookup as soon as it is written")
+    parser.add_argument("--state-path", default=JOB_STATE_PATH, help="Where per-row progress is recorded")
+    parser.add_argument("--restart", action="store_true",
+                        help="Forget recorded progress for this sheet's rows and start them over")
+    parser.add_argument("--drafts-path", default=DRAFT_STORE_PATH, help="Draft store database file")
+    parser.add_argument("--export-drafts", metavar="DIR",
+                        help="Write every stored draft to DIR as an .html file and exit")
+    parser.add_argument("--publish", choices=["single", "batch"], default="single",
+                        help="Create each post as soon as its row is done, or queue them and send "
+                             f"up to {BATCH_LIMIT} per request through the WordPress batch endpoint")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Update an existing post with the same slug instead of creating a duplicate")
+    parser.add_argument("--no-references", action="store_true",
+                        help="Only name the reference links in the outline prompt instead of fetching and condensing them")
+    parser.add_argument("--reference-tokens", type=int, default=ROW_TOKENS,
+                        help="Token budget of a row's reference notes in the outline prompt")
+    parser.add_argument("--no-plagiarism-check", action="store_true",
+                        help="Don't compare sections with earlier drafts and reference pages")
+    parser.add_argument("--queue", default=JOB_QUEUE_PATH, help="Worker queue database file")
+    parser.add_argument("--queue-journal", choices=["wal", "delete"],
+                        help="SQLite journal for the queue: wal (default, one host) or delete "
+                             "(queue file on a network share used by several hosts)")
+    parser.add_argument("--enqueue", action="store_true", help="Add the sheet's rows to the worker queue and exit")
+    parser.add_argument("--worker", action="store_true",
+                        help="Take rows from the worker queue instead of the sheet; run as many as you like")
+    parser.add_argument("--wait", action="store_true",
+                        help="Worker: keep polling for new rows when the queue is empty instead of exiting")
+    parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS,
+                        help="Worker: rows are offered to other workers if a worker stops renewing them this long")
+    parser.add_argument("--queue-status", action="store_true", help="Print queue counts and recent failures and exit")
+    parser.add_argument("--requeue-failed", action="store_true",
+                        help="Put rows that ran out of attempts back in the queue and exit")
+    parser.add_argument("--batch", action="store_true",
+                        help="Generate outlines, content and excerpts through the OpenAI Batch API first")
+    parser.add_argument("--batch-poll", type=float, default=30, help="Seconds between batch status checks")
+    parser.add_argument("--connect-timeout", type=float, help="Seconds to wait for an HTTP connection")
+    parser.add_argument("--read-timeout", type=float, help="Seconds to wait for an HTTP response")
+    parser.add_argument("--llm-timeout", type=float,
+                        help="Seconds to wait for an LLM reply (default 600; generations can take minutes)")
+    parser.add_argument("--pool-size", type=int, help="Keep-alive connections kept open per host")
+    parser.add_argument("--rate-limit", action="append", default=[], metavar="PROVIDER=RPM",
+                        help="Requests per minute allowed for a provider, e.g. unsplash=0.8 (repeatable)")
+    parser.add_argument("--llm-tpm", type=float, help="LLM tokens per minute allowed")
+    parser.add_argument("--route", action="append", default=[], metavar="STAGE=PROVIDER[,PROVIDER...]",
+                        help="LLM providers for a stage in fallback order, e.g. keyword=ollama,openai "
+                             "(stages: outline, content, excerpt, article, keyword; repeatable)")
+    parser.add_argument("--ollama-concurrency", type=int, help="Max Ollama calls in flight")
+    parser.add_argument("--image-mode", choices=["sequential", "race"], default="sequential",
+                        help="Try image vendors one by one, or query them in parallel")
+    parser.add_argument("--hedge-delay", type=float, default=0.5,
+                        help="Race mode: seconds before the next vendor is also queried")
+    parser.add_argument("--adaptive-vendors", action="store_true",
+                        help="Reorder image vendors by hit rate and latency seen so far")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, default="read-write",
+                        help="How LLM replies are read from / written to the on-disk cache")
+    parser.add_argument("--cache-path", default=LLM_CACHE_PATH, help="LLM cache database file")
+    parser.add_argument("--cache-ttl", type=float, help="Drop cached LLM replies older than this many hours")
+    parser.add_argument("--cache-max-entries", type=int, help="Keep at most this many cached LLM replies")
+    parser.add_argument("--image-width", type=int,
+                        help="Scale images wider than this down before upload (needs Pillow)")
+    parser.add_argument("--max-image-mb", type=float, default=15, help="Skip images larger than this")
+    parser.add_argument("--no-media-cache", action="store_true",
+                        help="Always search, download and upload images, even ones used before")
+    args = parser.parse_args(argv)
+    if args.worker and args.batch:
+        parser.error("--batch reads the whole sheet up front and can't be used with --worker")
+    if args.batch and args.cache_mode not in ("read-write", "refresh"):
+        parser.error(f"--batch stores its replies in the LLM cache and can't be used with --cache-mode {args.cache_mode}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(
+        path=args.log_file,
+        rotate_seconds=args.log_rotate_hours * 3600 if args.log_rotate_hours else None
+    )
+    drafts = DraftStore(args.drafts_path)
+    if args.export_drafts:
+        count = drafts.export(args.export_drafts)
+        print(f"Exported {count} drafts to {args.export_drafts}")
+        return
+    if args.enqueue or args.requeue_failed or args.queue_status:
+        queue_command(args)
+        return
+    configure_limits(
+        llm=args.llm_concurrency,
+        images=args.image_concurrency,
+        wordpress=args.wp_concurrency,
+        ollama=args.ollama_concurrency
+    )
+    transport.configure(
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        llm_timeout=args.llm_timeout,
+        pool_size=args.pool_size
+    )
+    if args.otel:
+        metrics.enable_otel()
+    for rule in args.rate_limit:
+        provider, _, rpm = rule.partition("=")
+        rate_limit.configure_rate(provider.strip(), rpm=float(rpm))
+    if args.llm_tpm:
+        rate_limit.configure_rate("openai", tpm=args.llm_tpm)
+    for rule in args.route:
+        stage, _, providers = rule.partition("=")
+        configure_route(stage.strip(), [provider.strip() for provider in providers.split(",") if provider.strip()])
+    llm_cache = configure_cache(
+        mode=args.cache_mode,
+        path=args.cache_path,
+        ttl=args.cache_ttl * 3600 if args.cache_ttl else None,
+        max_entries=args.cache_max_entries
+    )
+    app = get_context()
+    bot = app.image_bot
+    bot.vendor_mode = args.image_mode
+    bot.hedge_delay = args.hedge_delay
+    bot.adaptive_vendors = args.adaptive_vendors
+    bot.target_width = args.image_width
+    bot.max_image_bytes = int(args.max_image_mb * 1024 * 1024)
+    if not args.no_media_cache:
+        bot.media_cache = MediaCache(MEDIA_CACHE_PATH)
+
+    wp_client = app.wp_client
+
+    queue = owner = None
+    if args.worker:
+        queue = JobQueue(args.queue, journal_mode=args.queue_journal)
+        owner = worker_name()
+        rows = leased_rows(queue, owner, args.lease_seconds, wait=args.wait)
+        log_event("INFO", "Worker started", {"worker": owner, "queue": args.queue})
+    else:
+        rows = read_rows(args.csv)
+
+    state = JobState(args.state_path)
+    references = None
+    if not args.no_references:
+        references = ReferenceLibrary(ReferenceCache(REFERENCE_CACHE_PATH), row_tokens=args.reference_tokens)
+    if args.batch:
+        # The batch covers the whole sheet, so this is the one mode that reads it all up front
+        rows = list(rows)
+        prefill_with_batch(
+            rows, args.batch_poll, pipeline=args.pipeline, state=state, references=references, workers=args.workers
+        )
+
+    plagiarism = None
+    if not args.no_plagiarism_check:
+        plagiarism = PlagiarismIndex(PLAGIARISM_INDEX_PATH)
+        plagiarism.sync_drafts()
+        plagiarism.sync_store(drafts)
+
+    if args.restart:
+        rows = forget_progress(state, rows, drafts)
+
+    options = RunOptions(
+        pipeline=args.pipeline,
+        stream=args.stream,
+        upsert=args.upsert,
+        state=state,
+        drafts=drafts,
+        publisher=PostQueue(wp_client, upsert=args.upsert) if args.publish == "batch" else None,
+        plagiarism=plagiarism,
+        references=references
+    )
+    results = run_rows(
+        wp_client, rows, options,
+        workers=args.workers,
+        # Rows leased but not started are rows other workers could be running
+        read_ahead=0 if queue else None
+    )
+    renewal = keep_leases(queue, owner, args.lease_seconds) if queue else None
+    try:
+        for row, ok, value in results:
+            if ok:
+                print(f"Post Drafted! ID: {value} ({row.main_keyword})")
+            else:
+                print(f"Failed: {row.main_keyword} - {value}")
+            if queue:
+                settle_job(queue, owner, row, ok, value)
+    finally:
+        if queue:
+            renewal.set()
+            # Rows read ahead but never started go straight back to the other workers
+            queue.release(owner)
+    log_event("INFO", "Image vendor stats", bot.vendor_stats.summary())
+    log_event("INFO", "LLM cache stats", llm_cache.stats())
+    log_event("INFO", "Rate limiter stats", rate_limit.stats())
+
+    report = metrics.summary()
+    log_event("INFO", "Run report", report)
+    print(metrics.format_summary(report))
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
 
 
 if __name__ == "__main__":
@@ -12,5 +12,6 @@ class Article:
     excerpt: str
     tags: list = None
     categories: list = None
+    slug: str = None
 
 # tags: List[str]
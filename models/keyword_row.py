@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass(slots=True)
+class KeywordRow:
+    """One sheet row. Slotted so that large sheets cost little memory per queued row."""
+    main_keyword: str
+    reference_links: Tuple[str, ...] = ()
+    secondary_keywords: Tuple[str, ...] = ()
+    skip_plagiarism: bool = False
+    # Line of the sheet the row came from (1 is the header for CSV files)
+    line: int = 0
+    # Queue job the row was leased from (worker mode), acked once the row is done
+    job_id: int = None
+
+    def inputs(self) -> tuple:
+        """(main_keyword, reference_links, secondary_keywords), the arguments handle_row and job_key take."""
+        return self.main_keyword, list(self.reference_links), list(self.secondary_keywords)
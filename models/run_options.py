@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class RunOptions:
+    """What every row of a run shares: the pipeline settings and the stores and clients main() builds once."""
+    pipeline: str = "staged"
+    stream: bool = False
+    upsert: bool = False
+    # JobState: stages finished by an earlier run are skipped
+    state: Any = None
+    # DraftStore: finished articles are kept there and published from it
+    drafts: Any = None
+    # PostQueue: posts are sent in batches instead of one request each
+    publisher: Any = None
+    # PlagiarismIndex: sentences repeating earlier drafts or reference pages are rewritten
+    plagiarism: Any = None
+    # ReferenceLibrary: the outline is grounded in notes from the reference pages
+    references: Any = None
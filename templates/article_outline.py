@@ -18,6 +18,11 @@ STRING_FOUR = (
     'while making sure to discuss these in the article: "{secondary_keywords}"'
 )
 
+STRING_EIGHT = (
+    "Here are notes taken from those reference articles. Build the outline on what they cover, "
+    "and don't add headings that contradict them:\n{reference_notes}"
+)
+
 STRING_FIVE = (
     "Give me strictly just the outline as output, there should be Introduction heading at the start followed by the individual headings for the content. "
     "No need for Conclusion. Use H2 style headings for each entry, and there should be no subheadings. "
@@ -29,4 +34,10 @@ STRING_FIVE = (
 STRING_SIX = (
     "Task: Return a short keyword phrase (2-7 words) describing an image for this section. "
     "Avoid abstract terms; prefer concrete, visual items."
-)
\ No newline at end of file
+)
+
+STRING_SEVEN = (
+    "Task: For each numbered section below, return a short keyword phrase (2-7 words) describing an image for it. "
+    "Avoid abstract terms; prefer concrete, visual items. "
+    "Return exactly one keyword per section, in the same order, as JSON."
+)
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import draft_store
+from utils.draft_store import DraftStore, content_hash
+
+SECTIONS = [{"heading": "Starter", "content": "Feed it daily – at 24°C."}]
+HTML = "<h2>Starter</h2><p>Feed it daily – at 24°C.</p>"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(draft_store, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def drafts(tmp_path, clock):
+    drafts = DraftStore(tmp_path / "drafts.sqlite3")
+    yield drafts
+    drafts.close()
+
+
+def test_saved_draft_round_trips(drafts):
+    digest = drafts.save("aaaa1111", "Bread", SECTIONS, HTML, excerpt="Loaves", featured_media=7,
+                         image_ids=[7, 8], slug="bread")
+    draft = drafts.get("aaaa1111")
+    assert digest == content_hash("Bread", HTML, "Loaves") == draft["content_hash"]
+    assert (draft["title"], draft["slug"], draft["excerpt"]) == ("Bread", "bread", "Loaves")
+    assert (draft["featured_media"], draft["image_ids"], draft["post_id"]) == (7, [7, 8], None)
+    assert draft["sections"] == SECTIONS
+    assert draft["html"] == HTML
+    assert drafts.get("missing") is None
+
+
+def test_post_id_survives_a_later_save(drafts, clock):
+    drafts.save("aaaa1111", "Bread", SECTIONS, HTML)
+    drafts.set_post_id("aaaa1111", 42)
+    clock.advance(10)
+    drafts.save("aaaa1111", "Better bread", SECTIONS, HTML)
+    draft = drafts.get("aaaa1111")
+    assert (draft["title"], draft["post_id"]) == ("Better bread", 42)
+    assert draft["updated"] - draft["created"] == 10
+
+
+def test_content_hash_covers_title_and_excerpt():
+    base = content_hash("Bread", HTML, "Loaves")
+    assert content_hash("Rye", HTML, "Loaves") != base
+    assert content_hash("Bread", HTML, "Rolls") != base
+    assert content_hash("Bread", HTML) == content_hash("Bread", HTML, None)
+
+
+def test_find_by_hash_and_slug_return_summaries(drafts):
+    digest = drafts.save("aaaa1111", "Bread", SECTIONS, HTML, slug="bread")
+    drafts.save("bbbb2222", "Bread", SECTIONS, HTML, slug="bread")
+    drafts.save("cccc3333", "Rye", SECTIONS, HTML, slug="rye")
+    assert sorted(d["row_key"] for d in drafts.find_by_hash(digest)) == ["aaaa1111", "bbbb2222"]
+    assert [d["row_key"] for d in drafts.find_by_slug("rye")] == ["cccc3333"]
+    assert "html" not in drafts.find_by_slug("rye")[0]
+
+
+def test_list_filters_on_post_id_newest_first(drafts, clock):
+    for row_key in ("aaaa1111", "bbbb2222", "cccc3333"):
+        drafts.save(row_key, "Bread", SECTIONS, HTML)
+        clock.advance(1)
+    drafts.set_post_id("aaaa1111", 42)
+    assert [d["row_key"] for d in drafts.list()] == ["aaaa1111", "cccc3333", "bbbb2222"]
+    assert [d["row_key"] for d in drafts.list(posted=True)] == ["aaaa1111"]
+    assert [d["row_key"] for d in drafts.list(posted=False, limit=1)] == ["cccc3333"]
+
+
+def test_iter_html_pages_through_every_draft(drafts):
+    for n in range(5):
+        drafts.save(f"key{n}", f"Title {n}", SECTIONS, f"<p>{n}</p>")
+    assert [row[0] for row in drafts.iter_html(batch_size=2)] == [f"key{n}" for n in range(5)]
+
+
+def test_export_keeps_drafts_with_the_same_slug_apart(drafts, tmp_path):
+    drafts.save("aaaa1111", "Bread", SECTIONS, "<p>one</p>", slug="bread")
+    drafts.save("bbbb2222", "Bread!", SECTIONS, "<p>two</p>", slug="bread")
+    drafts.save("cccc3333", "Untitled", SECTIONS, "<p>three</p>")
+    out = tmp_path / "export"
+    assert drafts.export(out) == 3
+    assert (out / "bread-aaaa1111.html").read_text(encoding="utf-8") == "<p>one</p>"
+    assert (out / "bread-bbbb2222.html").read_text(encoding="utf-8") == "<p>two</p>"
+    assert (out / "draft-cccc3333.html").exists()
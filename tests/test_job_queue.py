@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import job_queue
+from core.job_queue import JobQueue, MAX_ATTEMPTS, RETRY_DELAY
+from models.keyword_row import KeywordRow
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "time", SimpleNamespace(time=clock, sleep=lambda seconds: None))
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    queue.enqueue([KeywordRow("sourdough bread", line=2)])
+    yield queue
+    queue.close()
+
+
+def test_enqueue_skips_rows_already_queued(queue):
+    assert queue.enqueue([KeywordRow("sourdough bread", line=2), KeywordRow("rye bread", line=3)]) == 1
+    assert queue.stats()["queued"] == 2
+
+
+def test_leased_row_is_not_offered_again_while_the_lease_holds(queue, clock):
+    [row] = queue.lease("a", lease_seconds=60)
+    assert row.main_keyword == "sourdough bread" and row.line == 2
+    clock.advance(59)
+    assert queue.lease("b", lease_seconds=60) == []
+
+
+def test_expired_lease_hands_the_row_to_another_owner(queue, clock):
+    [row] = queue.lease("a", lease_seconds=60)
+    clock.advance(61)
+    [again] = queue.lease("b", lease_seconds=60)
+    assert again.job_id == row.job_id
+    # The first owner's late ack must not mark the row done under the new owner
+    assert not queue.ack(row.job_id, "a", post_id=1)
+    assert queue.ack(again.job_id, "b", post_id=2)
+    assert queue.stats() == {"queued": 0, "leased": 0, "done": 1, "failed": 0}
+
+
+def test_renew_keeps_the_lease(queue, clock):
+    queue.lease("a", lease_seconds=60)
+    clock.advance(50)
+    assert queue.renew("a", lease_seconds=60) == 1
+    clock.advance(50)
+    assert queue.lease("b", lease_seconds=60) == []
+
+
+def test_fail_retries_after_a_delay_then_sets_the_row_aside(queue, clock):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        [row] = queue.lease("a")
+        assert queue.fail(row.job_id, "a", f"error {attempt}")
+        if attempt < MAX_ATTEMPTS:
+            assert queue.stats()["queued"] == 1
+            # Not offered again until its retry is due
+            assert queue.lease("a") == []
+            clock.advance(RETRY_DELAY * attempt)
+    assert queue.stats()["failed"] == 1
+    assert queue.failures()[0]["attempts"] == MAX_ATTEMPTS
+    assert queue.failures()[0]["error"] == f"error {MAX_ATTEMPTS}"
+    clock.advance(RETRY_DELAY * MAX_ATTEMPTS)
+    assert queue.lease("a") == []
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_row(queue, clock):
+    for _ in range(MAX_ATTEMPTS):
+        assert queue.lease("a", lease_seconds=60)
+        clock.advance(61)
+    assert queue.lease("b") == []
+    assert queue.stats()["failed"] == 1
+    assert queue.failures()[0]["error"] == "lease expired"
+
+
+def test_release_does_not_use_up_an_attempt(queue):
+    for _ in range(MAX_ATTEMPTS + 2):
+        assert queue.lease("a")
+        assert queue.release("a") == 1
+    [row] = queue.lease("a")
+    assert queue.fail(row.job_id, "a", "boom")
+    assert queue.stats()["queued"] == 1
+
+
+def test_requeue_failed_gives_fresh_attempts(queue, clock):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        [row] = queue.lease("a")
+        queue.fail(row.job_id, "a", "boom")
+        clock.advance(RETRY_DELAY * attempt)
+    assert queue.requeue_failed() == 1
+    [row] = queue.lease("a")
+    assert queue.fail(row.job_id, "a", "boom")
+    assert queue.stats()["queued"] == 1
+
+
+def test_leased_rows_stops_when_nothing_is_waiting(queue):
+    rows = list(job_queue.leased_rows(queue, "a"))
+    assert [row.main_keyword for row in rows] == ["sourdough bread"]
+    assert queue.stats()["leased"] == 1
+
+
+def test_leased_rows_hands_back_control_while_rows_wait_for_a_retry(queue, clock):
+    rows = job_queue.leased_rows(queue, "a")
+    row = next(rows)
+    queue.fail(row.job_id, "a", "boom")
+    # The row isn't due yet: the caller gets None instead of the generator sleeping
+    assert next(rows) is None
+    clock.advance(RETRY_DELAY)
+    assert next(rows).job_id == row.job_id
+    queue.ack(row.job_id, "a")
+    assert next(rows, "done") == "done"
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from utils.json_repair import parse_reply, repair_json, salvage_sections
+
+SCHEMA = {
+    "type": "object",
+    "required": ["title", "sections"],
+    "properties": {
+        "title": {"type": "string"},
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["heading", "content"],
+                "properties": {"heading": {"type": "string"}, "content": {"type": "string"}},
+            },
+        },
+    },
+}
+ARTICLE = {
+    "title": "Bread",
+    "sections": [
+        {"heading": "Starter", "content": "Feed it daily."},
+        {"heading": "Dough", "content": "Mix, rest and fold."},
+    ],
+}
+
+
+def test_valid_reply_is_returned_as_is():
+    assert parse_reply(json.dumps(ARTICLE), SCHEMA) == ARTICLE
+
+
+def test_fences_chatter_and_trailing_commas_are_repaired():
+    reply = "Sure! Here it is:\n```json\n" + json.dumps(ARTICLE)[:-2] + "],}\n```"
+    assert parse_reply(reply, SCHEMA) == ARTICLE
+
+
+def test_repair_leaves_commas_inside_strings_alone():
+    assert json.loads(repair_json('{"a": "x, y", "b": [1, 2,],}')) == {"a": "x, y", "b": [1, 2]}
+
+
+def test_unparseable_reply_raises_value_error():
+    with pytest.raises(ValueError, match="Invalid JSON"):
+        parse_reply("no json here", SCHEMA)
+
+
+def test_schema_mismatch_raises_value_error():
+    with pytest.raises(ValueError, match="sections"):
+        parse_reply(json.dumps({"title": "Bread"}), SCHEMA)
+
+
+def test_salvage_keeps_complete_valid_sections_of_a_cut_reply():
+    reply = json.dumps({
+        "title": "Bread",
+        "sections": ARTICLE["sections"] + [{"heading": "No content"}, {"heading": "Bake", "content": "Bake"}],
+    })
+    cut = reply.index('"Bake"}') + len('"Bake"')
+    assert salvage_sections(reply[:cut], SCHEMA) == ARTICLE["sections"]
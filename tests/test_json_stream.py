@@ -0,0 +1,44 @@
+import json
+
+from utils.json_stream import SectionStreamParser
+
+REPLY = json.dumps({
+    "title": "Bread {basics}",
+    "meta": {"sections": [{"heading": "not a section"}]},
+    "sections": [
+        {"heading": "Starter", "content": "Feed it \"daily\", at {room} temperature."},
+        {"heading": "Dough", "content": "Mix, rest and fold.", "notes": {"time": "8h"}},
+        {"heading": "Bake \\ cool", "content": "Bake in a [hot] pot."}
+    ]
+})
+SECTIONS = json.loads(REPLY)["sections"]
+
+
+def feed_in_pieces(size):
+    parser = SectionStreamParser()
+    found = []
+    for start in range(0, len(REPLY), size):
+        found.extend(parser.feed(REPLY[start:start + size]))
+    return found
+
+
+def test_sections_come_out_whole_however_the_reply_is_split():
+    for size in (1, 2, 7, 64, len(REPLY)):
+        assert feed_in_pieces(size) == list(enumerate(SECTIONS))
+
+
+def test_a_section_is_returned_by_the_piece_that_completes_it():
+    parser = SectionStreamParser()
+    first_end = REPLY.index("temperature.\"}") + len("temperature.\"}")
+    assert parser.feed(REPLY[:first_end - 1]) == []
+    assert parser.feed(REPLY[first_end - 1:first_end]) == [(0, SECTIONS[0])]
+
+
+def test_unfinished_reply_returns_only_complete_sections():
+    cut = REPLY.index("Bake in")
+    assert SectionStreamParser().feed(REPLY[:cut]) == list(enumerate(SECTIONS[:2]))
+
+
+def test_other_array_keys_are_ignored():
+    parser = SectionStreamParser(key="chapters")
+    assert parser.feed(REPLY) == []
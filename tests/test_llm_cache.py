@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import llm_cache
+from core.llm_cache import LLMCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def open_cache(tmp_path, clock):
+    caches = []
+
+    def open_cache(mode="read-write", **kwargs):
+        cache = LLMCache(tmp_path / "llm_cache.sqlite3", mode=mode, **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def test_read_write_serves_stored_responses(open_cache):
+    cache = open_cache()
+    assert cache.get("k") is None
+    cache.put("k", "reply")
+    assert cache.get("k") == "reply"
+    assert cache.stats() == {"mode": "read-write", "hits": 1, "misses": 1, "writes": 1}
+
+
+def test_read_only_serves_hits_but_never_stores(open_cache):
+    open_cache().put("old", "reply")
+    cache = open_cache("read-only")
+    cache.put("new", "reply")
+    assert cache.get("old") == "reply"
+    assert cache.get("new") is None
+    assert cache.writes == 0
+
+
+def test_refresh_ignores_entries_but_stores_new_ones(open_cache):
+    open_cache().put("k", "stale")
+    cache = open_cache("refresh")
+    assert cache.get("k") is None
+    cache.put("k", "fresh")
+    assert open_cache().get("k") == "fresh"
+
+
+def test_off_bypasses_the_cache(open_cache):
+    open_cache().put("k", "reply")
+    cache = open_cache("off")
+    cache.put("other", "reply")
+    assert cache.get("k") is None
+    assert open_cache().get("other") is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_unknown_mode_is_rejected(open_cache):
+    with pytest.raises(ValueError):
+        open_cache("write-only")
+
+
+def test_entries_expire_after_ttl(open_cache, clock):
+    cache = open_cache(ttl=60)
+    cache.put("k", "reply")
+    clock.advance(59)
+    assert cache.get("k") == "reply"
+    clock.advance(2)
+    assert cache.get("k") is None
+    assert cache.execute("SELECT count(*) FROM llm_cache") == [(0,)]
+
+
+def test_read_only_does_not_delete_expired_entries(open_cache, clock):
+    open_cache().put("k", "reply")
+    clock.advance(120)
+    assert open_cache("read-only", ttl=60).get("k") is None
+    assert open_cache().get("k") == "reply"
+
+
+def test_least_recently_used_entries_are_evicted(open_cache, clock):
+    cache = open_cache(max_entries=2)
+    cache.put("a", "1")
+    clock.advance(1)
+    cache.put("b", "2")
+    clock.advance(1)
+    cache.get("a")
+    clock.advance(1)
+    cache.put("c", "3")
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["1", None, "3"]
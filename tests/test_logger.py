@@ -0,0 +1,77 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from core import logger
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    for name in ("LOG_FILE", "MAX_BYTES", "ROTATE_SECONDS", "ROTATION_CHECK_INTERVAL"):
+        monkeypatch.setattr(logger, name, getattr(logger, name))
+    monkeypatch.setattr(logger, "ROTATION_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(logger, "_writer", None)
+    return logger
+
+
+def entry(message, age=0):
+    when = datetime.now() - timedelta(seconds=age)
+    return json.dumps({"time": when.isoformat(), "type": "INFO", "message": message}) + "\n"
+
+
+def rotated_files(tmp_path):
+    return sorted(tmp_path.glob("log.json.*"))
+
+
+def test_log_is_rotated_and_gzipped_past_max_bytes(settings, tmp_path):
+    settings.MAX_BYTES = 100
+    path = tmp_path / "log.json"
+    writer = logger._LogWriter(str(path))
+    first = entry("x" * 100)
+    writer.write([first])
+    assert rotated_files(tmp_path) == []
+    writer.write([entry("second")])
+    [archive] = rotated_files(tmp_path)
+    assert archive.suffix == ".gz"
+    assert gzip.decompress(archive.read_bytes()).decode("utf-8") == first
+    assert json.loads(path.read_text(encoding="utf-8"))["message"] == "second"
+
+
+def test_log_is_rotated_once_its_first_entry_is_too_old(settings, tmp_path):
+    settings.ROTATE_SECONDS = 60
+    path = tmp_path / "log.json"
+    writer = logger._LogWriter(str(path))
+    writer.write([entry("recent", age=30)])
+    writer.write([entry("next")])
+    assert rotated_files(tmp_path) == []
+    path.write_text(entry("old", age=120), encoding="utf-8")
+    writer.write([entry("next")])
+    assert len(rotated_files(tmp_path)) == 1
+
+
+def test_rotation_is_only_checked_every_interval(settings, tmp_path):
+    settings.MAX_BYTES = 10
+    settings.ROTATION_CHECK_INTERVAL = 30
+    writer = logger._LogWriter(str(tmp_path / "log.json"))
+    for message in ("one", "two", "three"):
+        writer.write([entry(message)])
+    assert rotated_files(tmp_path) == []
+
+
+def test_configure_logging_switches_the_running_writer(settings, tmp_path):
+    writer = logger._LogWriter(str(tmp_path / "old.json"))
+    settings.LOG_FILE = writer.path
+    settings._writer = writer
+    logger.configure_logging(str(tmp_path / "new.json"), max_bytes=1234, rotate_seconds=60)
+    assert writer.path == settings.LOG_FILE == str(tmp_path / "new.json")
+    assert (settings.MAX_BYTES, settings.ROTATE_SECONDS) == (1234, 60)
+    logger.configure_logging()
+    assert (writer.path, settings.MAX_BYTES) == (str(tmp_path / "new.json"), 1234)
+
+
+def test_configure_logging_before_the_first_event_sets_the_path(settings, tmp_path):
+    logger.configure_logging(str(tmp_path / "run.json"))
+    assert settings.LOG_FILE == str(tmp_path / "run.json")
+    assert settings._writer is None
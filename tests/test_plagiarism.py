@@ -0,0 +1,99 @@
+import pytest
+
+from core import metrics, plagiarism
+from core.plagiarism import PlagiarismIndex, check_sections, index_references, minhash, shingles
+from utils.draft_store import DraftStore
+
+SOURCE = (
+    "Sourdough starter needs feeding with equal weights of flour and water every day. "
+    "Keep the jar somewhere warm so the wild yeast stays active between feeds. "
+    "A healthy starter doubles in size within six hours of being fed. "
+    "Bake once it passes the float test in a glass of cold water."
+)
+COPIED = "A healthy starter doubles in size within six hours of being fed."
+ORIGINAL = (
+    "Rye bread uses a dense dough that is mixed rather than kneaded at all. "
+    "Caraway seeds give the crumb its familiar sharp and earthy flavour."
+)
+
+
+class Library:
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetched = []
+
+    def page(self, url):
+        self.fetched.append(url)
+        return self.pages.get(url)
+
+
+@pytest.fixture(autouse=True)
+def no_log(monkeypatch):
+    for module in (metrics, plagiarism):
+        monkeypatch.setattr(module, "log_event", lambda *args, **kwargs: None)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = PlagiarismIndex(tmp_path / "plagiarism.sqlite3")
+    index.add_document("https://example.com/starter", SOURCE)
+    yield index
+    index.close()
+
+
+def test_similar_texts_have_similar_signatures():
+    near = minhash(shingles(SOURCE + " Enjoy."))
+    far = minhash(shingles(ORIGINAL))
+    signature = minhash(shingles(SOURCE))
+    assert sum(a == b for a, b in zip(signature, near)) > sum(a == b for a, b in zip(signature, far))
+
+
+def test_copied_sentence_is_flagged_with_its_source(index):
+    text = ORIGINAL + " " + COPIED
+    assert index.flagged_sentences(text) == [(COPIED, "https://example.com/starter")]
+
+
+def test_original_text_is_not_flagged(index):
+    assert index.flagged_sentences(ORIGINAL) == []
+
+
+def test_excluded_sources_are_not_checked(index):
+    assert index.flagged_sentences(COPIED, exclude="https://example.com/starter") == []
+    assert index.flagged_sentences(COPIED, exclude=["https://example.com/starter", "draft:x"]) == []
+
+
+def test_reindexing_replaces_the_old_passages(index):
+    index.add_document("https://example.com/starter", ORIGINAL, fingerprint="v2")
+    assert index.flagged_sentences(COPIED) == []
+    assert index.has_document("https://example.com/starter", "v2")
+    assert not index.has_document("https://example.com/starter", "v1")
+    assert index.has_document("https://example.com/starter")
+    assert not index.has_document("https://example.com/other")
+
+
+def test_check_sections_reports_flags_by_section_number(index):
+    sections = [{"heading": "Rye", "content": ORIGINAL}, {"heading": "Starter", "content": COPIED}]
+    assert check_sections(index, sections) == {1: [(COPIED, "https://example.com/starter")]}
+
+
+def test_index_references_skips_unchanged_and_empty_pages(index):
+    library = Library({
+        "https://example.com/rye": {"text": ORIGINAL, "text_hash": "rye1"},
+        "https://example.com/empty": {"text": "", "text_hash": "empty"},
+    })
+    urls = ["https://example.com/rye", "https://example.com/empty", "https://example.com/gone", ""]
+    assert index_references(index, urls, library) == 1
+    assert index_references(index, urls, library) == 0
+    assert library.fetched.count("https://example.com/rye") == 2
+    assert index.has_document("https://example.com/rye", "rye1")
+
+
+def test_sync_store_indexes_only_changed_drafts(index, tmp_path):
+    drafts = DraftStore(tmp_path / "drafts.sqlite3")
+    drafts.save("aaaa1111", "Rye", [], "<p>" + ORIGINAL + "</p>")
+    assert index.sync_store(drafts) == 1
+    assert index.sync_store(drafts) == 0
+    drafts.save("aaaa1111", "Rye", [], "<p>" + ORIGINAL + " More rye.</p>")
+    assert index.sync_store(drafts) == 1
+    assert index.flagged_sentences(ORIGINAL)[0][1] == "draft:aaaa1111"
+    drafts.close()
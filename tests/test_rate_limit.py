@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+from email.utils import formatdate
+
+import pytest
+
+from core import rate_limit
+from core.rate_limit import AdaptiveLimiter, ProviderLimiter, TokenBucket, RateLimited, MAX_PAUSE
+
+
+class Clock:
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock, time=clock, sleep=clock.sleep))
+    return clock
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A private limiter registry, so tests don't share budgets with each other."""
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setattr(rate_limit, "_rates", {})
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(60, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock.sleep(1)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_acquire_waits_for_the_refill(clock):
+    bucket = TokenBucket(60, capacity=1)
+    bucket.acquire()
+    start = clock()
+    bucket.acquire()
+    assert clock() - start == pytest.approx(1.0)
+
+
+def test_adaptive_limit_halves_on_throttle_and_grows_back_slowly():
+    limiter = AdaptiveLimiter(initial=8, minimum=1, maximum=32)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert 4.9 < limiter.limit < 5.1
+
+
+def test_adaptive_limit_stays_within_bounds():
+    limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=3)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == 1
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+
+
+def test_slow_calls_shrink_the_limit():
+    limiter = AdaptiveLimiter(initial=10, latency_target=5.0)
+    limiter.acquire()
+    limiter.release(latency=6.0)
+    assert limiter.limit == pytest.approx(9.0)
+
+
+def test_long_retry_after_is_capped_for_waiting_callers_only(clock):
+    limiter = ProviderLimiter("vendor", rpm=600)
+    limiter.throttled(3600)
+    assert limiter.paused_until - clock() == MAX_PAUSE
+    assert not limiter.try_reserve()
+    with limiter.call():
+        assert clock() >= 1_000.0 + MAX_PAUSE
+    clock.sleep(3600)
+    assert limiter.try_reserve()
+
+
+def test_reserve_never_waits(clock, registry):
+    rate_limit.configure_rate("vendor", rpm=1)
+    with rate_limit.reserve("vendor") as ok:
+        assert ok
+        with rate_limit.limit("vendor"):
+            pass
+        with pytest.raises(RateLimited):
+            with rate_limit.limit("vendor"):
+                pass
+    with rate_limit.reserve("vendor") as ok:
+        assert not ok
+    assert clock() == 1_000.0
+
+
+def test_reserve_fails_while_the_provider_is_paused(clock, registry):
+    rate_limit.get_limiter("vendor").pause(10)
+    with rate_limit.reserve("vendor") as ok:
+        assert not ok
+    clock.sleep(10)
+    with rate_limit.reserve("vendor") as ok:
+        assert ok
+
+
+def test_retry_after_seconds_reads_delays_and_dates(clock):
+    assert rate_limit.retry_after_seconds({"Retry-After": "12"}) == 12
+    http_date = formatdate(clock() + 30, usegmt=True)
+    assert rate_limit.retry_after_seconds({"Retry-After": http_date}) == pytest.approx(30, abs=1)
+    assert rate_limit.retry_after_seconds({"Retry-After": "soon"}) is None
+    assert rate_limit.retry_after_seconds({}) is None
@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import metrics, references
+from core.rate_limit import estimate_tokens
+from core.references import ReferenceCache, ReferenceLibrary, condense
+
+PAGE = (
+    "Sourdough bread is leavened by a starter of wild yeast and lactic acid bacteria. "
+    "The starter is fed with flour and water until it is bubbly and active. "
+    "Sourdough bread keeps longer than yeasted bread because of its acidity. "
+    "Bakers often shape the dough the evening before and bake it in the morning.\n\n"
+    "Menu.\n\n"
+    "A sourdough starter is leavened by wild yeast and lactic acid bacteria too."
+)
+URL = "https://example.com/sourdough"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"{self.status_code} error")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(references, "time", SimpleNamespace(time=clock))
+    for module in (metrics, references):
+        monkeypatch.setattr(module, "log_event", lambda *args, **kwargs: None)
+    return clock
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = SimpleNamespace(responses=[], requests=[])
+
+    def get(url, headers=None, **kwargs):
+        server.requests.append(headers or {})
+        response = server.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(references, "transport", SimpleNamespace(get=get))
+    return server
+
+
+@pytest.fixture
+def library(tmp_path, clock, server):
+    cache = ReferenceCache(tmp_path / "references.sqlite3")
+    yield ReferenceLibrary(cache, revalidate_seconds=60)
+    cache.close()
+
+
+def page_html(text):
+    return "<html><body><article>" + "".join(f"<p>{part}</p>" for part in text.split("\n\n")) + "</article></body></html>"
+
+
+def test_condense_keeps_page_order_within_the_budget():
+    sentences = condense(PAGE, max_tokens=40)
+    assert sum(estimate_tokens(sentence, completion=0) + 1 for sentence in sentences) <= 40
+    assert sentences and all(sentence in PAGE for sentence in sentences)
+    assert sentences == sorted(sentences, key=PAGE.index)
+
+
+def test_condense_drops_near_duplicates_and_short_sentences():
+    sentences = condense(PAGE)
+    assert "Menu." not in sentences
+    assert sum("lactic acid bacteria" in sentence for sentence in sentences) == 1
+    assert condense("") == []
+
+
+def test_fresh_pages_are_served_from_the_cache(library, server, clock):
+    server.responses.append(Response(200, page_html(PAGE), {"ETag": '"v1"'}))
+    assert "wild yeast" in library.page(URL)["text"]
+    clock.advance(59)
+    assert library.page_text(URL) == library.page_text(URL)
+    assert len(server.requests) == 1
+
+
+def test_stale_pages_are_revalidated_and_keep_their_summary(library, server, clock, monkeypatch):
+    server.responses += [
+        Response(200, page_html(PAGE), {"ETag": '"v1"', "Last-Modified": "Sat, 01 Mar 2025 10:00:00 GMT"}),
+        Response(304),
+    ]
+    summary = library.summary(URL)
+    monkeypatch.setattr(references, "condense", lambda *args: pytest.fail("summary was condensed again"))
+    clock.advance(61)
+    assert library.summary(URL) == summary
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+    assert server.requests[1]["If-Modified-Since"] == "Sat, 01 Mar 2025 10:00:00 GMT"
+    assert library.cache.get(URL)["checked"] == clock.now
+
+
+def test_changed_pages_get_a_new_summary(library, server, clock):
+    server.responses += [
+        Response(200, page_html(PAGE), {"ETag": '"v1"'}),
+        Response(200, page_html("Rye bread is dense because rye flour has little gluten to trap gas."), {"ETag": '"v2"'}),
+    ]
+    library.summary(URL)
+    clock.advance(61)
+    assert library.summary(URL) == ["Rye bread is dense because rye flour has little gluten to trap gas."]
+
+
+def test_a_failed_fetch_falls_back_to_the_stale_copy(library, server, clock):
+    server.responses += [Response(200, page_html(PAGE)), Response(503)]
+    text = library.page_text(URL)
+    clock.advance(61)
+    assert library.page_text(URL) == text
+    server.responses.append(ConnectionError("refused"))
+    assert library.page_text("https://example.com/other") == ""
+
+
+def test_notes_share_the_row_budget_between_pages(library, server):
+    server.responses += [Response(200, page_html(PAGE)), Response(200, page_html(PAGE.replace("Sourdough", "Rye")))]
+    library.row_tokens = 60
+    notes = library.notes([URL, URL, "https://example.com/rye", ""])
+    assert notes.count("Source: ") == 2
+    assert len(server.requests) == 2
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from models.keyword_row import KeywordRow
+from utils import row_reader
+from utils.row_reader import read_rows
+
+
+@pytest.fixture
+def warnings(monkeypatch):
+    logged = []
+    monkeypatch.setattr(row_reader, "log_event", lambda level, message, extra=None: logged.append((message, extra)))
+    return logged
+
+
+def write_csv(path, text):
+    # Spreadsheet exports start with a byte order mark
+    path.write_text("\ufeff" + text, encoding="utf-8")
+    return path
+
+
+def test_csv_rows_are_parsed(tmp_path, warnings):
+    sheet = write_csv(tmp_path / "sheet.csv", (
+        "Main Keyword,Reference Links,Secondary Keywords,Skip Plagiarism\n"
+        "  sourdough   bread ,\"https://a.example/x, ftp://b.example/y\",\"starter, crumb,\",yes\n"
+        "rye bread,,,\n"
+    ))
+    assert list(read_rows(sheet)) == [
+        KeywordRow("sourdough bread", ("https://a.example/x",), ("starter", "crumb"), True, line=2),
+        KeywordRow("rye bread", line=3),
+    ]
+    assert warnings == [("Ignoring invalid reference links", {"line": 2, "links": ["ftp://b.example/y"]})]
+
+
+def test_blank_and_repeated_keywords_are_skipped(tmp_path, warnings):
+    sheet = write_csv(tmp_path / "sheet.csv", (
+        "Main Keyword,Reference Links\n"
+        "Rye Bread,\n"
+        " ,https://a.example/x\n"
+        "rye  bread,\n"
+        "spelt bread,\n"
+    ))
+    assert [(row.main_keyword, row.line) for row in read_rows(sheet)] == [("Rye Bread", 2), ("spelt bread", 5)]
+    assert [message for message, _ in warnings] == ["Skipping row without a main keyword", "Skipping duplicate keyword"]
+
+
+def test_csv_line_numbers_count_multiline_cells(tmp_path, warnings):
+    sheet = write_csv(tmp_path / "sheet.csv", (
+        "Main Keyword,Secondary Keywords\n"
+        "rye bread,\"caraway,\nseeds\"\n"
+        "spelt bread,\n"
+    ))
+    assert [row.line for row in read_rows(sheet)] == [3, 4]
+
+
+def test_jsonl_rows_accept_lists_and_skip_bad_lines(tmp_path, warnings):
+    sheet = tmp_path / "sheet.jsonl"
+    sheet.write_text("\n".join([
+        json.dumps({"Main Keyword": "rye bread", "Reference Links": ["https://a.example/x", "not a url"],
+                    "Secondary Keywords": ["caraway"], "Skip Plagiarism": True}),
+        "",
+        "{broken",
+        json.dumps({"Main Keyword": "spelt bread", "Skip Plagiarism": "no"}),
+    ]), encoding="utf-8")
+    assert list(read_rows(sheet)) == [
+        KeywordRow("rye bread", ("https://a.example/x",), ("caraway",), True, line=1),
+        KeywordRow("spelt bread", line=4),
+    ]
+    assert [extra["line"] for _, extra in warnings] == [1, 3]
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from core import metrics, wordpress_api
+from core.wordpress_api import BATCH_LIMIT, PostQueue, WordPressClient
+
+
+class Response:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+
+class Transport:
+    """Answers each URL with the queued responses (or a callable), recording every call."""
+
+    def __init__(self):
+        self.replies = {}
+        self.calls = []
+
+    def reply(self, path, *responses):
+        self.replies.setdefault(path, []).extend(responses)
+
+    def _send(self, method, url, json=None, **kwargs):
+        path = url.split("/wp-json", 1)[1]
+        self.calls.append((method, path, json))
+        reply = self.replies[path].pop(0) if len(self.replies[path]) > 1 else self.replies[path][0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply(json) if callable(reply) else reply
+
+    def post(self, url, **kwargs):
+        return self._send("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self._send("GET", url, **kwargs)
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    transport = Transport()
+    monkeypatch.setattr(wordpress_api, "transport", transport)
+    for module in (metrics, wordpress_api):
+        monkeypatch.setattr(module, "log_event", lambda *args, **kwargs: None)
+    return transport
+
+
+@pytest.fixture
+def client(transport):
+    return WordPressClient("https://blog.example.com/", "editor", "abcd efgh")
+
+
+def payload(n, slug=None):
+    return WordPressClient.post_payload(f"Post {n}", f"<p>{n}</p>", None, "", slug=slug or f"post-{n}")
+
+
+def created(body):
+    return {"id": 100, "slug": body["slug"]}
+
+
+def test_payload_leaves_out_missing_featured_media():
+    assert "featured_media" not in payload(1)
+    assert WordPressClient.post_payload("T", "C", 7, "")["featured_media"] == 7
+
+
+def test_batch_results_are_mapped_back_in_order(client, transport):
+    transport.reply("/batch/v1", Response(207, {"responses": [
+        {"status": 201, "body": {"id": 1}},
+        {"status": 400, "body": {"code": "rest_invalid_param", "message": "Invalid slug"}},
+        {"status": 201, "body": {"id": 3}},
+    ]}))
+    results = client.save_posts([payload(1), payload(2), payload(3)])
+    assert results[0] == {"id": 1} and results[2] == {"id": 3}
+    assert isinstance(results[1], Exception)
+    assert "Post 2" in str(results[1]) and "Invalid slug" in str(results[1])
+
+
+def test_payloads_are_sent_in_chunks_of_batch_limit(client, transport):
+    def answer(body):
+        return Response(200, {"responses": [{"status": 201, "body": request["body"]} for request in body["requests"]]})
+
+    transport.reply("/batch/v1", answer)
+    payloads = [payload(n) for n in range(BATCH_LIMIT + 2)]
+    assert client.save_posts(payloads) == payloads
+    assert [len(body["requests"]) for _, _, body in transport.calls] == [BATCH_LIMIT, 2]
+
+
+def test_upsert_updates_posts_that_already_exist(client, transport):
+    transport.reply("/wp/v2/posts", Response(200, [{"id": 9, "slug": "post-2", "status": "draft", "title": {}}]))
+    transport.reply("/batch/v1", Response(200, {"responses": [{"status": 201, "body": {}}, {"status": 200, "body": {}}]}))
+    client.save_posts([payload(1), payload(2)], upsert=True)
+    paths = [request["path"] for request in transport.calls[-1][2]["requests"]]
+    assert paths == ["/wp/v2/posts", "/wp/v2/posts/9"]
+
+
+def test_missing_batch_route_falls_back_to_one_post_at_a_time(client, transport):
+    transport.reply("/batch/v1", Response(404, {"code": "rest_no_route", "message": "No route"}))
+    transport.reply("/wp/v2/posts", lambda body: Response(201, created(body)))
+    assert client.save_posts([payload(1), payload(2)]) == [{"id": 100, "slug": "post-1"}, {"id": 100, "slug": "post-2"}]
+    assert not client.batch_supported
+    client.save_posts([payload(3)])
+    assert [path for _, path, _ in transport.calls].count("/batch/v1") == 1
+
+
+def test_other_batch_errors_fail_the_items_without_reposting(client, transport):
+    transport.reply("/batch/v1", Response(502, {"code": "bad_gateway"}))
+    results = client.save_posts([payload(1), payload(2)])
+    assert all(isinstance(result, Exception) for result in results)
+    assert client.batch_supported
+    assert [path for _, path, _ in transport.calls] == ["/batch/v1"]
+
+
+def test_a_short_batch_reply_fails_every_item(client, transport):
+    transport.reply("/batch/v1", Response(200, {"failed": "validation", "responses": []}))
+    assert all(isinstance(result, Exception) for result in client.save_posts([payload(1), payload(2)]))
+
+
+def test_post_queue_resolves_futures_per_item(client, transport):
+    transport.reply("/batch/v1", Response(200, {"responses": [
+        {"status": 201, "body": {"id": 1}},
+        {"status": 500, "body": {"message": "Database error"}},
+    ]}))
+    queue = PostQueue(client, batch_size=2)
+    first = queue.submit(payload(1))
+    assert not first.done()
+    second = queue.submit(payload(2))
+    assert first.result() == {"id": 1}
+    with pytest.raises(Exception, match="Database error"):
+        second.result()
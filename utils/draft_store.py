@@ -0,0 +1,152 @@
+import json
+import time
+import zlib
+import hashlib
+from pathlib import Path
+from utils.sqlite_store import SQLiteStore
+
+DRAFT_STORE_PATH = "data/drafts/drafts.sqlite3"
+
+
+def _pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def content_hash(title: str, html: str, excerpt: str = "") -> str:
+    """Hash of what would be posted, so only drafts that would make the same post match."""
+    return hashlib.sha256("\0".join((title, excerpt or "", html)).encode("utf-8")).hexdigest()
+
+
+class DraftStore(SQLiteStore):
+    """
+    Every generated article, keyed by row (the JobState job key) and indexed by
+    content hash and slug: section JSON, rendered HTML, image ids and, once
+    published, the post id. Sections and HTML are stored zlib-compressed.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS drafts (
+        row_key TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        slug TEXT,
+        content_hash TEXT NOT NULL,
+        excerpt TEXT,
+        featured_media INTEGER,
+        image_ids TEXT,
+        sections BLOB NOT NULL,
+        html BLOB NOT NULL,
+        post_id INTEGER,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS drafts_hash ON drafts (content_hash);
+    CREATE INDEX IF NOT EXISTS drafts_slug ON drafts (slug);
+    """
+    SUMMARY_COLUMNS = "row_key, title, slug, content_hash, featured_media, post_id, updated"
+
+    def save(self, row_key: str, title: str, sections, html: str, excerpt: str = "", featured_media: int = None,
+             image_ids=None, slug: str = None) -> str:
+        """Store (or replace) a row's draft. Returns its content hash; a post id already recorded is kept."""
+        digest = content_hash(title, html, excerpt)
+        now = time.time()
+        self.execute(
+            """
+            INSERT INTO drafts (row_key, title, slug, content_hash, excerpt, featured_media, image_ids,
+                                sections, html, created, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (row_key) DO UPDATE SET
+                title = excluded.title, slug = excluded.slug, content_hash = excluded.content_hash,
+                excerpt = excluded.excerpt, featured_media = excluded.featured_media,
+                image_ids = excluded.image_ids, sections = excluded.sections, html = excluded.html,
+                updated = excluded.updated
+            """,
+            (row_key, title, slug, digest, excerpt, featured_media, json.dumps(image_ids or []),
+             _pack(sections), zlib.compress(html.encode("utf-8"), 6), now, now)
+        )
+        return digest
+
+    def _row(self, row) -> dict:
+        (row_key, title, slug, digest, excerpt, featured_media, image_ids, sections, html, post_id,
+         created, updated) = row
+        return {
+            "row_key": row_key,
+            "title": title,
+            "slug": slug,
+            "content_hash": digest,
+            "excerpt": excerpt,
+            "featured_media": featured_media,
+            "image_ids": json.loads(image_ids or "[]"),
+            "sections": _unpack(sections),
+            "html": zlib.decompress(html).decode("utf-8"),
+            "post_id": post_id,
+            "created": created,
+            "updated": updated
+        }
+
+    def get(self, row_key: str):
+        """The full draft for a row, or None."""
+        rows = self.execute("SELECT * FROM drafts WHERE row_key = ?", (row_key,))
+        return self._row(rows[0]) if rows else None
+
+    def find_by_hash(self, digest: str) -> list:
+        """Summaries of drafts with exactly this content."""
+        rows = self.execute(f"SELECT {self.SUMMARY_COLUMNS} FROM drafts WHERE content_hash = ?", (digest,))
+        return [self._summary(row) for row in rows]
+
+    def find_by_slug(self, slug: str) -> list:
+        rows = self.execute(f"SELECT {self.SUMMARY_COLUMNS} FROM drafts WHERE slug = ?", (slug,))
+        return [self._summary(row) for row in rows]
+
+    def hashes(self) -> list:
+        """(row_key, content_hash) of every draft, without reading any content."""
+        return self.execute("SELECT row_key, content_hash FROM drafts")
+
+    def set_post_id(self, row_key: str, post_id: int):
+        self.execute(
+            "UPDATE drafts SET post_id = ?, updated = ? WHERE row_key = ?", (post_id, time.time(), row_key)
+        )
+
+    def delete(self, row_key: str):
+        self.execute("DELETE FROM drafts WHERE row_key = ?", (row_key,))
+
+    def _summary(self, row) -> dict:
+        return dict(zip(("row_key", "title", "slug", "content_hash", "featured_media", "post_id", "updated"), row))
+
+    def list(self, posted: bool = None, limit: int = 100, offset: int = 0) -> list:
+        """Draft summaries (no content), newest first. posted=True/False filters on having a post id."""
+        where = {True: "WHERE post_id IS NOT NULL", False: "WHERE post_id IS NULL", None: ""}[posted]
+        rows = self.execute(
+            f"SELECT {self.SUMMARY_COLUMNS} FROM drafts {where} ORDER BY updated DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+        return [self._summary(row) for row in rows]
+
+    def iter_html(self, batch_size: int = 200):
+        """Yield (row_key, title, slug, html) for every draft, a batch of rows at a time."""
+        last = ""
+        while True:
+            rows = self.execute(
+                "SELECT row_key, title, slug, html FROM drafts WHERE row_key > ? ORDER BY row_key LIMIT ?",
+                (last, batch_size)
+            )
+            if not rows:
+                return
+            for row_key, title, slug, html in rows:
+                yield row_key, title, slug, zlib.decompress(html).decode("utf-8")
+            last = rows[-1][0]
+
+    def export(self, directory) -> int:
+        """
+        Write every draft's HTML to directory as <slug>-<row key prefix>.html, so titles
+        that sanitize to the same name don't overwrite each other. Returns the file count.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        count = 0
+        for row_key, title, slug, html in self.iter_html():
+            (directory / f"{slug or 'draft'}-{row_key[:8]}.html").write_text(html, encoding="utf-8")
+            count += 1
+        return count
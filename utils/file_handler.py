@@ -1,10 +1,13 @@
 from pathlib import Path
 
-def save_draft(title: str, content: str):
-    path = Path("data/drafts")
-    path.mkdir(parents=True, exist_ok=True)
+def draft_file(title: str) -> Path:
+    """Where the draft for this title is saved."""
     safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '_')).rstrip()
-    file_path = path / f"{safe_title}.txt"
+    return Path("data/drafts") / f"{safe_title}.txt"
+
+def save_draft(title: str, content: str):
+    file_path = draft_file(title)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
     with file_path.open("w", encoding="utf-8") as f:
         f.write(content)
     return file_path
@@ -0,0 +1,80 @@
+import re
+from html.parser import HTMLParser
+
+# Content of these tags is never readable text
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav", "footer", "form"}
+# Tags that usually hold a page's own content, as opposed to menus, sidebars and comments
+MAIN_TAGS = {"article", "main"}
+# These tags end a paragraph
+BLOCK_TAGS = {"p", "div", "section", "article", "li", "ul", "ol", "br", "tr", "table", "blockquote",
+              "h1", "h2", "h3", "h4", "h5", "h6", "header", "main", "figure", "figcaption", "pre"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        # The same text again, but only what is inside <article>/<main>
+        self.main_parts = []
+        self.skipping = 0
+        self.in_main = 0
+
+    def _append(self, text):
+        self.parts.append(text)
+        if self.in_main:
+            self.main_parts.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in MAIN_TAGS:
+            self.in_main += 1
+            self._append("\n\n")
+        elif tag in BLOCK_TAGS:
+            self._append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in MAIN_TAGS:
+            self._append("\n\n")
+            self.in_main = max(0, self.in_main - 1)
+        elif tag in BLOCK_TAGS:
+            self._append("\n\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self._append(data)
+
+
+def _paragraphs(parts) -> list:
+    paragraphs = (" ".join(block.split()) for block in "".join(parts).split("\n\n"))
+    return [paragraph for paragraph in paragraphs if paragraph]
+
+
+def html_to_text(html: str) -> str:
+    """Readable text of an HTML page or Gutenberg markup, one paragraph per block."""
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    return "\n\n".join(_paragraphs(parser.parts))
+
+
+def main_text(html: str, min_words: int = 150, min_paragraph_words: int = 6) -> str:
+    """
+    The readable text of a page's own content: what is inside <article>/<main> when that
+    holds at least min_words words, otherwise the whole page. Paragraphs shorter than
+    min_paragraph_words (menu entries, "Print", bylines) are dropped.
+    """
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    paragraphs = _paragraphs(parser.main_parts)
+    if sum(len(paragraph.split()) for paragraph in paragraphs) < min_words:
+        paragraphs = _paragraphs(parser.parts)
+    return "\n\n".join(paragraph for paragraph in paragraphs if len(paragraph.split()) >= min_paragraph_words)
+
+
+def split_sentences(text: str) -> list:
+    """Split prose into sentences on ., ! and ? followed by whitespace."""
+    return [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+", text or "") if sentence.strip()]
@@ -0,0 +1,50 @@
+import re
+import json
+from utils.json_stream import SectionStreamParser
+
+FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def repair_json(text: str) -> str:
+    """Cheap local fixes for common model mistakes: code fences, chatter around the JSON, trailing commas."""
+    text = FENCE_RE.sub("", (text or "").strip())
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    return TRAILING_COMMA_RE.sub(r"\1", text)
+
+
+def schema_errors(data, schema: dict) -> list:
+    # jsonschema is slow to import; only pay for it once a reply needs checking
+    from jsonschema import Draft7Validator
+    return [error.message for error in Draft7Validator(schema).iter_errors(data)]
+
+
+def parse_reply(text: str, schema: dict):
+    """
+    Parse a model reply and validate it against schema.
+    Raises ValueError describing what is wrong if it can't be made valid.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        try:
+            data = json.loads(repair_json(text))
+        except ValueError as err:
+            raise ValueError(f"Invalid JSON: {err}")
+    errors = schema_errors(data, schema)
+    if errors:
+        raise ValueError("; ".join(errors[:5]))
+    return data
+
+
+def salvage_sections(text: str, schema: dict) -> list:
+    """Pull every complete, valid object out of the "sections" array of a broken reply."""
+    item_schema = schema.get("properties", {}).get("sections", {}).get("items", {})
+    parser = SectionStreamParser()
+    return [
+        section for _, section in parser.feed(repair_json(text))
+        if not schema_errors(section, item_schema)
+    ]
@@ -0,0 +1,64 @@
+import json
+
+
+class SectionStreamParser:
+    """
+    Incremental parser for replies shaped like {"sections": [{...}, {...}]}.
+    Feed it text as it streams in; each call returns the section objects that
+    were completed by that piece, as (index, section) pairs.
+    """
+
+    def __init__(self, key: str = "sections"):
+        self.key = key
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_key = None
+        self.array_depth = None
+        self.object_start = None
+        self.count = 0
+
+    def feed(self, text: str):
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        for i in range(self.pos, len(buffer)):
+            char = buffer[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_key = json.loads(buffer[self.string_start:i + 1])
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = i
+            elif char in "{[":
+                self.depth += 1
+                if char == "[" and self.depth == 2 and self.last_key == self.key:
+                    self.array_depth = self.depth
+                elif char == "{" and self.array_depth and self.depth == self.array_depth + 1:
+                    self.object_start = i
+            elif char in "}]":
+                if char == "}" and self.object_start is not None and self.depth == self.array_depth + 1:
+                    try:
+                        section = json.loads(buffer[self.object_start:i + 1])
+                    except ValueError:
+                        section = None
+                    if isinstance(section, dict):
+                        completed.append((self.count, section))
+                        self.count += 1
+                    self.object_start = None
+                elif char == "]" and self.depth == self.array_depth:
+                    self.array_depth = None
+                self.depth -= 1
+        self.pos = len(buffer)
+        return completed
@@ -0,0 +1,95 @@
+import re
+import csv
+import json
+from pathlib import Path
+from models.keyword_row import KeywordRow
+from core.logger import log_event
+
+# Sheet columns (CSV headers / JSONL keys)
+MAIN_KEYWORD = "Main Keyword"
+REFERENCE_LINKS = "Reference Links"
+SECONDARY_KEYWORDS = "Secondary Keywords"
+SKIP_PLAGIARISM = "Skip Plagiarism"
+
+TRUE_VALUES = {"1", "true", "yes", "y", "x", "skip"}
+URL_PATTERN = re.compile(r"^https?://\S+$", re.IGNORECASE)
+
+
+def split_list(value) -> tuple:
+    """A comma separated cell (or a JSON list) as a tuple of trimmed, non-empty items."""
+    if value is None:
+        return ()
+    items = value if isinstance(value, list) else str(value).split(",")
+    return tuple(item for item in (str(item).strip() for item in items) if item)
+
+
+def is_true(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def keyword_identity(keyword: str) -> str:
+    """What counts as the same keyword: case and repeated whitespace are ignored."""
+    return " ".join(keyword.split()).casefold()
+
+
+def parse_record(record: dict, line: int = 0):
+    """A KeywordRow from one CSV/JSONL record, or None (logged) if the row can't be used."""
+    main_keyword = " ".join(str(record.get(MAIN_KEYWORD) or "").split())
+    if not main_keyword:
+        log_event("WARNING", "Skipping row without a main keyword", {"line": line})
+        return None
+
+    links = split_list(record.get(REFERENCE_LINKS))
+    bad_links = [link for link in links if not URL_PATTERN.match(link)]
+    if bad_links:
+        log_event("WARNING", "Ignoring invalid reference links", {"line": line, "links": bad_links})
+        links = tuple(link for link in links if URL_PATTERN.match(link))
+
+    return KeywordRow(
+        main_keyword=main_keyword,
+        reference_links=links,
+        secondary_keywords=split_list(record.get(SECONDARY_KEYWORDS)),
+        skip_plagiarism=is_true(record.get(SKIP_PLAGIARISM)),
+        line=line
+    )
+
+
+def read_records(path):
+    """Yield (line, record dict) from a .csv or .jsonl/.ndjson sheet, one line at a time."""
+    path = Path(path)
+    if path.suffix.lower() in (".jsonl", ".ndjson"):
+        with path.open(encoding="utf-8") as f:
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    yield line, json.loads(text)
+                except json.JSONDecodeError as e:
+                    log_event("WARNING", f"Skipping unreadable JSONL line: {e}", {"line": line})
+        return
+
+    # utf-8-sig: spreadsheet exports often start with a byte order mark
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def read_rows(path):
+    """
+    Stream valid KeywordRows from a sheet without loading it whole.
+    Rows whose main keyword was already seen earlier in the sheet are skipped.
+    """
+    seen = set()
+    for line, record in read_records(path):
+        row = parse_record(record, line)
+        if row is None:
+            continue
+        identity = keyword_identity(row.main_keyword)
+        if identity in seen:
+            log_event("WARNING", "Skipping duplicate keyword", {"line": line, "keyword": row.main_keyword})
+            continue
+        seen.add(identity)
+        yield row
@@ -0,0 +1,38 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLiteStore:
+    """
+    Thread-safe wrapper around a single SQLite file.
+    Subclasses set SCHEMA to the CREATE statements they need.
+    """
+    SCHEMA = ""
+    # WAL needs shared memory, so it only works for processes on one host; stores opened
+    # from several hosts over a network filesystem need the rollback journal ("DELETE")
+    JOURNAL_MODE = "WAL"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        # WAL lets readers in other processes carry on while one process writes
+        self._conn.execute(f"PRAGMA journal_mode={self.JOURNAL_MODE}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def execute(self, sql: str, params=()):
+        """Run one statement in its own transaction and return all rows."""
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def executemany(self, sql: str, seq_of_params):
+        with self._lock, self._conn:
+            self._conn.executemany(sql, seq_of_params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
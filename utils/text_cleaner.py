@@ -1,4 +1,5 @@
 import re
+import unicodedata
 
 def clean_article_text(text: str) -> str:
     """
@@ -8,3 +9,11 @@ def clean_article_text(text: str) -> str:
     text = re.sub(r"\n{3,}", "\n\n", text)
     text = text.strip()
     return text
+
+def slugify(text: str) -> str:
+    """
+    URL slug the way WordPress builds one from a title: lowercase ASCII words joined by hyphens.
+    """
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"[^a-z0-9]+", "-", text.lower())
+    return text.strip("-")